@@ -0,0 +1,264 @@
+class Board:
+    '''Type to represent the lines drawn on a game board as a bitboard. Every
+    edge of the game graph is given one bit of an integer and every box is
+    given a mask of the bits of the four edges that surround it, so whether a
+    line is drawn, how many sides of a box are drawn and whether a box is
+    closed are all answered with a few bitwise operations. The bit of an edge
+    is the number that identifies the edge everywhere in the server; only the
+    client protocol deals in vertex coordinates.
+
+    Attributes:
+        _edges (list): A list mapping edge bits to the game graph edges (u, v)
+            that they represent.
+
+        _edge_bits (dict): A dictionary mapping game graph edges, in either
+            orientation, to their edge bit.
+
+        _box_masks (list): A list mapping boxes to the bitmask of the edges
+            that surround them. Boxes are numbered like the vertices of the
+            strategy graph.
+
+        _edge_boxes (list): A list mapping edge bits to a tuple of the one or
+            two boxes that the edge surrounds.
+
+        _drawn (int): A bitmask of the edges that have been drawn.
+    '''
+
+    def __init__(self, edges, box_masks, edge_boxes):
+        self._edges = edges
+        self._edge_bits = dict()
+        for bit, (u, v) in enumerate(edges):
+            self._edge_bits[(u, v)] = bit
+            self._edge_bits[(v, u)] = bit
+        self._box_masks = box_masks
+        self._edge_boxes = edge_boxes
+        self._drawn = 0
+
+    def edge_bit(self, e):
+        '''Returns the bit of a game graph edge.
+
+        Arguments:
+            e (tuple): A game graph edge in either orientation.
+
+        Returns:
+            The edge bit, or -1 if e is not an edge of the board.
+        '''
+        return self._edge_bits.get(e, -1)
+
+    def edge(self, bit):
+        '''Returns the game graph edge (u, v) of an edge bit, with u < v.
+
+        Arguments:
+            bit (int): An edge bit of the board.
+        '''
+        return self._edges[bit]
+
+    def num_edges(self):
+        '''Returns the number of edges on the board.'''
+        return len(self._edges)
+
+    def num_boxes(self):
+        '''Returns the number of boxes on the board.'''
+        return len(self._box_masks)
+
+    def box_mask(self, box):
+        '''Returns the bitmask of the edges that surround a box.
+
+        Arguments:
+            box (int): A box of the board.
+        '''
+        return self._box_masks[box]
+
+    def drawn(self):
+        '''Returns the bitmask of the edges that have been drawn.'''
+        return self._drawn
+
+    def is_drawn(self, bit):
+        '''Checks whether an edge has been drawn.
+
+        Arguments:
+            bit (int): An edge bit of the board.
+
+        Returns:
+            bool: True if the edge has been drawn, False otherwise.
+        '''
+        return (self._drawn >> bit) & 1 == 1
+
+    def draw(self, bit):
+        '''Marks an edge as drawn.
+
+        Arguments:
+            bit (int): An edge bit of the board.
+        '''
+        self._drawn |= 1 << bit
+
+    def edge_boxes(self, bit):
+        '''Returns the tuple of the one or two boxes that an edge surrounds.
+
+        Arguments:
+            bit (int): An edge bit of the board.
+
+        Runtime:
+            O(1)
+        '''
+        return self._edge_boxes[bit]
+
+    def closed_boxes(self, bit):
+        '''Finds the boxes that are closed by an edge. Used once the edge has
+        been drawn to find the boxes that the move scored.
+
+        Arguments:
+            bit (int): An edge bit of the board.
+
+        Runtime:
+            O(1) as an edge surrounds at most two boxes.
+
+        Returns:
+            boxes (list): The boxes surrounded by the edge that have all four
+                of their sides drawn.
+        '''
+        boxes = list()
+        for box in self._edge_boxes[bit]:
+            box_mask = self._box_masks[box]
+            # The box is closed if every one of its edges is drawn.
+            if self._drawn & box_mask == box_mask:
+                boxes.append(box)
+        return boxes
+
+    def sides(self, box):
+        '''Returns the number of drawn sides of a box (0 to 4).
+
+        Arguments:
+            box (int): A box of the board.
+        '''
+        return bin(self._drawn & self._box_masks[box]).count("1")
+
+    def undrawn_sides(self, box):
+        '''Returns the list of edge bits surrounding a box that have not been
+        drawn yet.
+
+        Arguments:
+            box (int): A box of the board.
+        '''
+        return bits_of(self._box_masks[box] & ~self._drawn)
+
+    def undrawn_edges(self):
+        '''Returns the list of edge bits that have not been drawn yet.
+
+        Runtime:
+            O(n) where n is the number of edges on the board.
+        '''
+        return bits_of(((1 << len(self._edges)) - 1) & ~self._drawn)
+
+    def is_full(self):
+        '''Checks whether every edge of the board has been drawn.'''
+        return self._drawn == (1 << len(self._edges)) - 1
+
+    def clear(self):
+        '''Method to erase every line for consecutive games played.'''
+        self._drawn = 0
+
+class SafeEdgeIndex:
+    '''Type to keep track of the safe edges of a board: the undrawn edges
+    that do not give a box a third side, so drawing one gives no box away.
+    Edges only ever stop being safe, when they are drawn or when a box that
+    they surround gets its second side, so the index is kept up to date by
+    removing edges as lines are drawn.
+
+    Attributes:
+        _edges (list): The safe edges, in no order.
+
+        _positions (dict): A dictionary mapping safe edges to their position
+            in _edges, so that an edge is removed without searching for it.
+    '''
+
+    def __init__(self, game_board):
+        '''Finds the safe edges of a board.
+
+        Arguments:
+            game_board (Board): A bitboard of the lines drawn on the game
+                board.
+
+        Runtime:
+            O(n) where n is the number of edges on the board.
+        '''
+        self._edges = list()
+        self._positions = dict()
+        for bit in game_board.undrawn_edges():
+            if all(game_board.sides(box) < 2
+                   for box in game_board.edge_boxes(bit)):
+                self._positions[bit] = len(self._edges)
+                self._edges.append(bit)
+
+    def remove(self, bit):
+        '''Removes an edge from the safe edges if it is one of them.
+
+        Arguments:
+            bit (int): An edge bit of the board.
+
+        Runtime:
+            O(1)
+        '''
+        position = self._positions.pop(bit, None)
+        if position is None:
+            return
+        # Move the last edge into the place of the removed one.
+        last = self._edges.pop()
+        if last != bit:
+            self._edges[position] = last
+            self._positions[last] = position
+
+    def update(self, game_board, bit):
+        '''Removes the edges that are no longer safe once an edge is drawn:
+        the edge itself and the other sides of a box that now has two.
+
+        Arguments:
+            game_board (Board): A bitboard of the lines drawn on the game
+                board, with the edge drawn.
+
+            bit (int): The edge bit that was drawn.
+
+        Runtime:
+            O(1) as an edge surrounds at most two boxes.
+        '''
+        self.remove(bit)
+        for box in game_board.edge_boxes(bit):
+            if game_board.sides(box) == 2:
+                for side in game_board.undrawn_sides(box):
+                    self.remove(side)
+
+    def is_empty(self):
+        '''Checks whether every undrawn edge gives a box away.'''
+        return len(self._edges) == 0
+
+    def pick(self):
+        '''Returns a random safe edge.
+
+        Runtime:
+            O(1)
+
+        Returns:
+            bit (int): A safe edge bit, or None if there are no safe edges.
+        '''
+        from random import randrange
+
+        if len(self._edges) == 0:
+            return None
+        return self._edges[randrange(len(self._edges))]
+
+def bits_of(mask):
+    '''Returns the list of the bits that are set in a bitmask, lowest first.
+
+    Arguments:
+        mask (int): A non-negative bitmask.
+
+    Runtime:
+        O(n) where n is the number of set bits in the mask.
+    '''
+    bits = list()
+    while mask:
+        # Isolate the lowest set bit and clear it from the mask.
+        lowest = mask & -mask
+        bits.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return bits
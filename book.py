@@ -0,0 +1,433 @@
+import mmap
+import os
+import struct
+
+# The header of a book file: a magic string, the number of columns and rows
+# of the board and the number of entries.
+HEADER = struct.Struct("<4sBBI")
+MAGIC = b"DBOB"
+
+# An entry of a book: the canonical Zobrist hash of a position, the move to
+# play in the canonical image of the position and the number of times the
+# position was reached while the book was built. Entries are sorted by hash.
+ENTRY = struct.Struct("<QBH")
+
+# The largest count an entry can hold.
+MAX_COUNT = (1 << 16) - 1
+
+# The chance that a move played while building a book is random, standing in
+# for the moves of a human, rather than the move of the book.
+DEVIATION = 0.5
+
+class OpeningBook:
+    '''Type to look up the moves of the first positions of a game in a book
+    built offline. Positions are found by their canonical Zobrist hash, so a
+    position that is the same as a position of the book up to turning or
+    flipping the board is found as well, and its move is turned back to the
+    real board.
+
+    The book is memory-mapped and searched by bisection, so it is never read
+    in whole.
+
+    Attributes:
+        _book (mmap): The memory-mapped book file.
+
+        _num_entries (int): The number of entries of the book.
+
+        _canonicaliser (Canonicaliser): The symmetries of the board.
+
+        lookups (int): The number of positions looked up.
+
+        hits (int): The number of positions that were found in the book.
+
+        out_of_book (bool): Whether a position was not found. Once a game
+            leaves the book it is rarely back in it, so the book is not
+            looked up any more.
+    '''
+
+    def __init__(self, canonicaliser, book):
+        '''Creates a lookup of the book of a board.
+
+        Arguments:
+            canonicaliser (Canonicaliser): The symmetries of the board.
+
+            book (mmap): The memory-mapped book of the board.
+        '''
+        self._book = book
+        self._num_entries = HEADER.unpack_from(book, 0)[3]
+        self._canonicaliser = canonicaliser
+        self.lookups = int()
+        self.hits = int()
+        self.out_of_book = False
+
+    def _find(self, key):
+        '''Returns the (move, count) of the entry of a hash, or None.
+
+        Arguments:
+            key (int): The canonical Zobrist hash of a position.
+
+        Runtime:
+            O(log n) where n is the number of entries of the book.
+        '''
+        low = 0
+        high = self._num_entries
+        while low < high:
+            middle = (low + high) // 2
+            (entry_key, move, count) = ENTRY.unpack_from(
+                self._book, HEADER.size + middle*ENTRY.size)
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                return (move, count)
+        return None
+
+    def move(self, drawn):
+        '''Finds the move of a position in the book.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+        Returns:
+            move (int): The bit of the edge to draw, or None if the position
+                is not in the book.
+        '''
+        self.lookups += 1
+        (key, symmetry) = self._canonicaliser.hash(drawn)
+        entry = self._find(key)
+        if entry is None:
+            self.out_of_book = True
+            return None
+        move = self._canonicaliser.to_real(entry[0], symmetry)
+        # The move of another position with the same hash may be drawn.
+        if (drawn >> move) & 1:
+            self.out_of_book = True
+            return None
+        self.hits += 1
+        return move
+
+def book_path(directory, num_columns, num_rows):
+    '''Returns the path of the book of a board size in a directory.'''
+    return os.path.join(directory, "{}x{}.book".format(num_columns, num_rows))
+
+def load_books(directory):
+    '''Memory-maps every book in a directory.
+
+    Arguments:
+        directory (str): The directory of the books.
+
+    Returns:
+        books (dict): A dictionary mapping board sizes (columns, rows) to
+            their memory-mapped book. Empty if the directory does not exist.
+    '''
+    books = dict()
+    if not os.path.isdir(directory):
+        return books
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.splitext(name)[1] != ".book" or \
+            os.path.getsize(path) < HEADER.size:
+            continue
+        with open(path, "rb") as book_file:
+            book = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, num_columns, num_rows, num_entries) = \
+            HEADER.unpack_from(book, 0)
+        # A book that was not written whole is left out.
+        if magic != MAGIC or \
+            len(book) != HEADER.size + num_entries*ENTRY.size:
+            continue
+        books[(num_columns, num_rows)] = book
+    return books
+
+def read_book(path):
+    '''Reads a book file.
+
+    Arguments:
+        path (str): The path of the book.
+
+    Raises:
+        RuntimeError: If the file is not a book.
+
+    Returns:
+        size (tuple): The (columns, rows) of the board of the book.
+
+        entries (dict): A dictionary mapping canonical hashes to a tuple
+            (move, count).
+    '''
+    with open(path, "rb") as book_file:
+        data = book_file.read()
+    if len(data) < HEADER.size:
+        raise RuntimeError("{} is not a book".format(path))
+    (magic, num_columns, num_rows, num_entries) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or len(data) != HEADER.size + num_entries*ENTRY.size:
+        raise RuntimeError("{} is not a book".format(path))
+
+    entries = dict()
+    for (key, move, count) in ENTRY.iter_unpack(data[HEADER.size:]):
+        entries[key] = (move, count)
+    return ((num_columns, num_rows), entries)
+
+def write_book(path, size, entries):
+    '''Writes a book file, with its entries sorted by hash. The book is
+    written under a temporary name first, so that a book that was not
+    finished is never loaded.
+
+    Arguments:
+        path (str): The path of the book.
+
+        size (tuple): The (columns, rows) of the board of the book.
+
+        entries (dict): A dictionary mapping canonical hashes to a tuple
+            (move, count).
+    '''
+    partial_path = path + ".partial"
+    with open(partial_path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, size[0], size[1], len(entries)))
+        for key in sorted(entries):
+            (move, count) = entries[key]
+            book_file.write(ENTRY.pack(key, move, min(count, MAX_COUNT)))
+    os.replace(partial_path, path)
+
+def merge_entries(entries, other):
+    '''Adds the entries of one book to those of another. When both books have
+    a position, the move of the book that reached it more often is kept,
+    and the counts are added up if the moves agree.
+
+    Arguments:
+        entries (dict): The entries that are added to.
+
+        other (dict): The entries that are added.
+    '''
+    for key, (move, count) in other.items():
+        if not key in entries:
+            entries[key] = (move, count)
+            continue
+        (old_move, old_count) = entries[key]
+        if old_move == move:
+            entries[key] = (move, old_count + count)
+        elif count > old_count:
+            entries[key] = (move, count)
+
+def build_entries(num_columns, num_rows, num_games, depth, budget, pool,
+                  num_trees, entries):
+    '''Builds the entries of a book by self-play. Every game starts on an
+    empty board, and the move of every position of its first moves is found
+    by Monte Carlo tree search, unless the book has it already. The move
+    played is the move of the book, or a random move to stand in for a human,
+    so that the games reach the positions a human is likely to lead to.
+
+    Arguments:
+        num_columns (int): The number of columns that the game board has.
+
+        num_rows (int): The number of rows that the game board has.
+
+        num_games (int): The number of games to play.
+
+        depth (int): The number of moves of every game to add to the book.
+
+        budget (float): The seconds the search takes for every new position.
+
+        pool (Pool): The process pool of the search.
+
+        num_trees (int): The number of processes of the pool.
+
+        entries (dict): The entries of the book, which are added to.
+    '''
+    from random import choice, random
+
+    from build import build_game_graph
+    from canonical import Canonicaliser
+    from mcts import MonteCarloSearch
+
+    (game_board, game_dict, coords_dict, _) = \
+        build_game_graph(num_columns, num_rows)
+    canonicaliser = Canonicaliser(game_board, game_dict, coords_dict,
+                                  num_columns, num_rows)
+    search = MonteCarloSearch(game_board, pool, num_trees)
+    full = (1 << game_board.num_edges()) - 1
+
+    for game in range(num_games):
+        drawn = 0
+        for move_number in range(min(depth, game_board.num_edges())):
+            (key, symmetry) = canonicaliser.hash(drawn)
+            if key in entries:
+                (move, count) = entries[key]
+                entries[key] = (move, count + 1)
+                move = canonicaliser.to_real(move, symmetry)
+            else:
+                move = search.best_move(drawn, budget)
+                entries[key] = (canonicaliser.to_canonical(move, symmetry), 1)
+
+            if random() < DEVIATION:
+                move = choice([bit for bit in range(game_board.num_edges())
+                               if not (drawn >> bit) & 1])
+            drawn |= 1 << move
+            if drawn == full:
+                break
+
+def hit_rates(num_columns, num_rows, entries, num_games, depth):
+    '''Measures how often the positions of games against a random human are
+    found in a book. The computer moves first in about half of the games, and
+    plays the move of the book when it has one and a random move otherwise.
+
+    Arguments:
+        num_columns (int): The number of columns that the game board has.
+
+        num_rows (int): The number of rows that the game board has.
+
+        entries (dict): The entries of the book.
+
+        num_games (int): The number of games to play.
+
+        depth (int): The number of moves of every game to look up.
+
+    Returns:
+        rates (list): A list mapping move numbers to a tuple of the number
+            of positions looked up and found.
+    '''
+    from random import choice
+
+    from build import build_game_graph
+    from canonical import Canonicaliser
+
+    (game_board, game_dict, coords_dict, _) = \
+        build_game_graph(num_columns, num_rows)
+    canonicaliser = Canonicaliser(game_board, game_dict, coords_dict,
+                                  num_columns, num_rows)
+    num_edges = game_board.num_edges()
+    rates = [[0, 0] for move_number in range(min(depth, num_edges))]
+
+    for game in range(num_games):
+        drawn = 0
+        computer_move = choice([0, 1])
+        for move_number in range(len(rates)):
+            undrawn = [bit for bit in range(num_edges)
+                       if not (drawn >> bit) & 1]
+            move = choice(undrawn)
+            # The computer plays every other move.
+            if move_number % 2 == computer_move:
+                (key, symmetry) = canonicaliser.hash(drawn)
+                rates[move_number][0] += 1
+                if key in entries:
+                    rates[move_number][1] += 1
+                    move = canonicaliser.to_real(entries[key][0], symmetry)
+            drawn |= 1 << move
+    return [tuple(rate) for rate in rates]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Builds, merges and reports on opening books.',
+        formatter_class=argparse.RawTextHelpFormatter)
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    build = commands.add_parser("build",
+        help="Build a book by self-play, or add to one")
+    build.add_argument("columns",
+        help="The number of columns of the board",
+        type=int)
+    build.add_argument("rows",
+        help="The number of rows of the board",
+        type=int)
+    build.add_argument("-n",
+        help="Set the number of games to play",
+        type=int,
+        dest="games",
+        default=100)
+    build.add_argument("-p",
+        help="Set the number of moves of every game to add",
+        type=int,
+        dest="depth",
+        default=6)
+    build.add_argument("-t",
+        help="Set the seconds to search every new position",
+        type=float,
+        dest="budget",
+        default=2.0)
+    build.add_argument("-o",
+        help="Set the directory that the book is written to",
+        type=str,
+        dest="directory",
+        default="books")
+
+    merge = commands.add_parser("merge",
+        help="Merge books of the same board size into one")
+    merge.add_argument("output",
+        help="The path of the merged book",
+        type=str)
+    merge.add_argument("books",
+        help="The paths of the books to merge",
+        type=str,
+        nargs="+")
+
+    stats = commands.add_parser("stats",
+        help="Report how often a book is hit in games against random moves")
+    stats.add_argument("book",
+        help="The path of the book",
+        type=str)
+    stats.add_argument("-n",
+        help="Set the number of games to play",
+        type=int,
+        dest="games",
+        default=1000)
+    stats.add_argument("-p",
+        help="Set the number of moves of every game to look up",
+        type=int,
+        dest="depth",
+        default=10)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from multiprocessing import Pool, cpu_count
+
+        os.makedirs(args.directory, exist_ok=True)
+        path = book_path(args.directory, args.columns, args.rows)
+        entries = dict()
+        # Games are added to the book that is there already.
+        if os.path.exists(path):
+            entries = read_book(path)[1]
+        num_trees = cpu_count()
+        with Pool(num_trees) as pool:
+            build_entries(args.columns, args.rows, args.games, args.depth,
+                          args.budget, pool, num_trees, entries)
+        write_book(path, (args.columns, args.rows), entries)
+        print("Wrote", path, "with", len(entries), "positions")
+
+    elif args.command == "merge":
+        size = None
+        entries = dict()
+        for path in args.books:
+            try:
+                (book_size, book_entries) = read_book(path)
+            except RuntimeError as error:
+                parser.error(str(error))
+            if not size is None and book_size != size:
+                parser.error("{} is not a {}x{} book".format(path, *size))
+            size = book_size
+            merge_entries(entries, book_entries)
+        write_book(args.output, size, entries)
+        print("Wrote", args.output, "with", len(entries), "positions")
+
+    else:
+        try:
+            (size, entries) = read_book(args.book)
+        except RuntimeError as error:
+            parser.error(str(error))
+        print("{}x{} book with {} positions".format(size[0], size[1],
+                                                   len(entries)))
+        rates = hit_rates(size[0], size[1], entries, args.games, args.depth)
+        (total_lookups, total_hits) = (0, 0)
+        for move_number, (lookups, hits) in enumerate(rates):
+            if lookups == 0:
+                continue
+            total_lookups += lookups
+            total_hits += hits
+            print("Move {}: {} of {} positions found ({:.0%})".format(
+                move_number + 1, hits, lookups, hits / lookups))
+        if total_lookups > 0:
+            print("Overall: {} of {} positions found ({:.0%})".format(
+                total_hits, total_lookups, total_hits / total_lookups))
@@ -1,8 +1,9 @@
 def build_game_graph(num_columns, num_rows):
     '''A function that builds the game graph, a graphical representation of the
-    dots and edges that are drawn to the Arduino screen. To assist in drawing
-    capabilities and AI strategy, dictionaries store knowledge about vertices
-    and edges in the graph.
+    dots and edges that are drawn to the Arduino screen. The lines drawn on the
+    game graph are kept in a bitboard with one bit per edge. To assist in
+    drawing capabilities and AI strategy, dictionaries store knowledge about
+    vertices and boxes in the graph.
 
     Arguments:
         num_columns (int): The number of columns that the game board has.
@@ -14,70 +15,84 @@ def build_game_graph(num_columns, num_rows):
             number of rows of the game board.
 
     Returns:
-        game_graph (UndirectedAdjacencyGraph): An UndirectedAdjacencyGraph with
-            vertices that correspond to the dots of the game board. Will be
+        game_board (Board): A bitboard of the edges of the game graph. Will be
             used to keep track of lines (edges) drawn throughout game. Vertices
             are labelled starting from 0 increasing left to right, top to
-            bottom.
+            bottom. Horizontal edges are numbered first, left to right, top to
+            bottom, followed by the vertical edges in the same order. Boxes are
+            numbered like the vertices of strat_graph.
 
-        game_dict (dict): A dictionary that maps vertices of game_graph to
+        game_dict (dict): A dictionary that maps vertices of the game graph to
             their coordinate position (x, y) on the game board.
 
-        box_dict (dict): A dictionary that maps the the top left corner of a
-            box to the edges that make up the box.
+        coords_dict (dict): The inverse of game_dict. A dictionary that maps
+            coordinate positions (x, y) on the game board to their vertex.
 
-        strat_box_dict (UndirectedAdjacencyGraph): A dictionary that maps the
-            vertices of strat_graph to the edges that surround it.
+        corner_dict (dict): A dictionary that maps boxes to the game graph
+            vertex at their top left corner.
+
+    The game board also keeps an index mapping every edge to the one or two
+    boxes that it surrounds, so finding the boxes touched by a line does not
+    scan the board.
     '''
-    from graph import UndirectedAdjacencyGraph
+    from board import Board
 
-    # The game graph is the board seenand interacted with by the players.
-    game_graph = UndirectedAdjacencyGraph()
-    # Game dict maps vertices to their coordinates.
+    # Game dict maps vertices to their coordinates and coords dict maps
+    # coordinates back to their vertices.
     game_dict = dict()
+    coords_dict = dict()
     vertex_number = int()
     for i in range(num_rows+1):
         for j in range(num_columns+1):
-            # Add the vertex to the graph.
-            game_graph.add_vertex(vertex_number)
-            # Add map the vertex to its coordinates.
+            # Add map the vertex to its coordinates and back.
             game_dict[vertex_number] = (j, i)
+            coords_dict[(j, i)] = vertex_number
             vertex_number += 1
 
-    # box_dict is a dict that maps the position of the top left
-    # corner of a box to the edges that make up the box.
-    box_dict = dict()
-    # strat_box_dict maps vertices in the strat_graph to the game_graph edges
-    # that surround it (used by the AI).
-    strat_box_dict = dict()
-    # Vertex numbering related to the strat_graph
-    strat_vertex = int()
-    # Vertex numbering related to the game_graph
-    game_vertex = int()
+    # The bit of every edge is its position in the list of edges.
+    edges = list()
+    # Horizontal edges join a vertex to the vertex on its right.
+    for i in range(num_rows+1):
+        for j in range(num_columns):
+            vertex = i*(num_columns+1) + j
+            edges.append((vertex, vertex+1))
+    # Vertical edges join a vertex to the vertex below it.
+    for i in range(num_rows):
+        for j in range(num_columns+1):
+            vertex = i*(num_columns+1) + j
+            edges.append((vertex, vertex+num_columns+1))
+    # The first vertical edge bit.
+    vertical = (num_rows+1)*num_columns
+
+    # box_masks maps boxes to the bitmask of the edges that surround them.
+    box_masks = list()
+    # edge_boxes maps edge bits to the boxes that they surround.
+    edge_boxes = [tuple() for edge in edges]
+    # corner_dict maps boxes to the game vertex at their top left corner.
+    corner_dict = dict()
     for i in range(num_rows):
         for j in range(num_columns):
-
             # Top edge of box
-            edge1 = (game_vertex, game_vertex+1)
+            edge1 = i*num_columns + j
             # Left edge of box
-            edge2 = (game_vertex, game_vertex+num_columns+1)
+            edge2 = vertical + i*(num_columns+1) + j
             # Right edge of box
-            edge3 = (game_vertex+1, game_vertex+num_columns+2)
+            edge3 = edge2 + 1
             # Bottom edge of box
-            edge4 = (game_vertex+num_columns+1, game_vertex+num_columns+2)
+            edge4 = edge1 + num_columns
 
-            box_dict[game_vertex] = {edge1, edge2, edge3, edge4}
-            strat_box_dict[strat_vertex] = {edge1, edge2, edge3, edge4}
+            box = len(box_masks)
+            corner_dict[box] = i*(num_columns+1) + j
+            box_masks.append((1 << edge1) | (1 << edge2) | (1 << edge3) |
+                             (1 << edge4))
 
-            # There is one strategy vertex for every box. There is one game
-            # vertex for every dot in the game board.
-            strat_vertex += 1
-            if j == num_columns-1:
-                game_vertex += 2
-            else:
-                game_vertex += 1
+            # Every edge surrounds at most two boxes.
+            for edge in (edge1, edge2, edge3, edge4):
+                edge_boxes[edge] += (box,)
 
-    return (game_graph, game_dict, box_dict, strat_box_dict)
+    game_board = Board(edges, box_masks, edge_boxes)
+
+    return (game_board, game_dict, coords_dict, corner_dict)
 
 def build_strat_graph(game_dict, num_columns, num_rows):
     '''A function that builds the AI strategy graph, a graphical representation
@@ -98,22 +113,19 @@ def build_strat_graph(game_dict, num_columns, num_rows):
             number of rows in the game board.
 
     Returns:
-        strat_graph (UndirectedAdjacencyGraph): An UndirectedAdjacencyGraph
-            with vertices that correspond to the centers of the boxes in the
-            game. The initial edges connect all the vertices in a grid pattern.
-            Is used to keep track of long chains for AI strategy.
+        strat_graph (DenseAdjacencyGraph): A DenseAdjacencyGraph with vertices
+            that correspond to the centers of the boxes in the game. The
+            initial edges connect all the vertices in a grid pattern. Is used
+            to keep track of long chains for AI strategy.
 
         strat_dict (dict): A dictionary that maps the vertices of strat_graph
             to the edges that they are a part of. Used to build
             edge_intersect_dict.
     '''
-    from graph import UndirectedAdjacencyGraph
-
-    strat_graph = UndirectedAdjacencyGraph()
+    from graph import DenseAdjacencyGraph
 
-    # Add vertices to strat_graph.
-    for v in range(num_columns*num_rows):
-        strat_graph.add_vertex(v)
+    # Add vertices to strat_graph. Every box has at most 4 neighbours.
+    strat_graph = DenseAdjacencyGraph(num_columns*num_rows, 4)
 
     # Add strat_graph edges and build strat_dict which maps strat_graph vertices
     # to the edges that they are a part of.
@@ -208,11 +220,19 @@ def build_edge_intersect_dict(strat_dict, num_columns, num_rows):
 
     Returns:
         edge_intersect_dict (dict): A dictionary that maps the initial edges of
-            strat_graph to the edges in game_graph that intersect them. Used
-            for removing edges from strat_graph when lines are drawn that
-            intersect them.
+            strat_graph to the number of the game_graph edge that intersects
+            them (its bit on the game board). Used for removing edges from
+            strat_graph when lines are drawn that intersect them.
+
+        strat_intersect_dict (dict): The inverse of edge_intersect_dict. Maps
+            game_graph edge numbers to the strat_graph edge that they
+            intersect. Game edges on the border of the board intersect no
+            strat_graph edge and are not in the dictionary.
     '''
     edge_intersect_dict = dict()
+    strat_intersect_dict = dict()
+    # The number of the first vertical game edge.
+    vertical = (num_rows+1)*num_columns
     # Iterate through the vertices of strat_graph
     for vertex, edges in strat_dict.items():
         visited = set() # Keep track of edges that have been seen already
@@ -226,30 +246,28 @@ def build_edge_intersect_dict(strat_dict, num_columns, num_rows):
             # If the edge is new, map it to a game_graph edge that, when drawn,
             # will interesect it.
             else:
-                # If the strat_graph edge is horizontal:
-                if (max(edge) - min(edge)) == 1:
+                # If the strat_graph edge is horizontal (joins two vertices of
+                # the same row):
+                if (max(edge) - min(edge)) == 1 and \
+                    max(edge) % num_columns != 0:
                     # Depth accounts for disparity between game vertex numbering
                     # and strat vertex numbering
                     depth = (max(edge) // num_columns)
-                    coordinate1 = min(edge) + depth + 1
-                    coordinate2 = max(edge) + num_columns + depth + 1
-
-                    # Map a strat edge to the game edge that will interesect it
-                    # when it is drawn.
-                    edge_intersect_dict[edge] = (coordinate1, coordinate2)
+                    # The vertical game edge between the two boxes.
+                    game_edge = vertical + min(edge) + depth + 1
 
                 # if the strat_graph edge is vertical:
-                elif (max(edge) - min(edge)) > 1:
-                    # Depth accounts for disparity between game vertex numbering
-                    # and strat vertex numbering
-                    depth = (max(edge) // num_rows)
-                    coordinate1 = min(edge) + num_rows + depth
-                    coordinate2 = min(edge) + num_rows + depth + 1
-                    # Map a strat edge to the game edge that will interesect it
-                    # when it is drawn.
-                    edge_intersect_dict[edge] = (coordinate1, coordinate2)
+                else:
+                    # The horizontal game edge between the two boxes. It is the
+                    # bottom edge of the upper box.
+                    game_edge = max(edge)
+
+                # Map a strat edge to the game edge that will interesect it
+                # when it is drawn, and back.
+                edge_intersect_dict[edge] = game_edge
+                strat_intersect_dict[game_edge] = edge
 
                 # The strat edge has now been visited
                 visited.add(edge)
 
-    return edge_intersect_dict
+    return (edge_intersect_dict, strat_intersect_dict)
@@ -0,0 +1,303 @@
+# The number of coins that a chain of a strings and coins component is
+# shortened to. Every chain of three or more coins has the same nimstring
+# value, but a chain of two does not.
+CHAIN_LENGTH = 3
+
+def zobrist_keys(num_edges):
+    '''Returns a list mapping the edge bits of a board to a random 64 bit
+    key. The keys are fixed so that hashes are the same from game to game and
+    can be stored on the disk.
+
+    Arguments:
+        num_edges (int): The number of edges on the board.
+    '''
+    from random import Random
+
+    generator = Random(num_edges)
+    return [generator.getrandbits(64) for bit in range(num_edges)]
+
+class Canonicaliser:
+    '''Type to reduce the positions of a board to a canonical form, so that
+    the caches and solvers find positions that are the same game under a
+    different name. The search takes the free captures of a position before
+    it looks the position up, since the player to move loses nothing by
+    taking them. The board is turned and flipped by every symmetry of the
+    rectangle (4, or 8 for a square board) and the image with the smallest
+    Zobrist hash is the canonical position.
+
+    Attributes:
+        _box_masks (list): A list mapping boxes to the bitmask of the edges
+            that surround them.
+
+        _edge_boxes (list): A list mapping edge bits to a tuple of the one or
+            two boxes that the edge surrounds.
+
+        _edge_maps (list): A list mapping every symmetry to a tuple mapping
+            edge bits to the bit of their image. Symmetry 0 is the identity.
+
+        _inverse_maps (list): The inverse of every edge map.
+
+        _zobrist (list): A list mapping every symmetry to a list mapping edge
+            bits to the Zobrist key of their image.
+    '''
+
+    def __init__(self, game_board, game_dict, coords_dict, num_columns,
+                 num_rows):
+        '''Finds the symmetries of a board from the coordinates of its dots.
+
+        Arguments:
+            game_board (Board): The bitboard of the game. Only its layout is
+                used.
+
+            game_dict (dict): A dictionary that maps vertices of the game
+                graph to their coordinate position (x, y) on the game board.
+
+            coords_dict (dict): The inverse of game_dict.
+
+            num_columns (int): The number of columns that the game board has.
+
+            num_rows (int): The number of rows that the game board has.
+        '''
+        self._box_masks = [game_board.box_mask(box)
+                           for box in range(game_board.num_boxes())]
+        self._edge_boxes = [game_board.edge_boxes(bit)
+                            for bit in range(game_board.num_edges())]
+
+        # The flips of a rectangle, and the flips of its diagonal as well if
+        # it is a square.
+        transforms = [lambda x, y: (x, y),
+                      lambda x, y: (num_columns - x, y),
+                      lambda x, y: (x, num_rows - y),
+                      lambda x, y: (num_columns - x, num_rows - y)]
+        if num_columns == num_rows:
+            transforms += [lambda x, y: (y, x),
+                           lambda x, y: (num_rows - y, x),
+                           lambda x, y: (y, num_columns - x),
+                           lambda x, y: (num_rows - y, num_columns - x)]
+
+        self._edge_maps = list()
+        self._inverse_maps = list()
+        for transform in transforms:
+            edge_map = list()
+            for bit in range(game_board.num_edges()):
+                (u, v) = game_board.edge(bit)
+                image = (coords_dict[transform(*game_dict[u])],
+                         coords_dict[transform(*game_dict[v])])
+                edge_map.append(game_board.edge_bit(image))
+            inverse_map = [0] * len(edge_map)
+            for bit, image in enumerate(edge_map):
+                inverse_map[image] = bit
+            self._edge_maps.append(tuple(edge_map))
+            self._inverse_maps.append(tuple(inverse_map))
+
+        keys = zobrist_keys(game_board.num_edges())
+        self._zobrist = [[keys[image] for image in edge_map]
+                         for edge_map in self._edge_maps]
+
+    def num_symmetries(self):
+        '''Returns the number of symmetries of the board, 4 or 8.'''
+        return len(self._edge_maps)
+
+    def edge_map(self, symmetry):
+        '''Returns the tuple mapping edge bits to the bit of their image under
+        a symmetry.
+
+        Arguments:
+            symmetry (int): A symmetry of the board.
+        '''
+        return self._edge_maps[symmetry]
+
+    def image(self, drawn, symmetry):
+        '''Returns the bitmask of the drawn edges of a position turned or
+        flipped by a symmetry.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+            symmetry (int): A symmetry of the board.
+
+        Runtime:
+            O(n) where n is the number of edges on the board.
+        '''
+        edge_map = self._edge_maps[symmetry]
+        image = int()
+        bit = 0
+        while drawn:
+            if drawn & 1:
+                image |= 1 << edge_map[bit]
+            drawn >>= 1
+            bit += 1
+        return image
+
+    def free_captures(self, drawn):
+        '''Closes every box that can be closed without giving another box a
+        third side, until none is left. The player to move is never worse off
+        for taking them, so the value of a position is the number of boxes
+        closed plus the value of the position that is left.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+        Runtime:
+            O(b) where b is the number of boxes on the board.
+
+        Returns:
+            drawn (int): The bitmask of the drawn edges after the captures.
+
+            captured (int): The number of boxes closed.
+        '''
+        captured = 0
+        todolist = [box for box, mask in enumerate(self._box_masks)
+                    if bin(drawn & mask).count("1") == 3]
+        while todolist:
+            box = todolist.pop()
+            left = self._box_masks[box] & ~drawn
+            # The box was closed by the side of another box.
+            if left == 0:
+                continue
+            bit = left.bit_length() - 1
+            others = [other for other in self._edge_boxes[bit] if other != box]
+            # Closing the box gives the box on the other side a third side,
+            # so the other player may be able to take it.
+            if others and \
+                bin(drawn & self._box_masks[others[0]]).count("1") == 2:
+                continue
+
+            drawn |= left
+            captured += 1
+            for other in others:
+                # The box on the other side is closed too if it had three.
+                if drawn & self._box_masks[other] == self._box_masks[other]:
+                    captured += 1
+        return (drawn, captured)
+
+    def hash(self, drawn):
+        '''Returns the canonical Zobrist hash of a position, the smallest of
+        the hashes of its images under the symmetries of the board. It is the
+        same hash as the transposition table of the search uses.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+        Runtime:
+            O(s*n) where s is the number of symmetries and n is the number of
+                edges on the board.
+
+        Returns:
+            key (int): The canonical hash.
+
+            symmetry (int): The symmetry whose image has that hash.
+        '''
+        key = None
+        best_symmetry = 0
+        for symmetry, keys in enumerate(self._zobrist):
+            image_key = int()
+            for bit in range(len(keys)):
+                if (drawn >> bit) & 1:
+                    image_key ^= keys[bit]
+            if key is None or image_key < key:
+                key = image_key
+                best_symmetry = symmetry
+        return (key, best_symmetry)
+
+    def to_canonical(self, bit, symmetry):
+        '''Returns the edge of the canonical position that an edge of the
+        real board is taken to.
+
+        Arguments:
+            bit (int): An edge bit of the real board.
+
+            symmetry (int): The symmetry returned by hash.
+        '''
+        return self._edge_maps[symmetry][bit]
+
+    def to_real(self, bit, symmetry):
+        '''Returns the edge of the real board that an edge of the canonical
+        position comes from.
+
+        Arguments:
+            bit (int): An edge bit of the canonical position.
+
+            symmetry (int): The symmetry returned by hash.
+        '''
+        return self._inverse_maps[symmetry][bit]
+
+def reduce_component(grounds, edges):
+    '''Reduces a strings and coins component to a smaller one with the same
+    nimstring value. Every chain of coins with two strings is shortened to
+    CHAIN_LENGTH coins, and a component that is only a long chain or a loop is
+    removed, since every move in it is loony and its value is 0.
+
+    Arguments:
+        grounds (list): A list mapping coins 0 to n-1 to their number of
+            strings to the ground.
+
+        edges (list): A list of the strings (a, b) between two coins.
+
+    Runtime:
+        O(n*(n+m)) where n is the number of coins and m is the number of
+            strings of the component.
+
+    Returns:
+        grounds (list): The strings to the ground of the coins that are left,
+            renumbered from 0. Empty if the component was removed.
+
+        edges (list): The strings between the coins that are left.
+    '''
+    neighbours = [list() for v in grounds]
+    for (a, b) in edges:
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+    removed = [False] * len(grounds)
+    grounds = list(grounds)
+
+    def is_link(v):
+        # A coin of a chain has two strings.
+        return not removed[v] and grounds[v] + len(neighbours[v]) == 2
+
+    reached = [False] * len(grounds)
+    for start in range(len(grounds)):
+        if reached[start] or not is_link(start):
+            continue
+        # Find the chain of coins with two strings that start is in.
+        reached[start] = True
+        chain = [start]
+        for v in chain:
+            for u in neighbours[v]:
+                if not reached[u] and is_link(u):
+                    reached[u] = True
+                    chain.append(u)
+
+        # A chain whose strings all lead to its own coins or the ground is a
+        # whole component, and a long one is worth nothing.
+        closed = all(u in chain for v in chain for u in neighbours[v])
+        if closed and len(chain) >= CHAIN_LENGTH:
+            for v in chain:
+                removed[v] = True
+                neighbours[v] = list()
+            continue
+        if closed:
+            continue
+
+        # Take coins out of the chain, joining their two strings into one,
+        # until it is short enough.
+        for v in chain[:max(len(chain) - CHAIN_LENGTH, 0)]:
+            ends = neighbours[v]
+            for u in ends:
+                neighbours[u].remove(v)
+            if len(ends) == 2:
+                neighbours[ends[0]].append(ends[1])
+                neighbours[ends[1]].append(ends[0])
+            elif len(ends) == 1:
+                grounds[ends[0]] += 1
+            removed[v] = True
+            neighbours[v] = list()
+
+    number = dict()
+    for v in range(len(grounds)):
+        if not removed[v]:
+            number[v] = len(number)
+    reduced_grounds = [grounds[v] for v in number]
+    reduced_edges = [(number[v], number[u]) for v in number
+                     for u in neighbours[v] if number[v] < number[u]]
+    return (reduced_grounds, reduced_edges)
@@ -84,11 +84,12 @@ uint8_t process_joystick(int8_t *dx, int8_t *dy);
 bool line_request_valid(uint8_t x_0, uint8_t y_0, uint8_t x_1, uint8_t y_1);
 void invalid_request();
 void game_over_screen();
-void draw_box(uint16_t PLAYER_COLOUR, uint8_t num_closed_boxes);
+void draw_box(uint16_t PLAYER_COLOUR, const MoveResult *result);
 void draw_line();
 void send_request_to_server();
 void game_setup();
-void process_drawing();
+void restore_board(const Snapshot *snapshot);
+void process_drawing(const MoveResult *result);
 
 /*
     Initial game setup.
@@ -130,50 +131,29 @@ void loop() {
 
         // If it is the computer's turn:
         if (PLAYER_TURN == COMPUTER_TURN) {
-            // Get the x-coordinate of the first edge to draw.
-            int8_t start_x = srv_get_number('E');
-            if (start_x == -1) {
-                // If error, RESET.
-                RESET = true;
-                break;
-            }
-            // Get the y-coordinate of the first edge to draw.
-            int8_t start_y = srv_get_number('E');
-            if (start_y == -1) {
+            // Get the line that the computer drew and its result.
+            MoveResult result;
+            if (srv_get_move_result(&result) != 0) {
                 // If error, RESET.
                 RESET = true;
                 break;
             }
             // Use the graph coordinates to make screen coordinates.
-            uint8_t draw_x = (COL_WIDTH*start_x)+(DOT_SIZE*start_x)+(X_MARGIN);
-            uint8_t draw_y = (ROW_HEIGHT*start_y)+(DOT_SIZE*start_y)+(Y_MARGIN);
+            uint8_t draw_x = (COL_WIDTH*result.x0)+(DOT_SIZE*result.x0)+(X_MARGIN);
+            uint8_t draw_y = (ROW_HEIGHT*result.y0)+(DOT_SIZE*result.y0)+(Y_MARGIN);
             XY8 s(draw_x, draw_y);
             // Set the first vertex to draw.
             draw_start = s;
 
-            // Get the x-coordinate of the second edge to draw.
-            uint8_t end_x = srv_get_number('E');
-            if (end_x == -1) {
-                // If error, RESET.
-                RESET = true;
-                break;
-            }
-            // Get the y-coordinate of the second edge to draw.
-            uint8_t end_y = srv_get_number('E');
-            if (end_y == -1) {
-                // If error, RESET.
-                RESET = true;
-                break;
-            }
             // Use the graph coordinates to make screen coordinates.
-            draw_x = (COL_WIDTH*end_x)+(DOT_SIZE*end_x)+(X_MARGIN);
-            draw_y = (ROW_HEIGHT*end_y)+(DOT_SIZE*end_y)+(Y_MARGIN);
+            draw_x = (COL_WIDTH*result.x1)+(DOT_SIZE*result.x1)+(X_MARGIN);
+            draw_y = (ROW_HEIGHT*result.y1)+(DOT_SIZE*result.y1)+(Y_MARGIN);
             XY8 e(draw_x, draw_y);
             // Set the second vertex to draw.
             draw_end = e;
 
             // Process the drawing of the line.
-            process_drawing();
+            process_drawing(&result);
             // Go to the top of the loop, if the RESET bool was set, the game
             // will restart.
             break;
@@ -277,8 +257,10 @@ void loop() {
                     // If valid line, send to the server for graph processing.
                     send_request_to_server();
 
-                    // Server checks if line has been made already.
-                    int8_t line_valid = srv_get_number('L');
+                    // Server checks if line has been made already, and sends
+                    // the result of the move if it has not.
+                    MoveResult result;
+                    int8_t line_valid = srv_get_move_result(&result);
                     if (line_valid == -1) {
                         // If error, rest the game.
                         RESET = true;
@@ -292,7 +274,7 @@ void loop() {
                     }
 
                     // Process the drawing of the line.
-                    process_drawing();
+                    process_drawing(&result);
                     // Go to the top of the loop, if the RESET bool was set, the
                     // game will restart.
                     break;
@@ -581,23 +563,11 @@ void game_over_screen() {
     has closed any of them.
     Runs in O(n) where n is the number of closed boxes.
 */
-void draw_box(uint16_t PLAYER_COLOUR, uint8_t num_closed_boxes) {
-    for (int i = 0; i < num_closed_boxes; i++) {
-        // Get the x-positions of the closed box.
-        int8_t box_col = srv_get_number('B');
-        // If there is an error, RESET the game.
-        if (box_col == -1) {
-            RESET = true;
-            return;
-        }
-
-        // Get the y-positions of the closed box.
-        int8_t box_row = srv_get_number('B');
-        // If there is an error, RESET the game.
-        if (box_row == -1) {
-            RESET = true;
-            return;
-        }
+void draw_box(uint16_t PLAYER_COLOUR, const MoveResult *result) {
+    for (int i = 0; i < result->num_boxes; i++) {
+        // The graph coordinates of the top left vertex of the closed box.
+        uint8_t box_col = result->box_x[i];
+        uint8_t box_row = result->box_y[i];
 
         // Calculate the screen x and screen y positions to draw the box.
         uint8_t box_x = (COL_WIDTH*box_col)+(DOT_SIZE*(box_col+1))+(X_MARGIN);
@@ -641,11 +611,10 @@ void draw_line() {
     Runs in O(1)
 */
 void send_request_to_server() {
-    Serial.print("R ");
-    Serial.print(start.x); Serial.print(" ");
-    Serial.print(start.y); Serial.print(" ");
-    Serial.print(end.x); Serial.print(" ");
-    Serial.println(end.y);
+    char request[16];
+    snprintf(request, sizeof(request), "R %d %d %d %d",
+             start.x, start.y, end.x, end.y);
+    srv_send_request(request);
 }
 
 /*
@@ -659,7 +628,7 @@ void game_setup() {
     initialize_joystick(); // Prepare joystick.
 
     // Get the type of game.
-    GAME_TYPE = srv_get_number('G');
+    GAME_TYPE = srv_get_game_type();
     // If the game type is invalid, retry to setup the game.
     if (GAME_TYPE == -1) {
         RESET = true;
@@ -686,6 +655,14 @@ void game_setup() {
         return;
     }
 
+    // Get the snapshot of the game, which holds the game so far if the client
+    // was reset in the middle of one.
+    Snapshot snapshot;
+    if (srv_get_snapshot(&snapshot) != 0) {
+        RESET = true;
+        return;
+    }
+
     PREV_X = 0; // Reset initial cursor x-position
     PREV_Y = 0; // Reset initial cursor y-position
     PLAYER1_SCORE = 0; // Reset score.
@@ -699,26 +676,106 @@ void game_setup() {
     JOY_CENTRE_X = 512; // Reset joystick centre x position
     JOY_CENTRE_Y = 512; // Reset joystick centre y position
     REQUEST_STATE = RS_WAIT_FOR_START; // Reset request state.
-    status_msg("PLAYER 1: FROM?"); // Set the initial status message.
+    restore_board(&snapshot); // Draw the game so far and set the turn.
     UPDATE_CURSOR = true; // Draw the cursor at the top-left vertex.
 }
 
 /*
-    Process the drawing of lines and boxes and sends information about the state
-    of the game to the python server.
+    Draws the lines and boxes of a snapshot of the game sent by the server,
+    and sets the scores and the player turn from it. The snapshot of a new
+    game is an empty board on the first turn.
+    Runs in O(n*m) where n is the number of columns and m is the number of
+    rows.
+*/
+void restore_board(const Snapshot *snapshot) {
+    // Horizontal edges are numbered first, then vertical edges, each left to
+    // right and top to bottom.
+    uint8_t num_horizontal = NUM_COLUMNS*(NUM_ROWS + 1);
+    uint8_t num_edges = num_horizontal + (NUM_COLUMNS + 1)*NUM_ROWS;
+    for (uint8_t edge = 0; edge < num_edges; edge++) {
+        if (!(snapshot->edges[edge/8] & (1 << (edge%8)))) {
+            continue;
+        }
+        // The graph coordinates of the start and end vertices of the line.
+        uint8_t x0, y0, x1, y1;
+        if (edge < num_horizontal) {
+            x0 = edge % NUM_COLUMNS;
+            y0 = edge / NUM_COLUMNS;
+            x1 = x0 + 1;
+            y1 = y0;
+        } else {
+            x0 = (edge - num_horizontal) % (NUM_COLUMNS + 1);
+            y0 = (edge - num_horizontal) / (NUM_COLUMNS + 1);
+            x1 = x0;
+            y1 = y0 + 1;
+        }
+
+        // Use the graph coordinates to make screen coordinates.
+        draw_start = XY8((COL_WIDTH*x0)+(DOT_SIZE*x0)+(X_MARGIN),
+                         (ROW_HEIGHT*y0)+(DOT_SIZE*y0)+(Y_MARGIN));
+        draw_end = XY8((COL_WIDTH*x1)+(DOT_SIZE*x1)+(X_MARGIN),
+                       (ROW_HEIGHT*y1)+(DOT_SIZE*y1)+(Y_MARGIN));
+        draw_line();
+    }
+
+    // A box is closed when its four sides are drawn. Boxes are numbered left
+    // to right and top to bottom.
+    for (uint8_t box_row = 0; box_row < NUM_ROWS; box_row++) {
+        for (uint8_t box_col = 0; box_col < NUM_COLUMNS; box_col++) {
+            uint8_t top = box_row*NUM_COLUMNS + box_col;
+            uint8_t left = num_horizontal + box_row*(NUM_COLUMNS + 1) +
+                box_col;
+            uint8_t sides[4] = {top, (uint8_t) (top + NUM_COLUMNS), left,
+                                (uint8_t) (left + 1)};
+            bool closed = true;
+            for (uint8_t i = 0; i < 4; i++) {
+                if (!(snapshot->edges[sides[i]/8] & (1 << (sides[i]%8)))) {
+                    closed = false;
+                }
+            }
+            if (!closed) {
+                continue;
+            }
+
+            // Each closed box is a point for the player that closed it.
+            uint8_t box = top;
+            if (snapshot->second_boxes[box/8] & (1 << (box%8))) {
+                PLAYER2_SCORE++;
+                PLAYER_COLOUR = RED;
+            } else {
+                PLAYER1_SCORE++;
+                PLAYER_COLOUR = BLUE;
+            }
+
+            // Calculate the screen x and screen y positions to draw the box.
+            uint8_t box_x = (COL_WIDTH*box_col)+(DOT_SIZE*(box_col+1))+
+                (X_MARGIN);
+            uint8_t box_y = (ROW_HEIGHT*box_row)+(DOT_SIZE*(box_row+1))+
+                (Y_MARGIN);
+            TFT.fillRect(box_x, box_y, COL_WIDTH, ROW_HEIGHT, PLAYER_COLOUR);
+        }
+    }
+
+    // Set the status message for the player to move.
+    PLAYER_TURN = snapshot->turn;
+    if (PLAYER_TURN == 1) {
+        status_msg("PLAYER 1: FROM?");
+    } else {
+        status_msg("PLAYER 2: FROM?");
+    }
+}
+
+/*
+    Process the drawing of lines and boxes from the result of a move sent by
+    the python server.
     Bounded by draw_box runtime: O(n) where n is the number of closed boxes.
 */
-void process_drawing() {
+void process_drawing(const MoveResult *result) {
     draw_line(); // Draw the requested line.
 
-    // Get the number of boxes closed by the added line.
-    int8_t num_closed_boxes = srv_get_number('N');
-    // If there is an error, RESET the game.
-    if (num_closed_boxes == -1) {
-        RESET = true;
-        return;
-    // If boxes were closed, the player plays again.
-    } else if (num_closed_boxes > 0) {
+    // If boxes were closed by the added line, the player plays again.
+    uint8_t num_closed_boxes = result->num_boxes;
+    if (num_closed_boxes > 0) {
         PLAY_AGAIN = true;
     }
 
@@ -733,21 +790,15 @@ void process_drawing() {
     }
 
     // Draw the box to the screen.
-    draw_box(PLAYER_COLOUR, num_closed_boxes);
+    draw_box(PLAYER_COLOUR, result);
 
-    // Server checks if the game is over.
-    int8_t game_is_over = srv_get_number('O');
-    // If there is an error, RESET the game.
-    if (game_is_over == -1) {
-        RESET = true;
-        return;
     // If the game is over:
-    } else if (game_is_over == 1) {
+    if (result->game_over) {
         delay(1000); // Delay for 1 second.
         game_over_screen(); // Draw a game over screen.
         // Wait for player to click joystick
         while (process_joystick(0, 0)==0){}
-        Serial.println('A'); // Send acknowledgement.
+        srv_send_line("A"); // Send acknowledgement.
         RESET = true;
         return;
     }
@@ -18,6 +18,74 @@ it's own stderr.
 
 """
 
+# The protocol version of a client that takes the result of a move as a
+# single "M" message, acknowledged once. A client acknowledges the game type
+# with "A <version>" to announce it; a client that sends a plain "A" is sent
+# the result as the separate "E", "L", "N", "B" and "O" messages instead.
+FRAMED_VERSION = 1
+
+# The protocol version of a client that acknowledges numbered messages. A
+# message "<msg> #<n>" is acknowledged with "A #<n>", which acknowledges every
+# message up to and including n, so the server does not have to wait for one
+# message to be acknowledged before it sends the next.
+WINDOWED_VERSION = 2
+
+# The number of messages that may be sent before the oldest of them is
+# acknowledged. The messages in flight have to fit in the 64 byte receive
+# buffer of the Arduino.
+WINDOW_SIZE = 2
+
+# Message numbers count up to this and wrap around to 0. It is more than
+# twice the window size, so an acknowledgement is never mistaken for one of
+# an earlier round.
+SEQUENCE_MODULUS = 10
+
+# The protocol version of a client that checks numbered messages. Every line
+# after the game type, in both directions, ends with "*XX", the exclusive or
+# of its characters in two hexadecimal digits, and lines that fail the check
+# are dropped. The client asks for the messages from n on to be sent again
+# with "N #<n>", and sends its last request again if the answer does not
+# arrive, so a lost or corrupted line is sent again instead of the game being
+# reset.
+CHECKED_VERSION = 3
+
+# The number of times that a message is sent again before the server gives
+# up and resets the game.
+MAX_RETRANSMISSIONS = 3
+
+# The protocol version of a client that takes a snapshot of the game, "S",
+# after the game setup. When a client of this version is reset in the middle
+# of a game, the server sets it up again and sends it the snapshot, so the
+# game goes on where it stopped instead of starting over.
+SNAPSHOT_VERSION = 4
+
+# The protocol version of a client that takes binary frames instead of lines.
+# A frame carries the same message as a line, in fewer bytes: a start byte, the
+# length of the rest of the frame before its CRC, the identifier of the
+# message (with its high bit set if the message is numbered), every field as
+# an unsigned varint (seven bits to a byte, lowest first, the high bit set on
+# all bytes but the last) with the number of the message last, and a CRC-8 of
+# the length, identifier and fields. The client only sends frames once it
+# has received one, so a server that sends lines still understands it.
+BINARY_VERSION = 5
+
+# The byte that starts every frame. It is not an ascii character, so a line
+# is never mistaken for a frame.
+FRAME_START = 0xA5
+
+# The longest frame, not counting its start byte, length and CRC. It is
+# long enough for the snapshot of the largest board.
+MAX_FRAME_LENGTH = 32
+
+# The longest frame that the client sends, a request with four coordinates
+# and its number, with room to spare. A corrupted length is only waited for
+# up to this, so the server does not swallow the frames that come after it.
+MAX_CLIENT_FRAME_LENGTH = 8
+
+# The fields of a message that are written in hexadecimal in its line, by
+# identifier. They are bitmasks, and are sent as one varint each in a frame.
+HEXADECIMAL_FIELDS = {"S": (1, 2)}
+
 # when True this generates output to stderr, when False does not.
 # modify with set_loggin, query with get logging
 logging = True;
@@ -59,6 +127,166 @@ def log_msg(msg):
     if logging:
         print("L |{}|".format(escape_nl(msg)), file=sys.stderr, flush=True)
 
+def checksum(msg):
+    """
+    Return the exclusive or of the characters of msg.
+    """
+    value = 0
+    for char in msg:
+        value ^= ord(char)
+    return value
+
+def add_checksum(msg):
+    """
+    Return msg with its checksum appended as "*XX".
+    """
+    return "{}*{:02X}".format(msg, checksum(msg))
+
+def strip_checksum(msg):
+    """
+    Return msg without its checksum, or None if it has no checksum or the
+    checksum does not match.
+    """
+    (body, star, value) = msg.strip().rpartition("*")
+    if not star or len(value) != 2:
+        return None
+    try:
+        if int(value, 16) != checksum(body):
+            return None
+    except ValueError:
+        return None
+    return body
+
+def crc8(data):
+    """
+    Return the CRC-8 (polynomial x^8 + x^2 + x + 1) of the bytes of data.
+    """
+    value = 0
+    for byte in data:
+        value ^= byte
+        for bit in range(8):
+            if value & 0x80:
+                value = ((value << 1) ^ 0x07) & 0xFF
+            else:
+                value = (value << 1) & 0xFF
+    return value
+
+def encode_frame(msg):
+    """
+    Return the frame of a message "<identifier> <field> ... [#<number>]",
+    without the start byte. Raises ValueError if a field is not an unsigned
+    integer or the message is too long for a frame.
+    """
+    tokens = msg.split()
+    identifier = ord(tokens[0][0])
+    hexadecimal = HEXADECIMAL_FIELDS.get(tokens[0], ())
+    values = list()
+    for index, token in enumerate(tokens[1:]):
+        if token[:1] == "#" and index == len(tokens) - 2:
+            identifier |= 0x80
+            values.append(int(token[1:]))
+        elif index in hexadecimal:
+            values.append(int(token, 16))
+        else:
+            values.append(int(token))
+
+    body = bytearray([identifier])
+    for value in values:
+        if value < 0:
+            raise ValueError("negative field in {!r}".format(msg))
+        while value >= 0x80:
+            body.append(value & 0x7F | 0x80)
+            value >>= 7
+        body.append(value)
+    if len(body) > MAX_FRAME_LENGTH:
+        raise ValueError("message too long for a frame: {!r}".format(msg))
+    frame = bytes([len(body)]) + bytes(body)
+    return frame + bytes([crc8(frame)])
+
+def decode_frame(frame):
+    """
+    Return the message that a frame (without its start byte) carries, as it
+    would be written in a line, or None if the frame fails its CRC or is
+    malformed.
+    """
+    if len(frame) < 3 or frame[0] != len(frame) - 2 or \
+        crc8(frame[:-1]) != frame[-1]:
+        return None
+    identifier = chr(frame[1] & 0x7F)
+    numbered = frame[1] & 0x80
+    hexadecimal = HEXADECIMAL_FIELDS.get(identifier, ())
+
+    values = list()
+    value = shift = 0
+    for byte in frame[2:-1]:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            values.append(value)
+            value = shift = 0
+    # The last varint was cut off.
+    if shift:
+        return None
+    if numbered and not values:
+        return None
+
+    fields = list()
+    for index, value in enumerate(values):
+        if numbered and index == len(values) - 1:
+            fields.append("#{}".format(value))
+        elif index in hexadecimal:
+            fields.append("{:x}".format(value))
+        else:
+            fields.append(str(value))
+    return " ".join([identifier] + fields)
+
+def send_frame_to_client(channel, frame):
+    """
+    Send a frame (without its start byte) to the client over the binary
+    buffer under channel, and log the message that it carries if logging
+    on.
+    """
+    channel.flush()
+    channel.buffer.write(bytes([FRAME_START]) + frame)
+    channel.buffer.flush()
+    if logging:
+        log_msg(decode_frame(frame))
+
+def receive_frame_from_client(channel):
+    """
+    Wait for a frame or a line from the client over the binary buffer under
+    channel. A client sends lines until it has received a frame, and a client
+    that was reset sends lines again. Diagnostic 'D' lines are printed on
+    stderr like in receive_msg_from_client.
+
+    Return the message and whether it came in a frame. The message is None
+    if the frame fails its CRC.
+    """
+    stream = channel.buffer
+    line = bytearray()
+    while True:
+        byte = stream.read(1)[0]
+        if byte == FRAME_START:
+            length = stream.read(1)
+            # A corrupted length is not waited for.
+            if length[0] > MAX_CLIENT_FRAME_LENGTH:
+                return (None, True)
+            frame = length + stream.read(length[0] + 1)
+            return (decode_frame(frame), True)
+        # The client ends its lines with "\r\n", and the "\n" is read here
+        # so that it is not left for the next line read.
+        if byte != ord("\n"):
+            line.append(byte)
+            continue
+
+        msg = line.decode("ascii", "ignore")
+        line = bytearray()
+        if msg.strip()[:1] == "D":
+            if logging:
+                print(msg, file=sys.stderr, flush=True)
+        elif msg.strip():
+            return (msg, False)
+
 def send_msg_to_client(channel, msg):
     """ 
     Send a message to the client over channel, and log it if 
@@ -94,3 +322,175 @@ def receive_msg_from_client(channel):
             break
             
     return msg
+
+class SendWindow:
+    """
+    Keeps up to size numbered messages to the client in flight. Sending
+    only waits for an acknowledgement when the window is full, and the
+    acknowledgements that arrive in the meantime are taken off the input
+    whenever the server next reads from the client, so the round trip of
+    one message overlaps with the sending of the next and with the work
+    that the server does between them.
+
+    A checked window also adds checksums, drops lines from the client that
+    fail theirs, and sends the messages in flight again when the client
+    asks for them or sends its last request again. A binary window sends
+    frames instead of lines, and takes both from the client; it is checked
+    as well, with the CRC of its frames.
+    """
+
+    def __init__(self, size=WINDOW_SIZE, checked=False, binary=False):
+        self.size = size
+        self.checked = checked or binary
+        self.binary = binary
+        self.next_number = 0
+        # The messages in flight, oldest first, as [number, line or frame,
+        # times sent again].
+        self.in_flight = list()
+        # The number of the last request from the client, and the number of
+        # the first message of its answer.
+        self.request_number = None
+        self.answer_number = None
+
+    def send(self, channel_in, channel_out, msg):
+        """
+        Number msg and send it to the client, first waiting for an
+        acknowledgement if the window is full.
+
+        Return False if the client sent something unexpected or a message
+        had to be sent again too many times, True otherwise.
+        """
+        while len(self.in_flight) >= self.size:
+            (body, number) = self._parse(*self._read(channel_in))
+            if body is None:
+                continue
+            if not self._control(channel_out, body, number):
+                return False
+
+        line = "{} #{}".format(msg, self.next_number)
+        if self.binary:
+            line = encode_frame(line)
+        elif self.checked:
+            line = add_checksum(line)
+        self._write(channel_out, line)
+        self.in_flight.append([self.next_number, line, 0])
+        self.next_number = (self.next_number + 1) % SEQUENCE_MODULUS
+        return True
+
+    def receive(self, channel_in, channel_out):
+        """
+        Wait for a message from the client that is not an acknowledgement,
+        taking the acknowledgements that come before it off the input. A
+        request that is sent again is answered with the same messages
+        instead of being returned a second time.
+
+        Return the message without its number and checksum, or None if a
+        message had to be sent again too many times.
+        """
+        while True:
+            (body, number) = self._parse(*self._read(channel_in))
+            if body is None:
+                continue
+            if self._is_control(body, number):
+                if not self._control(channel_out, body, number):
+                    return None
+                continue
+            if number is None:
+                return body
+
+            self.request_number = number
+            self.answer_number = self.next_number
+            return body
+
+    def _read(self, channel_in):
+        """
+        Wait for a message from the client. Return it and whether it came in
+        a frame, which was checked when it was read.
+        """
+        if self.binary:
+            return receive_frame_from_client(channel_in)
+        return (receive_msg_from_client(channel_in), False)
+
+    def _write(self, channel_out, line):
+        """
+        Send a line or a frame to the client.
+        """
+        if self.binary:
+            send_frame_to_client(channel_out, line)
+        else:
+            send_msg_to_client(channel_out, line)
+
+    def _parse(self, msg, framed=False):
+        """
+        Split a message from the client into its body and number (None if
+        it is not numbered). The body is None if the message fails its
+        checksum or CRC.
+        """
+        if msg is None:
+            return (None, None)
+        if logging:
+            log_msg(msg)
+        msg = msg.strip()
+        # A client that was reset sends its timeouts without a checksum.
+        if msg == "T":
+            return (msg, None)
+        if self.checked and not framed:
+            msg = strip_checksum(msg)
+            if msg is None:
+                return (None, None)
+        (body, space, number) = msg.rpartition(" ")
+        if number[:1] == "#" and number[1:].isdigit():
+            return (body, int(number[1:]))
+        return (msg, None)
+
+    def _is_control(self, body, number):
+        """
+        Return True if a message from the client is about the messages in
+        flight rather than a new request.
+        """
+        return not number is None and \
+            (body in ("A", "N") or number == self.request_number)
+
+    def _control(self, channel_out, body, number):
+        """
+        Handle an acknowledgement "A #<n>" of the messages up to n, a request
+        "N #<n>" to send the messages from n on again, which acknowledges the
+        messages before n, or the last request sent again because its answer
+        was lost.
+
+        Return False if the message is none of these, or a message had to be
+        sent again too many times.
+        """
+        if not self._is_control(body, number):
+            return False
+        numbers = [entry[0] for entry in self.in_flight]
+        if body == "A":
+            # An acknowledgement of messages that are no longer in flight is
+            # a late copy.
+            if number in numbers:
+                del self.in_flight[:numbers.index(number) + 1]
+            return True
+        if body == "N":
+            if number == self.next_number:
+                self.in_flight = list()
+            elif number in numbers:
+                del self.in_flight[:numbers.index(number)]
+                return self._resend(channel_out, number)
+            return True
+        return self._resend(channel_out, self.answer_number)
+
+    def _resend(self, channel_out, number):
+        """
+        Send the messages in flight from number on again.
+
+        Return False if one of them has been sent again too many times.
+        """
+        numbers = [entry[0] for entry in self.in_flight]
+        if not number in numbers:
+            return True
+        for entry in self.in_flight[numbers.index(number):]:
+            entry[2] += 1
+            if entry[2] > MAX_RETRANSMISSIONS:
+                return False
+            self._write(channel_out, entry[1])
+        return True
@@ -96,65 +96,362 @@ class UndirectedAdjacencyGraph:
         '''Returns the set of all vertices in the graph.'''
         return set(self._vertices.keys())
 
+    def subgraph(self, vertices):
+        '''Returns a view of the subgraph induced by a set of vertices: the
+        vertices and every edge of the graph between two of them. The
+        subgraph is not copied.
+
+        Arguments:
+            vertices (set): A set of vertices of the graph, such as one of its
+                components.
+
+        Runtime:
+            O(n+m) where n is the number of vertices in the subgraph and m is
+                the number of edges in the subgraph.
+
+        Returns:
+            InducedSubgraph: A view of the induced subgraph.
+        '''
+        return InducedSubgraph(self, vertices)
+
     def clear(self):
         '''Method to clear the game graph for consecutive games played.'''
         self._vertices = dict()
 
-    def is_cyclic_util(self, v, visited, parent):
-        '''A recursive util for finding cycles. Used by the is_cyclic method.
+    def is_cyclic(self):
+        '''Method to determine if graph is cyclic. Uses an iterative search,
+        so long chains do not run into the recursion limit.
+
+        Runtime:
+            O(n+m) where n is the number of vertices in the graph and m is the
+                number of edges in the graph.
+
+        Returns:
+            bool: True if the graph has a cycle in it, False otherwise.
+        '''
+        from traversal import classify_components
+
+        # The graph has a cycle if any of its components does.
+        return any(cyclic for (_, cyclic) in classify_components(self))
+
+class DenseAdjacencyGraph:
+    '''Type to represent undirected graphs whose vertices are numbered densely
+    from 0, such as the strategy graph, in compact storage. Every vertex has a
+    fixed number of neighbour slots in one flat array, so the graph does not
+    keep a dictionary and a list per vertex. Has the same interface as
+    UndirectedAdjacencyGraph.
+
+    Attributes:
+        _num_vertices (int): The number of vertices in the graph. The vertices
+            are 0 to _num_vertices-1.
+
+        _max_degree (int): The number of neighbour slots of every vertex.
+
+        _slots (array): The neighbour slots of every vertex, one vertex after
+            the other. The neighbours of vertex v are in the first
+            _degrees[v] slots from v*_max_degree.
+
+        _degrees (array): The number of neighbours of every vertex.
+    '''
+    __slots__ = ("_num_vertices", "_max_degree", "_slots", "_degrees")
+
+    def __init__(self, num_vertices=0, max_degree=4):
+        '''Creates a graph with vertices 0 to num_vertices-1 and no edges.
 
         Arguments:
-            v (int): A vertex of the strategy graph.
+            num_vertices (int): The number of vertices to start with.
 
-            visited (dict): A dictionary mapping verticess to whether they have
-                been visited i nthe search or not.
+            max_degree (int): The greatest number of neighbours that a vertex
+                can have. 4 for the strategy graph.
+        '''
+        from array import array
 
-            parent (int): The root vertex that started the search through the
-                the neighbours of v.
+        self._num_vertices = num_vertices
+        self._max_degree = max_degree
+        self._slots = array("i", [-1]) * (num_vertices*max_degree)
+        self._degrees = array("B", [0]) * num_vertices
 
-        Runtime:
-            O(n+m) where n is the number of vertices in the graph and m is the
-                number of edges in the graph (this is dfs).
+    def add_vertex(self, v):
+        ''' Adds a new vertex with identifier v to the graph.
+
+        Arguments:
+            v (int): The vertex identifier to be added. Must be the number of
+                vertices already in the graph.
+
+        Raises:
+            RuntimeError: If the vertex was already in the graph or would leave
+                a gap in the vertex numbering.
+        '''
+        if v != self._num_vertices:
+            raise RuntimeError("Bad argument:"
+                               " Vertex {} is not the next vertex".format(v))
+        self._num_vertices += 1
+        self._slots.extend([-1] * self._max_degree)
+        self._degrees.append(0)
+
+    def is_vertex(self, v):
+        '''Checks whether v is a vertex of the graph.
+
+        Arguments:
+            v (int): The vertex to be checked.
 
         Returns:
-            bool: True if the graph has a cycle in it, False otherwise.
+            bool: True if v is a vertex of the graph, False otherwise.
+        '''
+        return 0 <= v < self._num_vertices
+
+    def add_edge(self, e):
+        ''' Adds edge e to the graph.
+
+        Arguments:
+            e (tuple): The edge to be added as a tuple. The edge goes from e[0]
+                (an int) to e[1] (an int).
+
+        Raises:
+            RuntimeError: When one of the vertices in the edge is not a vertex
+                in the graph, or already has max_degree neighbours.
+        '''
+        (u, v) = e
+        if not 0 <= u < self._num_vertices:
+            raise RuntimeError("Attempt to create an edge with"
+                               " non-existent vertex: {}".format(u))
+        if not 0 <= v < self._num_vertices:
+            raise RuntimeError("Attempt to create an edge with"
+                               " non-existent vertex: {}".format(v))
+
+        start_u = u*self._max_degree
+        degree_u = self._degrees[u]
+        # If the edge already exists, there is nothing to add.
+        if v in self._slots[start_u:start_u+degree_u]:
+            return
+
+        degree_v = self._degrees[v]
+        if degree_u == self._max_degree or degree_v == self._max_degree:
+            raise RuntimeError("Attempt to create an edge with"
+                               " a full vertex: {}".format(e))
+
+        # Fill the first free slot of both vertices.
+        self._slots[start_u+degree_u] = v
+        self._degrees[u] = degree_u + 1
+        self._slots[v*self._max_degree+degree_v] = u
+        self._degrees[v] = degree_v + 1
+
+    def is_edge(self, e):
+        ''' Checks whether an edge e exists in the graph.
+
+        Arguments:
+            e (tuple): The edge to be checked. The edge goes from e[0] (an int)
+                to e[1] (an int).
+
+        Returns:
+            bool: True if e is an edge of the graph, False otherwise.
+        '''
+        start = e[0]*self._max_degree
+        return e[1] in self._slots[start:start+self._degrees[e[0]]]
+
+    def remove_edge(self, e):
+        ''' Removes an edge if it exists.
+
+        Arguments:
+            e (tuple): The edge to be removed. The edge goes from e[0]
+                (an int) to e[1] (an int).
         '''
-        visited[v] = True # The root vertex has now been visited.
-        # Search all vertices that the root vertex is en edge with.
-        for i in self.neighbours(v):
-            # If the vertex has not been found yet, recurse.
-            if visited[i] == False:
-                if (self.is_cyclic_util(i, visited, v)):
-                    return True
+        slots = self._slots
+        degrees = self._degrees
+        for (u, v) in (e, (e[1], e[0])):
+            start = u*self._max_degree
+            last = start + degrees[u] - 1
+            # Find the slot of the neighbour, stopping if there is no edge.
+            try:
+                slot = slots.index(v, start, last+1)
+            except ValueError:
+                return
+            # Move the last neighbour into the slot of the removed one.
+            slots[slot] = slots[last]
+            slots[last] = -1
+            degrees[u] = last - start
 
-            # If a vertex finds an already found vertex that is not its parent,
-            # there must be a cycle.
-            elif parent != i:
-                return True
+    def neighbours(self, v):
+        '''Returns the array of vertices that are neighbours to v.
 
-        # If no cycles are detected, return False.
-        return False
+        Arguments:
+            v (int): A vertex of the graph.
+        '''
+        start = v*self._max_degree
+        return self._slots[start:start+self._degrees[v]]
+
+    def vertices(self):
+        '''Returns the range of all vertices in the graph.'''
+        return range(self._num_vertices)
+
+    def subgraph(self, vertices):
+        '''Returns a view of the subgraph induced by a set of vertices. See
+        UndirectedAdjacencyGraph.subgraph.
+        '''
+        return InducedSubgraph(self, vertices)
+
+    def clear(self):
+        '''Method to clear the graph for consecutive games played.'''
+        self.__init__(0, self._max_degree)
 
     def is_cyclic(self):
-        '''Method to determine if graph is cyclic.
+        '''Method to determine if graph is cyclic. A graph without cycles is a
+        forest, and a forest with n vertices and c components has n-c edges.
 
         Runtime:
             O(n+m) where n is the number of vertices in the graph and m is the
-                number of edges in the graph (this is dfs).
+                number of edges in the graph.
 
         Returns:
             bool: True if the graph has a cycle in it, False otherwise.
         '''
-        # Create a dictionary mapping vertices to whether they have been
-        # visited yet.
-        visited = {v:False for v in self.vertices()}
+        # Every edge is counted once from each end.
+        num_edges = sum(self._degrees) // 2
+
+        # Count the components with a search from every unreached vertex.
+        reached = bytearray(self._num_vertices)
+        num_components = int()
+        for v in range(self._num_vertices):
+            if reached[v]:
+                continue
+            num_components += 1
+            reached[v] = 1
+            todolist = [v]
+            while todolist:
+                for w in self.neighbours(todolist.pop()):
+                    if not reached[w]:
+                        reached[w] = 1
+                        todolist.append(w)
+
+        return num_edges > self._num_vertices - num_components
+
+class InducedSubgraph:
+    '''Type to represent a view of the subgraph of an UndirectedAdjacencyGraph
+    induced by a set of its vertices. Neighbours are read from the graph, so
+    the view only costs the time needed to count its edges.
 
-        for i in self.vertices():
-            # If the vertex has not been visited:
-            if visited[i] == False:
-                # Determine whether the vertex loops to an already seen vertex.
-                if (self.is_cyclic_util(i, visited, -1)) == True:
-                    return True
+    Attributes:
+        _graph (UndirectedAdjacencyGraph): The graph that the view is of.
+
+        _vertices (set): The vertices of the subgraph.
+
+        _num_edges (int): The number of edges of the subgraph when the view
+            was created.
+    '''
+
+    def __init__(self, g, vertices):
+        self._graph = g
+        self._vertices = vertices
+        # Every edge inside the subgraph is seen once from each end.
+        num_ends = int()
+        for v in vertices:
+            for w in g.neighbours(v):
+                if w in vertices:
+                    num_ends += 1
+        self._num_edges = num_ends // 2
+
+    def is_vertex(self, v):
+        '''Checks whether v is a vertex of the subgraph.
+
+        Arguments:
+            v (int): The vertex to be checked.
+
+        Returns:
+            bool: True if v is a vertex of the subgraph, False otherwise.
+        '''
+        return v in self._vertices
+
+    def is_edge(self, e):
+        '''Checks whether an edge e exists in the subgraph.
+
+        Arguments:
+            e (tuple): The edge to be checked. The edge goes from e[0] (an int)
+                to e[1] (an int).
+
+        Returns:
+            bool: True if e is an edge of the subgraph, False otherwise.
+        '''
+        return self.is_vertex(e[0]) and self.is_vertex(e[1]) and \
+            self._graph.is_edge(e)
 
-        # If no cycles are detected, return False.
-        return False
+    def neighbours(self, v):
+        '''Returns the list of vertices of the subgraph that are neighbours to
+        v.
+
+        Arguments:
+            v (int): A vertex of the subgraph.
+        '''
+        return [w for w in self._graph.neighbours(v) if w in self._vertices]
+
+    def vertices(self):
+        '''Returns the set of all vertices in the subgraph. The set must not be
+        modified.'''
+        return self._vertices
+
+    def num_vertices(self):
+        '''Returns the number of vertices in the subgraph.'''
+        return len(self._vertices)
+
+    def num_edges(self):
+        '''Returns the number of edges in the subgraph when the view was
+        created.'''
+        return self._num_edges
+
+def __main():
+    '''Benchmarks DenseAdjacencyGraph against UndirectedAdjacencyGraph on the
+    strategy graph of a large board.'''
+    import time
+    import tracemalloc
+
+    num_columns = num_rows = 150
+    num_vertices = num_columns * num_rows
+    # The grid edges of the strategy graph. Removing the vertical ones leaves
+    # a forest of rows, which is_cyclic has to search completely.
+    horizontal = [(v, v+1) for v in range(num_vertices) if (v+1) % num_columns]
+    vertical = [(v, v+num_columns) for v in range(num_vertices-num_columns)]
+
+    def build(graph_type):
+        if graph_type is DenseAdjacencyGraph:
+            g = graph_type(num_vertices)
+        else:
+            g = graph_type()
+            for v in range(num_vertices):
+                g.add_vertex(v)
+        for e in horizontal + vertical:
+            g.add_edge(e)
+        return g
+
+    for graph_type in (UndirectedAdjacencyGraph, DenseAdjacencyGraph):
+        tracemalloc.start()
+        g = build(graph_type)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # Keep the best of a few runs of every step.
+        times = [float("inf")] * 5
+        for run in range(5):
+            steps = [time.perf_counter()]
+            g = build(graph_type)
+            steps.append(time.perf_counter())
+            for e in vertical:
+                g.remove_edge(e)
+            steps.append(time.perf_counter())
+            for v in g.vertices():
+                for w in g.neighbours(v):
+                    g.is_edge((v, w))
+            steps.append(time.perf_counter())
+            for check in range(100):
+                len(g.vertices())
+            steps.append(time.perf_counter())
+            for check in range(10):
+                g.is_cyclic()
+            steps.append(time.perf_counter())
+            times = [min(best, end - start) for best, start, end in
+                     zip(times, steps, steps[1:])]
+
+        print("{}: {:.0f} KiB, build {:.3f}s, remove {:.3f}s, scan {:.3f}s,"
+              " 100x vertices {:.3f}s, 10x is_cyclic {:.3f}s".format(
+                  graph_type.__name__, memory / 1024, *times))
+
+if __name__ == "__main__":
+    __main()
@@ -0,0 +1,180 @@
+from functools import lru_cache
+
+def simple_endgame(game_board, components):
+    '''Checks whether the game has reached a simple loony endgame: every box
+    that is not closed has exactly two sides drawn, so the board is made of
+    separate chains and loops and every move gives boxes away.
+
+    Arguments:
+        game_board (Board): A bitboard of the lines drawn on the game board.
+
+        components (list): The (vertices, cyclic) tuples of the components of
+            the strategy graph.
+
+    Runtime:
+        O(n) where n is the number of boxes on the board.
+
+    Returns:
+        parts (list): A list of (vertices, is_loop) tuples, one for every
+            chain and loop, or None if the game is not in a simple loony
+            endgame.
+    '''
+    parts = list()
+    for (vertex_set, cyclic) in components:
+        sides = [game_board.sides(v) for v in vertex_set]
+        # Closed boxes are no longer part of the game.
+        if all(side == 4 for side in sides):
+            continue
+        if any(side != 2 for side in sides):
+            return None
+        parts.append((vertex_set, cyclic))
+    return parts
+
+def lengths(parts):
+    '''Returns the sorted tuples of the lengths of the chains and of the loops
+    of a simple loony endgame, the key that its values are memoized on.
+
+    Arguments:
+        parts (list): A list of (vertices, is_loop) tuples.
+    '''
+    chains = tuple(sorted(len(v) for (v, is_loop) in parts if not is_loop))
+    loops = tuple(sorted(len(v) for (v, is_loop) in parts if is_loop))
+    return (chains, loops)
+
+def _without(lengths, length):
+    '''Returns a sorted tuple of lengths with one length removed.'''
+    index = lengths.index(length)
+    return lengths[:index] + lengths[index+1:]
+
+def reply_values(length, is_loop, rest_value):
+    '''Returns what the player who is given a chain or loop scores more than
+    the other player, from then until the end of the game, by taking all of
+    its boxes and by declining the last two boxes of a chain (or last four of
+    a loop). Declining keeps control, since the other player then has to open
+    the next component.
+
+    Arguments:
+        length (int): The number of boxes of the chain or loop.
+
+        is_loop (bool): True for a loop, False for a chain.
+
+        rest_value (int): The value of the endgame of the other components
+            for the player who has to open the next one.
+
+    Returns:
+        take_all (int): The margin after taking every box.
+
+        decline (int): The margin after declining, or None for a chain of
+            one, which cannot be declined.
+    '''
+    take_all = length + rest_value
+    if is_loop:
+        decline = length - 8 - rest_value
+    # A chain of two can only be declined if it was opened at one end.
+    elif length >= 2:
+        decline = length - 4 - rest_value
+    else:
+        decline = None
+    return (take_all, decline)
+
+@lru_cache(maxsize=None)
+def solve(chains, loops):
+    '''Finds the best component to open in a simple loony endgame. The
+    player to move has to open a chain or a loop; the other player then takes
+    every box of it and opens the next component, or takes all but the last
+    two boxes (four of a loop) so that the player to move has to open the next
+    component as well.
+
+    Arguments:
+        chains (tuple): The sorted lengths of the chains.
+
+        loops (tuple): The sorted lengths of the loops.
+
+    Runtime:
+        O(k^2) over all the endgames reachable from this one, where k is the
+            number of components, as every endgame is only solved once.
+
+    Returns:
+        value (int): The number of remaining boxes that the player to move
+            scores more than the other player, when both play perfectly.
+
+        move (tuple): (length, is_loop) of the component to open, or None if
+            there are no components left.
+    '''
+    if not chains and not loops:
+        return (0, None)
+
+    best_value = None
+    best_move = None
+    options = [(length, False) for length in set(chains)] + \
+        [(length, True) for length in set(loops)]
+    for (length, is_loop) in options:
+        if is_loop:
+            (rest_value, _) = solve(chains, _without(loops, length))
+        else:
+            (rest_value, _) = solve(_without(chains, length), loops)
+
+        # The other player replies with whichever is best for them. A chain
+        # of two is opened in its middle, so that it cannot be declined.
+        (take_all, decline) = reply_values(length, is_loop, rest_value)
+        if length == 2 and not is_loop:
+            decline = None
+        if decline is None or take_all >= decline:
+            value = -take_all
+        else:
+            value = -decline
+
+        if best_value is None or value > best_value:
+            best_value = value
+            best_move = (length, is_loop)
+    return (best_value, best_move)
+
+def declines(length, is_loop, chains, loops):
+    '''Checks whether the player that is given a chain or loop should decline
+    its last boxes to keep control, rather than take them all.
+
+    Arguments:
+        length (int): The number of boxes of the chain or loop.
+
+        is_loop (bool): True for a loop, False for a chain.
+
+        chains (tuple): The sorted lengths of the other chains.
+
+        loops (tuple): The sorted lengths of the other loops.
+    '''
+    (rest_value, _) = solve(chains, loops)
+    (take_all, decline) = reply_values(length, is_loop, rest_value)
+    return decline is not None and decline > take_all
+
+def opening_edge(game_board, strat_graph, vertex_set, is_loop):
+    '''Returns the edge that opens a chain or loop. A chain of two is opened
+    in its middle, so that the other player cannot decline its boxes. A
+    longer chain is opened at one end and a loop anywhere.
+
+    Arguments:
+        game_board (Board): A bitboard of the lines drawn on the game board.
+
+        strat_graph (UndirectedAdjacencyGraph): The strategy graph, with the
+            edges that have been intersected removed.
+
+        vertex_set (set): The boxes of the chain or loop.
+
+        is_loop (bool): True for a loop, False for a chain.
+
+    Returns:
+        requested_edge (int): The number of the edge to draw.
+    '''
+    if not is_loop and len(vertex_set) == 2:
+        (a, b) = vertex_set
+        shared = game_board.box_mask(a) & game_board.box_mask(b)
+        return shared.bit_length() - 1
+
+    for box in sorted(vertex_set):
+        neighbours = strat_graph.neighbours(box)
+        if is_loop or len(neighbours) <= 1:
+            for bit in game_board.undrawn_sides(box):
+                # Draw the side that does not join the box to its neighbour.
+                if is_loop or not any(other in neighbours
+                                      for other in game_board.edge_boxes(bit)):
+                    return bit
+    return None
@@ -0,0 +1,310 @@
+from time import monotonic
+
+# The exploration constant of the UCT formula that picks which move of the
+# tree to follow.
+EXPLORATION = 1.4
+
+# The seconds kept from the time budget for sending work to the processes and
+# collecting their results.
+MARGIN = 0.05
+
+class MonteCarloSearch:
+    '''Type to pick moves by Monte Carlo tree search. Every process of a pool
+    grows its own tree from the current position for the time budget, playing
+    out the game from every new position with a fast random playout, and the
+    visits of the first moves of every tree are added up (root parallelism).
+    The move visited most is played.
+
+    The pool is started once, when the server starts, and is shared by every
+    game. A search only sends the layout of the board and the drawn edges to
+    the processes.
+
+    Attributes:
+        _pool (Pool): The process pool that runs the trees.
+
+        _num_trees (int): The number of trees grown for every move, one per
+            process of the pool.
+
+        _layout (tuple): The layout of the board that the processes need, a
+            tuple of the boxes of every edge and the mask of every box.
+
+        rollouts (int): The number of playouts of the last search.
+    '''
+
+    def __init__(self, game_board, pool, num_trees):
+        '''Creates a search for the positions of a board.
+
+        Arguments:
+            game_board (Board): The bitboard of the game. Only its layout is
+                used, the lines drawn on it are given to every search.
+
+            pool (Pool): The process pool that runs the trees.
+
+            num_trees (int): The number of processes of the pool.
+        '''
+        self._pool = pool
+        self._num_trees = num_trees
+        edge_boxes = tuple(game_board.edge_boxes(bit)
+                           for bit in range(game_board.num_edges()))
+        box_masks = tuple(game_board.box_mask(box)
+                          for box in range(game_board.num_boxes()))
+        self._layout = (edge_boxes, box_masks)
+        self.rollouts = int()
+
+    def best_move(self, drawn, budget):
+        '''Grows a tree in every process of the pool for the time budget and
+        returns the move that was visited most over all of the trees.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges. At least one edge
+                must be undrawn.
+
+            budget (float): The number of seconds that the search may take.
+
+        Returns:
+            move (int): The bit of the edge to draw.
+        '''
+        from random import getrandbits
+
+        tasks = [(self._layout, drawn, budget - MARGIN, getrandbits(32))
+                 for tree in range(self._num_trees)]
+
+        visits = dict()
+        self.rollouts = int()
+        for (tree_visits, rollouts) in self._pool.map(grow_tree, tasks):
+            self.rollouts += rollouts
+            for bit, count in tree_visits.items():
+                visits[bit] = visits.get(bit, 0) + count
+        return max(visits, key=visits.get)
+
+class _Node:
+    '''Type to represent a position in a search tree.
+
+    Attributes:
+        player (int): The player to move, 0 for the player to move at the root
+            of the tree and 1 for the other player.
+
+        untried (list): The moves that do not have a child yet.
+
+        children (dict): A dictionary mapping moves to the child they lead to.
+
+        visits (int): The number of playouts through the position.
+
+        wins (float): The wins of those playouts for the player that moved
+            into the position. A draw counts as half a win.
+    '''
+    __slots__ = ("player", "untried", "children", "visits", "wins")
+
+    def __init__(self, player, untried):
+        self.player = player
+        self.untried = untried
+        self.children = dict()
+        self.visits = int()
+        self.wins = float()
+
+def _moves(edge_boxes, sides, drawn, full):
+    '''Returns the moves worth trying in a position. A move that closes a box
+    without letting another box be closed is never worse than any other move,
+    so if there is one, it is the only move returned.
+
+    Arguments:
+        edge_boxes (tuple): A tuple mapping edge bits to their boxes.
+
+        sides (list): A list mapping boxes to their number of drawn sides.
+
+        drawn (int): The bitmask of the drawn edges.
+
+        full (int): The bitmask of every edge.
+    '''
+    moves = list()
+    undrawn = full & ~drawn
+    while undrawn:
+        # Isolate the lowest undrawn edge and clear it.
+        lowest = undrawn & -undrawn
+        undrawn ^= lowest
+        bit = lowest.bit_length() - 1
+
+        closes = False
+        gives = False
+        for box in edge_boxes[bit]:
+            if sides[box] == 3:
+                closes = True
+            elif sides[box] == 2:
+                gives = True
+        if closes and not gives:
+            return [bit]
+        moves.append(bit)
+    return moves
+
+def _playout(layout, sides, drawn, full, player, generator):
+    '''Plays a game out to the end from a position: a box is closed whenever
+    one can be, otherwise a random move that gives the next player no box is
+    drawn, and a random move if every move gives a box away.
+
+    Arguments:
+        layout (tuple): The boxes of every edge and the mask of every box.
+
+        sides (list): A list mapping boxes to their number of drawn sides. It
+            is changed by the playout.
+
+        drawn (int): The bitmask of the drawn edges.
+
+        full (int): The bitmask of every edge.
+
+        player (int): The player to move.
+
+        generator (Random): The random number generator of the process.
+
+    Returns:
+        margin (int): The boxes scored in the playout by player 0, less those
+            scored by player 1.
+    '''
+    (edge_boxes, box_masks) = layout
+    order = [bit for bit in range(len(edge_boxes)) if not (drawn >> bit) & 1]
+    generator.shuffle(order)
+    # Boxes with three sides, which the player to move can close.
+    threes = [box for box in range(len(sides)) if sides[box] == 3]
+    margin = int()
+
+    while drawn != full:
+        bit = None
+        # Close a box if one can be closed.
+        while threes and bit is None:
+            box = threes.pop()
+            if sides[box] == 3:
+                bit = (box_masks[box] & ~drawn).bit_length() - 1
+        # Otherwise draw the first undrawn edge that gives no box away.
+        if bit is None:
+            first = None
+            for candidate in order:
+                if (drawn >> candidate) & 1:
+                    continue
+                if first is None:
+                    first = candidate
+                if all(sides[box] < 2 for box in edge_boxes[candidate]):
+                    bit = candidate
+                    break
+            if bit is None:
+                bit = first
+
+        drawn |= 1 << bit
+        closed = 0
+        for box in edge_boxes[bit]:
+            sides[box] += 1
+            if sides[box] == 4:
+                closed += 1
+            elif sides[box] == 3:
+                threes.append(box)
+        if closed:
+            margin += closed if player == 0 else -closed
+        else:
+            player ^= 1
+
+    return margin
+
+def _select(node):
+    '''Returns the move of a fully expanded node whose child has the best
+    upper confidence bound (UCT), trading off how well the move did against
+    how rarely it was tried.
+
+    Arguments:
+        node (_Node): A node whose moves all have a child.
+    '''
+    from math import log, sqrt
+
+    scale = log(node.visits)
+    best_bit = None
+    best_bound = -1.0
+    for bit, child in node.children.items():
+        bound = child.wins / child.visits + \
+            EXPLORATION * sqrt(scale / child.visits)
+        if bound > best_bound:
+            best_bit = bit
+            best_bound = bound
+    return best_bit
+
+def grow_tree(task):
+    '''Grows one search tree from a position until a deadline. Run by the
+    processes of the pool, so it only takes and returns plain data.
+
+    Arguments:
+        task (tuple): The layout of the board, the bitmask of the drawn edges,
+            the number of seconds to search and a seed for the random number
+            generator.
+
+    Returns:
+        visits (dict): A dictionary mapping the moves of the position to the
+            number of playouts that started with them.
+
+        rollouts (int): The number of playouts.
+    '''
+    from random import Random
+
+    (layout, root_drawn, seconds, seed) = task
+    (edge_boxes, box_masks) = layout
+    deadline = monotonic() + seconds
+    generator = Random(seed)
+    full = (1 << len(edge_boxes)) - 1
+    root_sides = [bin(root_drawn & mask).count("1") for mask in box_masks]
+
+    root = _Node(0, _moves(edge_boxes, root_sides, root_drawn, full))
+    rollouts = int()
+    # Always finish at least one playout so that there is a move to play.
+    while rollouts == 0 or monotonic() < deadline:
+        node = root
+        path = [root]
+        drawn = root_drawn
+        sides = list(root_sides)
+        margin = int()
+        player = 0
+
+        while True:
+            # Expand a move that has not been tried yet, if there is one.
+            if node.untried:
+                index = generator.randrange(len(node.untried))
+                bit = node.untried[index]
+                node.untried[index] = node.untried[-1]
+                node.untried.pop()
+                expand = True
+            elif node.children:
+                bit = _select(node)
+                expand = False
+            else:
+                # The game is over.
+                break
+
+            drawn |= 1 << bit
+            closed = 0
+            for box in edge_boxes[bit]:
+                sides[box] += 1
+                if sides[box] == 4:
+                    closed += 1
+            if closed:
+                margin += closed if player == 0 else -closed
+            else:
+                player ^= 1
+
+            if expand:
+                child = _Node(player, _moves(edge_boxes, sides, drawn, full))
+                node.children[bit] = child
+                path.append(child)
+                node = child
+                break
+            node = node.children[bit]
+            path.append(node)
+
+        margin += _playout(layout, sides, drawn, full, player, generator)
+        rollouts += 1
+
+        # Every position on the path is scored for the player that moved into
+        # it, which is the player to move at its parent.
+        for parent, child in zip(path, path[1:]):
+            child.visits += 1
+            if margin == 0:
+                child.wins += 0.5
+            elif (margin > 0) == (parent.player == 0):
+                child.wins += 1
+        root.visits += 1
+
+    visits = {bit: child.visits for bit, child in root.children.items()}
+    return (visits, rollouts)
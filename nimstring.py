@@ -0,0 +1,335 @@
+from functools import lru_cache
+from time import monotonic
+
+from canonical import reduce_component
+from search import OutOfTime
+
+# The greatest number of strings in a component whose value is worked out.
+# Larger components take too long to search.
+MAX_STRINGS = 16
+
+# The number of component shapes whose values are remembered.
+CACHE_SIZE = 1 << 16
+
+# The time at which working out values stops, or None if it may take as long
+# as it needs. Set by winning_move for the time that is left of a move.
+_deadline = None
+
+def shape_key(grounds, edges):
+    '''Returns a key for the shape of a component of a strings and coins
+    position. Two components with the same key are the same up to the
+    numbering of their coins, and the key describes the component completely,
+    so it can be searched from its key alone. Numberings found by a breadth
+    first search from every coin are tried and the smallest key is kept, so
+    the same shape usually gets the same key however its coins are numbered.
+
+    Arguments:
+        grounds (list): A list mapping coins 0 to n-1 to their number of
+            strings to the ground.
+
+        edges (list): A list of the strings (a, b) between two coins.
+
+    Runtime:
+        O(n*(n+m)) where n is the number of coins and m is the number of
+            strings of the component.
+
+    Returns:
+        key (tuple): A tuple (grounds, edges) in the new numbering, with the
+            edges as sorted (a, b) tuples with a <= b.
+    '''
+    neighbours = [list() for v in grounds]
+    for (a, b) in edges:
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+    # Coins are visited in the order of their strings, to find the same
+    # numbering for the same shape more often.
+    for v in range(len(grounds)):
+        neighbours[v].sort(key=lambda u: (grounds[u], len(neighbours[u])))
+
+    # A component that was reduced away has no coins.
+    best = ((), ()) if len(grounds) == 0 else None
+    for start in range(len(grounds)):
+        number = {start: 0}
+        order = [start]
+        for v in order:
+            for u in neighbours[v]:
+                if u not in number:
+                    number[u] = len(order)
+                    order.append(u)
+        key = (tuple(grounds[v] for v in order),
+               tuple(sorted(tuple(sorted((number[a], number[b])))
+                            for (a, b) in edges)))
+        if best is None or key < best:
+            best = key
+    return best
+
+def cut(grounds, edges, string):
+    '''Cuts a string of a component and lets the other player capture every
+    coin that it can then capture for free. Capturing a coin is never worse
+    than any other move unless its last string leads to a coin with two
+    strings; then the player can choose to take every coin but the last two
+    (a loony move), which the player who cut the string never wants to allow.
+
+    Arguments:
+        grounds (list): A list mapping coins 0 to n-1 to their number of
+            strings to the ground.
+
+        edges (list): A list of the strings (a, b) between two coins.
+
+        string (tuple): ("ground", v) to cut a string from coin v to the
+            ground, or ("edge", i) to cut edges[i].
+
+    Runtime:
+        O(n+m) where n is the number of coins and m is the number of strings
+            of the component.
+
+    Returns:
+        parts (list): The components left once the free coins are captured,
+            as a list of (grounds, edges) tuples, or None if the cut is loony.
+    '''
+    grounds = list(grounds)
+    edges = list(edges)
+    if string[0] == "ground":
+        grounds[string[1]] -= 1
+    else:
+        edges.pop(string[1])
+
+    neighbours = [list() for v in grounds]
+    for (a, b) in edges:
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+
+    # Capture every coin with a single string, unless that is loony.
+    captured = [False] * len(grounds)
+    todolist = [v for v in range(len(grounds))
+                if grounds[v] + len(neighbours[v]) == 1]
+    while todolist:
+        v = todolist.pop()
+        if captured[v] or grounds[v] + len(neighbours[v]) != 1:
+            continue
+        captured[v] = True
+        if grounds[v]:
+            grounds[v] = 0
+            continue
+
+        u = neighbours[v].pop()
+        neighbours[u].remove(v)
+        strings_left = grounds[u] + len(neighbours[u])
+        # The other player could take this coin and stop before the next.
+        if strings_left == 1:
+            return None
+        # The coin at the other end is captured by the same string.
+        if strings_left == 0:
+            captured[u] = True
+
+    # Split the coins that are left into components.
+    parts = list()
+    reached = list(captured)
+    for start in range(len(grounds)):
+        if reached[start]:
+            continue
+        reached[start] = True
+        order = [start]
+        for v in order:
+            for u in neighbours[v]:
+                if not reached[u]:
+                    reached[u] = True
+                    order.append(u)
+        number = {v: i for i, v in enumerate(order)}
+        part_edges = [(number[v], number[u]) for v in order
+                      for u in neighbours[v] if number[v] < number[u]]
+        part_grounds = [grounds[v] for v in order]
+        # A coin without strings has been captured already.
+        if len(part_edges) + sum(part_grounds) > 0:
+            parts.append((part_grounds, part_edges))
+    return parts
+
+def strings_of(grounds, edges):
+    '''Returns the list of the strings of a component that can be cut, with
+    one string to the ground for every coin that has any, since cutting any
+    of them gives the same position.
+
+    Arguments:
+        grounds (list): A list mapping coins to their strings to the ground.
+
+        edges (list): A list of the strings (a, b) between two coins.
+    '''
+    strings = [("ground", v) for v in range(len(grounds)) if grounds[v]]
+    strings += [("edge", i) for i in range(len(edges))]
+    return strings
+
+def value(grounds, edges):
+    '''Returns the nimstring value (nimber) of a component, or None if it has
+    too many strings to be worked out once it is reduced.
+
+    Arguments:
+        grounds (list): A list mapping coins to their strings to the ground.
+
+        edges (list): A list of the strings (a, b) between two coins.
+    '''
+    (grounds, edges) = reduce_component(grounds, edges)
+    if sum(grounds) + len(edges) > MAX_STRINGS:
+        return None
+    return _nimber(shape_key(grounds, edges))
+
+def position_value(parts):
+    '''Returns the nimstring value of a list of components, the nim-sum of
+    their values, or None if one of them is too large to be worked out.
+
+    Arguments:
+        parts (list): A list of (grounds, edges) components.
+    '''
+    total = 0
+    for (grounds, edges) in parts:
+        part_value = value(grounds, edges)
+        if part_value is None:
+            return None
+        total ^= part_value
+    return total
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _nimber(key):
+    '''Returns the nimstring value of a component from its shape key. The
+    value is the smallest nimber that is not the value of a move, where the
+    loony moves are left out because they lose.
+
+    Arguments:
+        key (tuple): The shape key of the component.
+
+    Raises:
+        OutOfTime: If the deadline passes. The values worked out so far stay
+            in the cache.
+    '''
+    if not _deadline is None and monotonic() > _deadline:
+        raise OutOfTime()
+    (grounds, edges) = key
+    values = set()
+    for string in strings_of(grounds, edges):
+        parts = cut(grounds, edges, string)
+        if parts is None:
+            continue
+        total = 0
+        for (part_grounds, part_edges) in parts:
+            (part_grounds, part_edges) = \
+                reduce_component(part_grounds, part_edges)
+            total ^= _nimber(shape_key(part_grounds, part_edges))
+        values.add(total)
+
+    nimber = 0
+    while nimber in values:
+        nimber += 1
+    return nimber
+
+def board_component(component, game_board):
+    '''Returns a component of the strategy graph as a strings and coins
+    component. The boxes are the coins, the undrawn edges between two boxes
+    are the strings between coins, and the undrawn edges on the border of the
+    board are the strings to the ground.
+
+    Arguments:
+        component (InducedSubgraph): A view of a component of the strategy
+            graph, with the edges that have been intersected removed.
+
+        game_board (Board): A bitboard of the lines drawn on the game board.
+
+    Returns:
+        coins (list): The boxes of the component, numbered from 0.
+
+        grounds (list): A list mapping coins to their strings to the ground.
+
+        edges (list): A list of the strings (a, b) between two coins.
+    '''
+    coins = sorted(component.vertices())
+    number = {box: i for i, box in enumerate(coins)}
+    grounds = list()
+    edges = list()
+    for box in coins:
+        neighbours = component.neighbours(box)
+        # The strings that do not lead to another box lead to the ground.
+        grounds.append(4 - game_board.sides(box) - len(neighbours))
+        for other in neighbours:
+            if box < other:
+                edges.append((number[box], number[other]))
+    return (coins, grounds, edges)
+
+def winning_move(game_board, components, budget=None):
+    '''Finds a move that leaves a nimstring value of 0 for the other player,
+    who then loses the fight for control of the long chains. Only works out
+    positions where no box can be captured.
+
+    Arguments:
+        game_board (Board): A bitboard of the lines drawn on the game board.
+
+        components (list): Views of the components of the strategy graph, as
+            returned by its subgraph method.
+
+        budget (float): The number of seconds that working out the values may
+            take, or None for no limit.
+
+    Runtime:
+        O(k*s*(n+m)) where k is the number of components, s is the number of
+            strings of a component and n and m are the number of coins and
+            strings of a component, once the values of the shapes are cached.
+
+    Returns:
+        requested_edge (int): The number of the edge to draw, or None if the
+            position cannot be worked out in time or every move loses.
+    '''
+    global _deadline
+
+    if not budget is None:
+        _deadline = monotonic() + budget
+    try:
+        return _winning_move(game_board, components)
+    except OutOfTime:
+        return None
+    finally:
+        _deadline = None
+
+def _winning_move(game_board, components):
+    '''Finds a move that leaves a nimstring value of 0 for the other player.
+    See winning_move.
+    '''
+    parts = list()
+    for component in components:
+        (coins, grounds, edges) = board_component(component, game_board)
+        if sum(grounds) + component.num_edges() == 0:
+            continue
+        # A box that can be captured is not a position that is valued here.
+        if any(grounds[v] + len(component.neighbours(box)) == 1
+               for v, box in enumerate(coins)):
+            return None
+        part_value = value(grounds, edges)
+        if part_value is None:
+            return None
+        parts.append((coins, grounds, edges, part_value))
+
+    total = 0
+    for part in parts:
+        total ^= part[3]
+
+    # The position is lost if its value is already 0.
+    if total == 0:
+        return None
+
+    for (coins, grounds, edges, part_value) in parts:
+        for string in strings_of(grounds, edges):
+            after = cut(grounds, edges, string)
+            if after is None:
+                continue
+            after_value = position_value(after)
+            if after_value is None or total ^ part_value ^ after_value != 0:
+                continue
+
+            # Find the edge of the board that is the string.
+            if string[0] == "edge":
+                (a, b) = edges[string[1]]
+                shared = game_board.box_mask(coins[a]) & \
+                    game_board.box_mask(coins[b])
+                return shared.bit_length() - 1
+            box = coins[string[1]]
+            for bit in game_board.undrawn_sides(box):
+                # A side of the box on the border touches no other box.
+                if len(game_board.edge_boxes(bit)) == 1:
+                    return bit
+    return None
@@ -0,0 +1,314 @@
+import mmap
+import os
+
+# The most edges that a board may have to be solved. Every position of the
+# board has an entry, so a board with more edges needs too large a table.
+MAX_EDGES = 24
+
+# The number of the highest edge bits that split the positions into blocks
+# that the processes solve.
+BLOCK_BITS = 6
+
+# The number of bits of a table entry.
+ENTRY_BITS = 4
+
+class EndgameTable:
+    '''Type to look up the exact values of the positions of a board in a
+    table built by retrograde analysis. The table has an entry for every
+    bitmask of drawn edges, which is the number of the remaining boxes that
+    the player to move scores when both players play perfectly. Entries are
+    packed two to a byte: the value of a position is the boxes of the player
+    to move less the boxes of the other player, and the two add up to the
+    boxes that are left, so four bits are enough.
+
+    The table is memory-mapped, so only the pages that are looked up are
+    read from the disk.
+
+    Attributes:
+        _table (mmap): The memory-mapped table.
+
+        _full (int): The bitmask of every edge of the board.
+
+        _box_masks (list): A list mapping boxes to the bitmask of the edges
+            that surround them.
+
+        _edge_masks (list): A list mapping edge bits to a tuple of the masks
+            of the one or two boxes that the edge surrounds.
+    '''
+
+    def __init__(self, game_board, table):
+        '''Creates a lookup of the positions of a board.
+
+        Arguments:
+            game_board (Board): The bitboard of the game. Only its layout is
+                used.
+
+            table (mmap): The memory-mapped table of the board.
+        '''
+        self._table = table
+        self._full = (1 << game_board.num_edges()) - 1
+        self._box_masks = [game_board.box_mask(box)
+                           for box in range(game_board.num_boxes())]
+        self._edge_masks = [tuple(game_board.box_mask(box)
+                                  for box in game_board.edge_boxes(bit))
+                            for bit in range(game_board.num_edges())]
+
+    def boxes(self, drawn):
+        '''Returns the number of the remaining boxes that the player to move
+        scores with perfect play.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+        Runtime:
+            O(1)
+        '''
+        return (self._table[drawn >> 1] >> ((drawn & 1) * ENTRY_BITS)) & 15
+
+    def best_move(self, drawn):
+        '''Finds the best move of a position from the entries of the
+        positions that it leads to.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges. At least one edge
+                must be undrawn.
+
+        Runtime:
+            O(n) where n is the number of edges on the board.
+
+        Returns:
+            move (int): The bit of the best edge to draw.
+
+            value (int): The value of the position, the boxes that the player
+                to move scores more than the other player.
+        '''
+        remaining = len([mask for mask in self._box_masks
+                         if drawn & mask != mask])
+        best_move = None
+        best_boxes = -1
+        undrawn = self._full & ~drawn
+        while undrawn:
+            # Isolate the lowest undrawn edge and clear it.
+            lowest = undrawn & -undrawn
+            undrawn ^= lowest
+            after = drawn | lowest
+
+            closed = len([mask for mask in
+                          self._edge_masks[lowest.bit_length() - 1]
+                          if after & mask == mask])
+            if closed:
+                boxes = closed + self.boxes(after)
+            else:
+                boxes = remaining - self.boxes(after)
+            if boxes > best_boxes:
+                best_move = lowest.bit_length() - 1
+                best_boxes = boxes
+        return (best_move, 2 * best_boxes - remaining)
+
+def table_path(directory, num_columns, num_rows):
+    '''Returns the path of the table of a board size in a directory.'''
+    return os.path.join(directory, "{}x{}.table".format(num_columns, num_rows))
+
+def load_tables(directory):
+    '''Memory-maps every table in a directory. Mapping a table does not read
+    it, so this takes the same time however large the tables are.
+
+    Arguments:
+        directory (str): The directory of the tables.
+
+    Returns:
+        tables (dict): A dictionary mapping board sizes (columns, rows) to
+            their memory-mapped table. Empty if the directory does not exist.
+    '''
+    tables = dict()
+    if not os.path.isdir(directory):
+        return tables
+    for name in sorted(os.listdir(directory)):
+        (size, extension) = os.path.splitext(name)
+        if extension != ".table":
+            continue
+        try:
+            (num_columns, num_rows) = [int(n) for n in size.split("x")]
+        except ValueError:
+            continue
+
+        num_edges = (num_rows + 1)*num_columns + num_rows*(num_columns + 1)
+        path = os.path.join(directory, name)
+        # A table that was not finished is left out.
+        if os.path.getsize(path) != _table_bytes(num_edges):
+            continue
+        with open(path, "rb") as table_file:
+            tables[(num_columns, num_rows)] = mmap.mmap(
+                table_file.fileno(), 0, access=mmap.ACCESS_READ)
+    return tables
+
+def _table_bytes(num_edges):
+    '''Returns the size in bytes of the table of a board.'''
+    return (1 << num_edges) * ENTRY_BITS // 8
+
+def solve_block(task):
+    '''Solves the positions of one block of a table, the positions that
+    share the highest edge bits. Run by the processes of the pool, so it only
+    takes and returns plain data.
+
+    A move only adds an edge, so the positions that a position leads to have
+    a larger bitmask. They are either in the same block, and solved before it
+    here since the block is solved from its largest bitmask down, or in a
+    block with more of the highest bits set, which was solved and written to
+    the table before this one was started.
+
+    Arguments:
+        task (tuple): The masks of the boxes, the masks of the boxes of every
+            edge, the path of the table, the number of bits below the block
+            bits and the block.
+
+    Runtime:
+        O(p*n) where p is the number of positions in the block and n is the
+            number of edges on the board.
+
+    Returns:
+        block (int): The block that was solved.
+
+        entries (bytes): The packed entries of the block.
+    '''
+    (box_masks, edge_masks, path, low_bits, block) = task
+    full = (1 << len(edge_masks)) - 1
+    base = block << low_bits
+    size = 1 << low_bits
+    # The entries of the block, one to a byte until they are packed.
+    boxes = bytearray(size)
+
+    with open(path, "rb") as table_file:
+        table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        for low in range(size - 1, -1, -1):
+            drawn = base | low
+            remaining = len([mask for mask in box_masks
+                             if drawn & mask != mask])
+            best = 0
+            undrawn = full & ~drawn
+            while undrawn:
+                # Isolate the lowest undrawn edge and clear it.
+                lowest = undrawn & -undrawn
+                undrawn ^= lowest
+                after = drawn | lowest
+
+                if after >> low_bits == block:
+                    after_boxes = boxes[after - base]
+                else:
+                    after_boxes = (table[after >> 1] >>
+                                   ((after & 1) * ENTRY_BITS)) & 15
+
+                closed = len([mask for mask in
+                              edge_masks[lowest.bit_length() - 1]
+                              if after & mask == mask])
+                if closed:
+                    value = closed + after_boxes
+                else:
+                    value = remaining - after_boxes
+                if value > best:
+                    best = value
+            boxes[low] = best
+        table.close()
+
+    entries = bytes(boxes[i] | (boxes[i + 1] << ENTRY_BITS)
+                    for i in range(0, size, 2))
+    return (block, entries)
+
+def build_table(num_columns, num_rows, path, pool):
+    '''Solves every position of a board by retrograde analysis, from the
+    full board back to the empty one, and writes the table to a file.
+
+    Arguments:
+        num_columns (int): The number of columns that the game board has.
+
+        num_rows (int): The number of rows that the game board has.
+
+        path (str): The path of the table file.
+
+        pool (Pool): The process pool that solves the blocks.
+
+    Runtime:
+        O(2^n*n) where n is the number of edges on the board.
+
+    Raises:
+        RuntimeError: If the board has more than MAX_EDGES edges.
+    '''
+    from build import build_game_graph
+
+    (game_board, _, _, _) = build_game_graph(num_columns, num_rows)
+    num_edges = game_board.num_edges()
+    if num_edges > MAX_EDGES:
+        raise RuntimeError("A {}x{} board has {} edges, more than the {} that"
+                           " can be solved".format(num_columns, num_rows,
+                                                   num_edges, MAX_EDGES))
+    box_masks = [game_board.box_mask(box)
+                 for box in range(game_board.num_boxes())]
+    edge_masks = [tuple(game_board.box_mask(box)
+                        for box in game_board.edge_boxes(bit))
+                  for bit in range(num_edges)]
+
+    block_bits = min(BLOCK_BITS, num_edges - 1)
+    low_bits = num_edges - block_bits
+    # Blocks with the same number of highest bits set do not lead to each
+    # other, so they are solved at the same time, most bits set first.
+    layers = [list() for count in range(block_bits + 1)]
+    for block in range(1 << block_bits):
+        layers[bin(block).count("1")].append(block)
+
+    # The table is written under a temporary name, so that a table that was
+    # not finished is never loaded.
+    partial_path = path + ".partial"
+    with open(partial_path, "wb") as table_file:
+        table_file.truncate(_table_bytes(num_edges))
+    with open(partial_path, "r+b") as table_file:
+        table = mmap.mmap(table_file.fileno(), 0)
+        for blocks in reversed(layers):
+            tasks = [(box_masks, edge_masks, partial_path, low_bits, block)
+                     for block in blocks]
+            for (block, entries) in pool.map(solve_block, tasks):
+                start = (block << low_bits) * ENTRY_BITS // 8
+                table[start:start + len(entries)] = entries
+            table.flush()
+        table.close()
+    os.replace(partial_path, path)
+
+if __name__ == "__main__":
+    import argparse
+    from multiprocessing import Pool, cpu_count
+
+    parser = argparse.ArgumentParser(
+        description='Builds the endgame table of a board size.',
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument("columns",
+        help="The number of columns of the board",
+        type=int)
+
+    parser.add_argument("rows",
+        help="The number of rows of the board",
+        type=int)
+
+    # Tables are written to the tables directory unless specified.
+    parser.add_argument("-o",
+        help="Set the directory that the table is written to",
+        type=str,
+        dest="directory",
+        default="tables")
+
+    # Every core is used unless specified.
+    parser.add_argument("-p",
+        help="Set the number of processes",
+        type=int,
+        dest="processes",
+        default=cpu_count())
+
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    path = table_path(args.directory, args.columns, args.rows)
+    with Pool(args.processes) as pool:
+        try:
+            build_table(args.columns, args.rows, path, pool)
+        except RuntimeError as error:
+            parser.error(str(error))
+    print("Wrote", path)
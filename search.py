@@ -0,0 +1,400 @@
+from operator import xor
+from time import monotonic
+
+# The number of undrawn edges at which the endgame search is tried.
+ENDGAME_EDGES = 18
+
+# The seconds that the computer may take for one move. The client waits 3
+# seconds for the computer's move before it times out.
+TIME_BUDGET = 1.0
+
+# The most seconds that a move may be given. The rest of the 3 seconds is
+# left for sending the move, and for the checks of the clock that only come
+# every so often.
+MAX_TIME_BUDGET = 2.0
+
+# Flags for what a transposition table value says about a position.
+EXACT = 0 # The value is the value of the position.
+LOWER = 1 # The position is worth at least the value.
+UPPER = 2 # The position is worth at most the value.
+
+class OutOfTime(Exception):
+    '''Raised inside a search when its time budget has run out.'''
+    pass
+
+class AlphaBetaSearch:
+    '''Type to search the remaining moves of a game for the best move, using
+    negamax with alpha-beta pruning. A position is the bitmask of the drawn
+    edges of a Board and its value is the number of the remaining boxes that
+    the player to move can score more than the other player, when both play
+    perfectly. A move that closes a box scores it and keeps the turn.
+
+    The search deepens iteratively, one move at a time, until it reaches the
+    end of the game or its time runs out, and keeps the best move of the
+    deepest search that finished. Positions past the depth of a search are
+    valued by the boxes scored on the way to them.
+
+    Positions are stored in a transposition table of fixed size, indexed by
+    their Zobrist hash, so positions that are reached by different orders of
+    the same moves are searched once and memory does not grow with the
+    search. A position is hashed under every symmetry of the board and the
+    smallest hash is kept, so a position and its turned or flipped images
+    share one entry. Moves are stored as the edges of the image that gave the
+    smallest hash. The free captures of a position are taken before it is
+    looked up, so the positions that only differ by them share one entry too,
+    and the boxes taken are added to the value of the position that is left.
+
+    Attributes:
+        _num_edges (int): The number of edges on the board.
+
+        _full (int): The bitmask of every edge of the board.
+
+        _edge_masks (list): A list mapping edge bits to a tuple of the masks
+            of the one or two boxes that the edge surrounds.
+
+        _zobrist (list): A list mapping edge bits to a tuple of random 64 bit
+            keys, one for every symmetry. The hash of a position under a
+            symmetry is the exclusive or of the keys of its drawn edges.
+
+        _edge_maps (list): A list mapping every symmetry to a tuple mapping
+            edge bits to the bit of their image.
+
+        _inverse_maps (list): The inverse of every edge map.
+
+        _table (list): The transposition table. Every entry is None or a
+            tuple (key, depth, flag, value, move).
+
+        _table_mask (int): The mask of a hash that gives its table index.
+
+        _canonicaliser (Canonicaliser): The reductions of the positions of the
+            board, or None.
+
+        _deadline (float): The time at which the current search stops.
+
+        nodes (int): The number of positions visited by the last search.
+    '''
+
+    def __init__(self, game_board, table_bits=16, canonicaliser=None):
+        '''Creates a search for the positions of a board.
+
+        Arguments:
+            game_board (Board): The bitboard of the game. Only its layout is
+                used, the lines drawn on it are given to every search.
+
+            table_bits (int): The transposition table has 2**table_bits
+                entries.
+
+            canonicaliser (Canonicaliser): The symmetries and free captures
+                of the board, or None to hash positions as they are.
+        '''
+        from canonical import zobrist_keys
+
+        self._num_edges = game_board.num_edges()
+        self._full = (1 << self._num_edges) - 1
+        self._edge_masks = list()
+        for bit in range(self._num_edges):
+            boxes = game_board.edge_boxes(bit)
+            self._edge_masks.append(tuple(game_board.box_mask(box)
+                                          for box in boxes))
+
+        self._edge_maps = [tuple(range(self._num_edges))]
+        if not canonicaliser is None:
+            self._edge_maps = [canonicaliser.edge_map(symmetry) for symmetry
+                               in range(canonicaliser.num_symmetries())]
+        self._inverse_maps = list()
+        for edge_map in self._edge_maps:
+            inverse_map = [0] * self._num_edges
+            for bit, image in enumerate(edge_map):
+                inverse_map[image] = bit
+            self._inverse_maps.append(inverse_map)
+
+        keys = zobrist_keys(self._num_edges)
+        # The key of an edge under a symmetry is the key of its image.
+        self._zobrist = [tuple(keys[edge_map[bit]]
+                               for edge_map in self._edge_maps)
+                         for bit in range(self._num_edges)]
+
+        self._table = [None] * (1 << table_bits)
+        self._table_mask = (1 << table_bits) - 1
+        self._canonicaliser = canonicaliser
+        self._deadline = float()
+        self.nodes = int()
+
+    def hash(self, drawn):
+        '''Returns the Zobrist hash of a position, the smallest of its hashes
+        under the symmetries of the board.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+        Runtime:
+            O(s*n) where s is the number of symmetries and n is the number of
+                edges on the board.
+        '''
+        return min(self._hashes(drawn))
+
+    def _hashes(self, drawn):
+        '''Returns the tuple of the Zobrist hashes of a position under every
+        symmetry of the board.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+        '''
+        keys = (0,) * len(self._edge_maps)
+        for bit in range(self._num_edges):
+            if (drawn >> bit) & 1:
+                keys = tuple(map(xor, keys, self._zobrist[bit]))
+        return keys
+
+    def best_move(self, drawn, budget=TIME_BUDGET, min_depth=1):
+        '''Searches a position one move deeper at a time until the end of the
+        game is reached or the time budget runs out.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges. At least one edge
+                must be undrawn.
+
+            budget (float): The number of seconds that the search may take.
+
+            min_depth (int): The depth of the first search. Shallow searches
+                are only worth their time when the end of the game cannot be
+                reached, so an endgame is best searched at its full depth
+                straight away.
+
+        Runtime:
+            O(b^d) in the worst case where b is the number of undrawn edges
+                and d is the depth reached. Pruning and the transposition
+                table cut this down by far in practice.
+
+        Returns:
+            move (int): The bit of the best edge to draw found by the deepest
+                search that finished, or None if none finished.
+
+            value (int): The value of the position found by that search, or
+                None. It is exact if depth is the number of undrawn edges.
+
+            depth (int): The number of moves that the deepest search that
+                finished looked ahead, or 0 if none finished.
+        '''
+        self._deadline = monotonic() + budget
+        self.nodes = int()
+        keys = self._hashes(drawn)
+        num_undrawn = bin(self._full & ~drawn).count("1")
+
+        best = (None, None, 0)
+        for depth in range(min(min_depth, num_undrawn), num_undrawn + 1):
+            try:
+                (move, value) = self._search_root(drawn, keys, depth)
+            except OutOfTime:
+                break
+            best = (move, value, depth)
+        return best
+
+    def _search_root(self, drawn, keys, depth):
+        '''Searches every move of a position with a full window, so that the
+        value of the best move is known and not only a bound.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+            keys (tuple): The Zobrist hashes of the position.
+
+            depth (int): The number of moves to look ahead.
+
+        Returns:
+            move (int): The bit of the best edge to draw.
+
+            value (int): The value of the position.
+        '''
+        key = min(keys)
+        symmetry = keys.index(key)
+        entry = self._table[key & self._table_mask]
+        first = None
+        if entry is not None and entry[0] == key:
+            first = self._inverse_maps[symmetry][entry[4]]
+
+        alpha = -self._num_edges - 1
+        beta = self._num_edges + 1
+        best_move = None
+        for bit in self._ordered_moves(drawn, first):
+            value = self._move_value(drawn, keys, bit, depth, alpha, beta)
+            if value > alpha:
+                alpha = value
+                best_move = bit
+
+        self._table[key & self._table_mask] = (key, depth, EXACT, alpha,
+            self._edge_maps[symmetry][best_move])
+        return (best_move, alpha)
+
+    def _move_value(self, drawn, keys, bit, depth, alpha, beta):
+        '''Returns the value of drawing an edge for the player to move, within
+        the window of alpha and beta.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+            keys (tuple): The Zobrist hashes of the position.
+
+            bit (int): The bit of the undrawn edge to draw.
+
+            depth (int): The number of moves to look ahead, including this
+                one.
+
+            alpha (int): The lower end of the window.
+
+            beta (int): The upper end of the window.
+        '''
+        after = drawn | (1 << bit)
+        closed = 0
+        for box_mask in self._edge_masks[bit]:
+            if after & box_mask == box_mask:
+                closed += 1
+
+        after_keys = tuple(map(xor, keys, self._zobrist[bit]))
+        if closed:
+            # The player scores and moves again.
+            return closed + self._negamax(after, after_keys, depth - 1,
+                                          alpha - closed, beta - closed)
+        # The other player moves next.
+        return -self._negamax(after, after_keys, depth - 1, -beta, -alpha)
+
+    def _ordered_moves(self, drawn, first):
+        '''Returns the undrawn edges of a position, with the moves that are
+        likely best first: the best move found before, then moves that close
+        a box, then moves that do not give a box a third side, then the rest.
+        A move that closes a box without letting another box be closed is
+        never worse than any other move, so it is returned alone.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+            first (int): The edge to try first, or None.
+        '''
+        captures = list()
+        safe = list()
+        sacrifices = list()
+        undrawn = self._full & ~drawn
+        while undrawn:
+            # Isolate the lowest undrawn edge and clear it.
+            lowest = undrawn & -undrawn
+            undrawn ^= lowest
+            bit = lowest.bit_length() - 1
+            if bit == first:
+                continue
+
+            after = drawn | lowest
+            closes = False
+            gives = False
+            for box_mask in self._edge_masks[bit]:
+                left = box_mask & ~after
+                if left == 0:
+                    closes = True
+                # A box with one side left can be closed by the next player.
+                elif left & (left - 1) == 0:
+                    gives = True
+
+            if closes and not gives:
+                return [bit]
+            elif closes:
+                captures.append(bit)
+            elif gives:
+                sacrifices.append(bit)
+            else:
+                safe.append(bit)
+
+        moves = captures + safe + sacrifices
+        if first is not None:
+            moves.insert(0, first)
+        return moves
+
+    def _negamax(self, drawn, keys, depth, alpha, beta):
+        '''Returns the value of a position if it is between alpha and beta,
+        otherwise a bound on the value on the side of the window it is on.
+
+        Arguments:
+            drawn (int): The bitmask of the drawn edges.
+
+            keys (tuple): The Zobrist hashes of the position.
+
+            depth (int): The number of moves to look ahead. Past it, forced
+                moves are still played out, and other positions are valued
+                as even.
+
+            alpha (int): The value that the player to move is already sure
+                of.
+
+            beta (int): The value that the other player is already sure the
+                player to move cannot get more than.
+        '''
+        self.nodes += 1
+        # Checking the clock is slow, so it is only done every 1024 nodes.
+        if self.nodes & 1023 == 0 and monotonic() > self._deadline:
+            raise OutOfTime()
+
+        # The free captures are taken straight away, and the position that is
+        # left is the one that is stored.
+        captured = 0
+        if not self._canonicaliser is None:
+            (after, captured) = self._canonicaliser.free_captures(drawn)
+            if captured:
+                taken = after & ~drawn
+                while taken:
+                    lowest = taken & -taken
+                    taken ^= lowest
+                    keys = tuple(map(xor, keys,
+                                     self._zobrist[lowest.bit_length() - 1]))
+                drawn = after
+                alpha -= captured
+                beta -= captured
+
+        if drawn == self._full:
+            return captured
+
+        key = min(keys)
+        symmetry = keys.index(key)
+        index = key & self._table_mask
+        entry = self._table[index]
+        first = None
+        if entry is not None and entry[0] == key:
+            (_, entry_depth, flag, value, first) = entry
+            first = self._inverse_maps[symmetry][first]
+            # A value is only used if it was searched at least as deep.
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return captured + value
+                elif flag == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return captured + value
+
+        moves = self._ordered_moves(drawn, first)
+        # Past the depth of the search, only a move that has to be played,
+        # such as a free capture, is looked at.
+        if depth <= 0 and len(moves) > 1:
+            return captured
+
+        original_alpha = alpha
+        best_value = -self._num_edges - 1
+        best_move = None
+        for bit in moves:
+            value = self._move_value(drawn, keys, bit, depth, alpha, beta)
+            if value > best_value:
+                best_value = value
+                best_move = bit
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        if best_value <= original_alpha:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        # Always replace, so the table keeps the most recent positions.
+        self._table[index] = (key, depth, flag, best_value,
+                              self._edge_maps[symmetry][best_move])
+        return captured + best_value
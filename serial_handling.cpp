@@ -4,35 +4,650 @@
 #include <errno.h>
 #include <assert13.h>
 #include <stdio.h>
+#include <string.h>
+
+// The number of times that the client asks for a message again, or sends its
+// last request again, before it gives up and resets the game.
+static const uint8_t MAX_RETRIES = 3;
+// Message numbers count up to this and wrap around to 0, as on the server.
+static const uint8_t SEQUENCE_MODULUS = 10;
+// The byte that starts every binary frame, as on the server.
+static const uint8_t FRAME_START = 0xA5;
+// The longest frame, not counting its start byte, length and CRC.
+static const uint8_t MAX_FRAME_LENGTH = 32;
+
+// Whether the server numbers and checks its messages, which it does after the
+// game type.
+static bool NUMBERED = false;
+// The number of the next message expected from the server.
+static uint8_t EXPECTED_NUMBER = 0;
+// Whether the expected message has already been asked for again.
+static bool ASKED_AGAIN = false;
+// Whether the server sends binary frames, so that lines are sent to it in
+// frames too.
+static bool BINARY = false;
+// The last request sent to the server, sent again if its answer is lost.
+static char REQUEST[24];
+static bool REQUEST_PENDING = false;
+static uint8_t REQUEST_NUMBER = 0;
+
+/*
+    Returns the exclusive or of the first len characters of a line.
+*/
+static uint8_t checksum(const char *line, size_t len) {
+    uint8_t value = 0;
+    for (size_t i = 0; i < len; i++) {
+        value ^= line[i];
+    }
+    return value;
+}
+
+/*
+    Returns the CRC-8 (polynomial x^8 + x^2 + x + 1) of the first len bytes of
+    a frame.
+*/
+static uint8_t crc8(const uint8_t *frame, size_t len) {
+    uint8_t value = 0;
+    for (size_t i = 0; i < len; i++) {
+        value ^= frame[i];
+        for (uint8_t bit = 0; bit < 8; bit++) {
+            if (value & 0x80) {
+                value = (value << 1) ^ 0x07;
+            } else {
+                value <<= 1;
+            }
+        }
+    }
+    return value;
+}
+
+/*
+    Sends a line "<identifier> <field> ... [#<number>]" to the server as a
+    binary frame: the start byte, the length of the rest of the frame before
+    its CRC, the identifier (with its high bit set if the line is numbered),
+    every field as a varint (seven bits to a byte, lowest first, the high bit
+    set on all bytes but the last) and the CRC-8 of the length, identifier
+    and fields.
+*/
+static void srv_send_frame(const char *line) {
+    uint8_t frame[MAX_FRAME_LENGTH + 1];
+    uint8_t len = 2; // The length and the identifier come first.
+    frame[1] = line[0];
+
+    const char *field = line + 1;
+    while (*field != '\0') {
+        if (*field == ' ') {
+            field++;
+            continue;
+        }
+        // The number of the line is its last field.
+        if (*field == '#') {
+            frame[1] |= 0x80;
+            field++;
+        }
+        char *end;
+        unsigned long value = strtoul(field, &end, 10);
+        if (end == field) {
+            break;
+        }
+        field = end;
+        do {
+            if (len > MAX_FRAME_LENGTH) {
+                return;
+            }
+            frame[len] = value & 0x7F;
+            value >>= 7;
+            if (value != 0) {
+                frame[len] |= 0x80;
+            }
+            len++;
+        } while (value != 0);
+    }
+    frame[0] = len - 1;
+
+    Serial.write(FRAME_START);
+    Serial.write(frame, len);
+    Serial.write(crc8(frame, len));
+}
+
+/*
+    Sends a line to the server. Once the server numbers its messages, the
+    line ends with its checksum "*XX" so that the server can drop it if it
+    is corrupted. Once the server sends binary frames, the line is sent in a
+    frame instead.
+*/
+void srv_send_line(const char *line) {
+    if (BINARY) {
+        srv_send_frame(line);
+        return;
+    }
+    Serial.print(line);
+    if (NUMBERED) {
+        uint8_t value = checksum(line, strlen(line));
+        Serial.print('*');
+        // Always two hexadecimal digits.
+        if (value < 16) {
+            Serial.print('0');
+        }
+        Serial.print(value, HEX);
+    }
+    Serial.println();
+}
+
+/*
+    Asks the server to send the messages from the expected one on again.
+    This also acknowledges every message before it.
+*/
+static void srv_ask_again() {
+    char line[8];
+    snprintf(line, sizeof(line), "N #%d", EXPECTED_NUMBER);
+    srv_send_line(line);
+    ASKED_AGAIN = true;
+}
+
+/*
+    Acknowledges a line read from the server. A numbered line "<msg> #<n>" is
+    acknowledged with "A #<n>", which also acknowledges every line before it,
+    and any other line with "A".
+*/
+static void srv_acknowledge(const char *buf) {
+    const char *number = strrchr(buf, '#');
+    if (number != NULL) {
+        char line[8];
+        snprintf(line, sizeof(line), "A %s", number);
+        srv_send_line(line);
+        EXPECTED_NUMBER = (atoi(number + 1) + 1) % SEQUENCE_MODULUS;
+        ASKED_AGAIN = false;
+    } else {
+        srv_send_line("A");
+    }
+}
+
+/*
+    Reads a byte from the serial port, waiting for it for up to 3 seconds.
+
+    Returns: the byte, or -1 on a timeout.
+*/
+static int16_t serial_readbyte() {
+    unsigned long timeout = 3000; // 3 second timeout for all communications.
+    unsigned long prev_time = millis(); // Set a start time.
+    while (Serial.available() == 0) {
+        if ((millis() - prev_time) > timeout) {
+            return -1;
+        }
+    }
+    return Serial.read();
+}
+
+/*
+    Writes a bitmask sent as a varint of len bytes in hexadecimal, the lowest
+    bits last, as the server writes it in a line.
+
+    Returns: the number of characters written, or -1 if they do not fit.
+*/
+static int16_t varint_to_hex(const uint8_t *varint, uint8_t len, char *buf,
+                             size_t buf_size) {
+    static const char DIGITS[] = "0123456789abcdef";
+    // The number of hexadecimal digits that the bits of the varint take.
+    int16_t num_digits = (7*len + 3)/4;
+    uint8_t digits[(7*MAX_FRAME_LENGTH + 3)/4];
+    for (int16_t i = 0; i < num_digits; i++) {
+        digits[i] = 0;
+        for (uint8_t j = 0; j < 4; j++) {
+            uint16_t bit = 4*i + j;
+            if (bit/7 < len && (varint[bit/7] >> (bit%7)) & 1) {
+                digits[i] |= 1 << j;
+            }
+        }
+    }
+    // Leading zeros are left out, but 0 has one digit.
+    while (num_digits > 1 && digits[num_digits - 1] == 0) {
+        num_digits--;
+    }
+    if ((size_t) num_digits + 1 > buf_size) {
+        return -1;
+    }
+    for (int16_t i = 0; i < num_digits; i++) {
+        buf[i] = DIGITS[digits[num_digits - 1 - i]];
+    }
+    buf[num_digits] = '\0';
+    return num_digits;
+}
+
+/*
+    Writes the message of a binary frame (without its start byte and CRC)
+    as the server writes it in a line: decimal fields, the bitmasks of a
+    snapshot in hexadecimal and the number of the message as "#<n>".
+
+    Returns: the length of the line, or -1 if the frame is malformed or the
+        line does not fit.
+*/
+static int16_t frame_to_line(const uint8_t *frame, char *buf,
+                             size_t buf_size) {
+    uint8_t len = frame[0] + 1;
+    char identifier = frame[1] & 0x7F;
+    bool numbered = frame[1] & 0x80;
+
+    // Every field ends with a byte without its high bit set.
+    uint8_t num_fields = 0;
+    for (uint8_t i = 2; i < len; i++) {
+        if (!(frame[i] & 0x80)) {
+            num_fields++;
+        }
+    }
+    if ((len > 2 && (frame[len - 1] & 0x80)) || (numbered && num_fields == 0)) {
+        return -1;
+    }
+
+    size_t line_len = snprintf(buf, buf_size, "%c", identifier);
+    uint8_t start = 2;
+    for (uint8_t field = 0; field < num_fields; field++) {
+        uint8_t end = start;
+        while (frame[end] & 0x80) {
+            end++;
+        }
+        end++;
+
+        bool number = numbered && field == num_fields - 1;
+        if (!number && identifier == 'S' && field >= 1) {
+            if (line_len + 1 >= buf_size) {
+                return -1;
+            }
+            buf[line_len++] = ' ';
+            int16_t num_digits = varint_to_hex(frame + start, end - start,
+                                               buf + line_len,
+                                               buf_size - line_len);
+            if (num_digits < 0) {
+                return -1;
+            }
+            line_len += num_digits;
+        } else {
+            // Other fields are small numbers.
+            if (end - start > 4) {
+                return -1;
+            }
+            unsigned long value = 0;
+            for (uint8_t i = start; i < end; i++) {
+                value |= (unsigned long) (frame[i] & 0x7F) << (7*(i - start));
+            }
+            line_len += snprintf(buf + line_len, buf_size - line_len,
+                                 number ? " #%lu" : " %lu", value);
+            if (line_len >= buf_size) {
+                return -1;
+            }
+        }
+        start = end;
+    }
+    return line_len;
+}
+
+/*
+    Reads a line or a binary frame from the server, whichever comes. The
+    message of a frame is written to the buffer as a line.
+
+    Arguments:
+
+    buf - Where to store the line.
+
+    buf_size - The size of the buffer.
+
+    block - Whether to wait for data for as long as it takes.
+
+    framed - Set to whether the message came in a frame.
+
+    Returns: the length of the line, -1 on a timeout, or -2 if a frame was
+        cut off or failed its CRC.
+*/
+static int16_t srv_read_message(char *buf, size_t buf_size, bool block,
+                                bool *framed) {
+    unsigned long timeout = 3000; // 3 second timeout for all communications.
+    unsigned long prev_time = millis(); // Set a start time.
+
+    *framed = false;
+    while (Serial.available() == 0) {
+        if (!block && (millis() - prev_time) > timeout) {
+            return -1;
+        }
+    }
+    if (Serial.peek() != FRAME_START) {
+        return serial_readline(buf, buf_size, block);
+    }
+
+    *framed = true;
+    Serial.read(); // The start byte.
+    uint8_t frame[MAX_FRAME_LENGTH + 2];
+    int16_t length = serial_readbyte();
+    // A corrupted length is not waited for.
+    if (length < 1 || length > MAX_FRAME_LENGTH) {
+        return -2;
+    }
+    frame[0] = length;
+    // The identifier, the fields and the CRC.
+    for (int16_t i = 1; i <= length + 1; i++) {
+        int16_t byte = serial_readbyte();
+        if (byte < 0) {
+            return -2;
+        }
+        frame[i] = byte;
+    }
+    if (crc8(frame, length + 1) != frame[length + 1]) {
+        return -2;
+    }
+
+    int16_t line_len = frame_to_line(frame, buf, buf_size);
+    return line_len < 0 ? -2 : line_len;
+}
+
+/*
+    Reads lines from the server until one starts with one of the expected
+    identifiers, and keeps it in the buffer. Prints a 'T' to the server if
+    nothing arrives in time. A binary frame is read as the line that it
+    carries.
+
+    Once the server numbers its messages, a line that fails its checksum or
+    comes after a lost one is dropped and the server is asked to send it
+    again, and a late copy of a line that was already read is dropped. If
+    nothing arrives in time, the expected line is asked for again, and the
+    last request is sent again if it has not been answered, up to MAX_RETRIES
+    times.
+
+    Returns: true if a line was read, false on a timeout.
+*/
+static bool srv_get_line(const char *expected_identifiers, char *buf,
+                         size_t buf_size) {
+    unsigned long timeout = 3000; // 3 second timeout for all communications.
+    unsigned long prev_time = millis(); // Set a start time.
+    uint8_t retries = 0; // The number of times a line was asked for again.
+
+    while (true) {
+        if (!NUMBERED && (millis() - prev_time) > timeout) {
+            srv_send_line("T"); // 'T' denotes a timeout
+            return false;
+        }
+
+        // Only wait for a numbered line for a limited time, as it can be
+        // asked for again.
+        bool framed;
+        int16_t buf_len = srv_read_message(buf, buf_size, !NUMBERED, &framed);
+        // Drop a frame that fails its CRC.
+        if (buf_len == -2) {
+            if (NUMBERED && !ASKED_AGAIN) {
+                srv_ask_again();
+            }
+            continue;
+        }
+        if (buf_len <= 0) {
+            if (!NUMBERED || retries == MAX_RETRIES) {
+                srv_send_line("T"); // 'T' denotes a timeout
+                return false;
+            }
+            retries++;
+            // Asking for the expected line again also acknowledges the lines
+            // before it, in case their acknowledgements were lost.
+            srv_ask_again();
+            if (REQUEST_PENDING) {
+                srv_send_line(REQUEST);
+            }
+            continue;
+        }
+
+        char *number = strrchr(buf, '#');
+        if (NUMBERED && framed) {
+            // A frame was checked with its CRC when it was read. The server
+            // sends frames, so it takes them too.
+            if (number == NULL) {
+                if (!ASKED_AGAIN) {
+                    srv_ask_again();
+                }
+                continue;
+            }
+            BINARY = true;
+        } else if (NUMBERED) {
+            // Drop a line that fails its checksum.
+            char *star = strrchr(buf, '*');
+            if (number == NULL || star == NULL || star < number ||
+                strtol(star + 1, NULL, 16) != checksum(buf, star - buf)) {
+                if (!ASKED_AGAIN) {
+                    srv_ask_again();
+                }
+                continue;
+            }
+            *star = '\0';
+        }
+        if (NUMBERED) {
+            // Drop a line that is not the expected one. If it comes after
+            // the expected one, the expected one was lost.
+            uint8_t received_number = atoi(number + 1);
+            uint8_t ahead = (received_number + SEQUENCE_MODULUS -
+                             EXPECTED_NUMBER) % SEQUENCE_MODULUS;
+            if (ahead != 0) {
+                if (ahead < SEQUENCE_MODULUS / 2 && !ASKED_AGAIN) {
+                    srv_ask_again();
+                }
+                continue;
+            }
+        }
+
+        if (strchr(expected_identifiers, buf[0]) != NULL) {
+            return true;
+        }
+        // An unexpected numbered line is acknowledged all the same, so that
+        // the numbers stay in step.
+        if (NUMBERED) {
+            srv_acknowledge(buf);
+        }
+    }
+}
+
+/*
+    Sends a request to the server. Once the server numbers its messages, the
+    request is numbered too and kept, so that it can be sent again if its
+    answer does not arrive. The server answers a request that it has already
+    answered by sending the answer again.
+*/
+void srv_send_request(const char *request) {
+    if (!NUMBERED) {
+        srv_send_line(request);
+        return;
+    }
+    snprintf(REQUEST, sizeof(REQUEST), "%s #%d", request, REQUEST_NUMBER);
+    REQUEST_NUMBER = (REQUEST_NUMBER + 1) % SEQUENCE_MODULUS;
+    REQUEST_PENDING = true;
+    srv_send_line(REQUEST);
+}
 
 int srv_get_number(char expected_identifier) {
     size_t buf_size = 32; // max size for a read buffer
-    size_t buf_len = 0; // length of read buffer
     char buf[buf_size]; // where to store read bytes
+    char expected_identifiers[2] = {expected_identifier, '\0'};
 
     char received_identifier;
     int desired_quantity;
 
-    unsigned long timeout = 3000; // 3 second timeout for all communications.
-    unsigned long prev_time = millis(); // Set a start time.
+    if (!srv_get_line(expected_identifiers, buf, buf_size)) {
+        return -1;
+    }
+    sscanf(buf, "%c %d", &received_identifier, &desired_quantity);
 
-    while (received_identifier != expected_identifier) {
-        if ((millis() - prev_time) > timeout) {
-            Serial.println('T'); // 'T' denotes a timeout
+    srv_acknowledge(buf);
+    return desired_quantity;
+}
+
+/*
+    Gets the game type from the server, announcing the protocol version of
+    the client with the acknowledgement ("A <version>"). A server that knows
+    the version sends the result of every move as a single "M" message, and
+    numbers and checks the messages after the game type so that it can send
+    the next before the last is acknowledged, and send a lost one again.
+
+    Returns: the game type, or -1 on a timeout.
+*/
+int srv_get_game_type() {
+    size_t buf_size = 32; // max size for a read buffer
+    char buf[buf_size]; // where to store read bytes
+
+    char received_identifier;
+    int game_type;
+
+    // The server numbers its messages from 0 again in every game. Numbered
+    // lines that arrive before the game type are left over from the last
+    // game and are dropped. The server reads lines until it has sent the
+    // game type, so lines are only sent in frames again once it sends one.
+    NUMBERED = false;
+    BINARY = false;
+    EXPECTED_NUMBER = 0;
+    ASKED_AGAIN = false;
+    REQUEST_PENDING = false;
+    REQUEST_NUMBER = 0;
+
+    if (!srv_get_line("G", buf, buf_size)) {
+        return -1;
+    }
+    sscanf(buf, "%c %d", &received_identifier, &game_type);
+
+    Serial.print("A ");
+    Serial.println(PROTOCOL_VERSION);
+
+    // The server numbers and checks every message after the game type.
+    NUMBERED = true;
+    return game_type;
+}
+
+/*
+    Gets the result of a move from the server, sent as a single message
+    "M x0 y0 x1 y1 o n bx by ..." (the line, whether the game is over, the
+    number of closed boxes and the top left vertex of every closed box), and
+    acknowledges it once. A line requested by a player that was already drawn
+    is answered with "L 1" instead.
+
+    Arguments:
+
+    result - Where to store the result of the move.
+
+    Returns: 0 if the result was read, 1 if the requested line was rejected,
+        or -1 if there was a timeout or the message was malformed.
+*/
+int8_t srv_get_move_result(MoveResult *result) {
+    size_t buf_size = 32; // max size for a read buffer
+    char buf[buf_size]; // where to store read bytes
+
+    char received_identifier;
+    int fields[11]; // The line, game over flag, box count and 2 boxes.
+
+    if (!srv_get_line("ML", buf, buf_size)) {
+        return -1;
+    }
+    int num_read = sscanf(buf, "%c %d %d %d %d %d %d %d %d %d %d %d",
+        &received_identifier, &fields[0], &fields[1], &fields[2], &fields[3],
+        &fields[4], &fields[5], &fields[6], &fields[7], &fields[8],
+        &fields[9], &fields[10]);
+
+    // The request has been answered.
+    REQUEST_PENDING = false;
+
+    // The requested line has already been drawn.
+    if (received_identifier == 'L') {
+        if (num_read != 2 || fields[0] != 1) {
+            srv_send_line("T");
             return -1;
         }
+        srv_acknowledge(buf);
+        return 1;
+    }
+
+    // Every box takes two fields after the first six.
+    if (num_read < 7 || fields[5] < 0 || fields[5] > 2 ||
+        num_read != 7 + 2*fields[5]) {
+        srv_send_line("T");
+        return -1;
+    }
 
-        buf_len = serial_readline(buf, buf_size);
-        if (buf_len > 0) {
-            sscanf(buf, "%c %d", &received_identifier, &desired_quantity);
+    result->x0 = fields[0];
+    result->y0 = fields[1];
+    result->x1 = fields[2];
+    result->y1 = fields[3];
+    result->game_over = (fields[4] == 1);
+    result->num_boxes = fields[5];
+    for (uint8_t i = 0; i < result->num_boxes; i++) {
+        result->box_x[i] = fields[6 + 2*i];
+        result->box_y[i] = fields[7 + 2*i];
+    }
+
+    srv_acknowledge(buf);
+    return 0;
+}
+
+/*
+    Reads a bitmask written in hexadecimal, the lowest bits last, into an
+    array of bytes, the lowest bits first.
+
+    Returns: false if a character is not a hexadecimal digit or a bit does
+        not fit in the array.
+*/
+static bool hex_to_bits(const char *hex, uint8_t *bits, size_t num_bytes) {
+    memset(bits, 0, num_bytes);
+    size_t len = strlen(hex);
+    for (size_t i = 0; i < len; i++) {
+        // The i-th digit from the end holds bits 4i to 4i+3.
+        char digit = hex[len - 1 - i];
+        uint8_t value;
+        if (digit >= '0' && digit <= '9') {
+            value = digit - '0';
+        } else if (digit >= 'a' && digit <= 'f') {
+            value = digit - 'a' + 10;
         } else {
-            Serial.println('T'); // 'T' denotes a timeout
-            return -1;
+            return false;
+        }
+        if (i/2 >= num_bytes) {
+            if (value != 0) {
+                return false;
+            }
+            continue;
         }
+        bits[i/2] |= value << (4*(i%2));
     }
+    return true;
+}
 
-    Serial.println('A');
-    return desired_quantity;
+/*
+    Gets the snapshot of the game from the server, sent as a single message
+    "S t e o" after the game setup: the player to move, and the bitmasks of
+    the drawn edges and of the boxes of player 2 in hexadecimal. It is the
+    snapshot of an empty board at the start of a game, and of the game so far
+    when the client was reset in the middle of one.
+
+    Arguments:
+
+    snapshot - Where to store the snapshot.
+
+    Returns: 0 if the snapshot was read, or -1 if there was a timeout or the
+        message was malformed.
+*/
+int8_t srv_get_snapshot(Snapshot *snapshot) {
+    size_t buf_size = 64; // max size for a read buffer
+    char buf[buf_size]; // where to store read bytes
+
+    char received_identifier;
+    int turn;
+    char edges[33]; // 127 edges on the largest board take 32 digits.
+    char second_boxes[15]; // 56 boxes on the largest board take 14 digits.
+
+    if (!srv_get_line("S", buf, buf_size)) {
+        return -1;
+    }
+    int num_read = sscanf(buf, "%c %d %32s %14s", &received_identifier,
+                          &turn, edges, second_boxes);
+    if (num_read != 4 || (turn != 1 && turn != 2) ||
+        !hex_to_bits(edges, snapshot->edges, sizeof(snapshot->edges)) ||
+        !hex_to_bits(second_boxes, snapshot->second_boxes,
+                     sizeof(snapshot->second_boxes))) {
+        srv_send_line("T");
+        return -1;
+    }
+    snapshot->turn = turn;
+
+    srv_acknowledge(buf);
+    return 0;
 }
 
 /*
@@ -48,6 +663,9 @@ int srv_get_number(char expected_identifier) {
 
     length - The maximum length of the string to be read.
 
+    block - Whether to wait for data for as long as it takes. Otherwise the
+        read times out if no data arrives.
+
     Preconditions:  None.
 
     Postconditions: Function will block until a full newline has been
@@ -57,7 +675,7 @@ int srv_get_number(char expected_identifier) {
     Returns: the number of bytes read
 
 */
-int16_t serial_readline(char *line, uint16_t line_size) {
+int16_t serial_readline(char *line, uint16_t line_size, bool block) {
     int bytes_read = 0; // Number of bytes read from the serial port.
     unsigned long timeout = 3000; // 3 second timeout for all communications.
     unsigned long prev_time = millis(); // Set a start time.
@@ -71,7 +689,11 @@ int16_t serial_readline(char *line, uint16_t line_size) {
         }
 
         // Wait until data is available.
-        while (Serial.available() == 0 ) {}
+        while (Serial.available() == 0 ) {
+            if (!block && (millis() - prev_time) > timeout) {
+                return -1;
+            }
+        }
 
         line[bytes_read] = (char) Serial.read();
 
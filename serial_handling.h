@@ -3,8 +3,44 @@
 
 #include <stdint.h>
 
+// The protocol version that the client announces when it acknowledges the
+// game type. Version 1 takes the result of a move as a single "M" message.
+// Version 2 also acknowledges numbered messages "<msg> #<n>" with "A #<n>".
+// Version 3 also checks them and asks for lost or corrupted ones again.
+// Version 4 also takes a snapshot of the game "S" after the game setup, so
+// that it can be brought back into a game after it was reset.
+// Version 5 also takes binary frames, and sends them once it receives one.
+static const uint8_t PROTOCOL_VERSION = 5;
+
+// The result of a move, as sent by the server in a single "M" message.
+struct MoveResult {
+    uint8_t x0, y0; // Graph coordinates of the start vertex of the line.
+    uint8_t x1, y1; // Graph coordinates of the end vertex of the line.
+    bool game_over; // Whether the line was the last one of the game.
+    uint8_t num_boxes; // The number of boxes closed by the line (max 2).
+    uint8_t box_x[2]; // Graph x-coordinates of the closed boxes.
+    uint8_t box_y[2]; // Graph y-coordinates of the closed boxes.
+};
+
+// A snapshot of a game, as sent by the server in a single "S" message.
+struct Snapshot {
+    uint8_t turn; // The player to move (1 or 2).
+    uint8_t edges[16]; // Bitmask of the drawn edges, by edge number.
+    uint8_t second_boxes[7]; // Bitmask of the boxes of player 2, row-major.
+};
+
 int srv_get_number(char expected_identifier);
 
-int16_t serial_readline(char *line, uint16_t line_size);
+int srv_get_game_type();
+
+int8_t srv_get_move_result(MoveResult *result);
+
+int8_t srv_get_snapshot(Snapshot *snapshot);
+
+void srv_send_line(const char *line);
+
+void srv_send_request(const char *request);
+
+int16_t serial_readline(char *line, uint16_t line_size, bool block = true);
 
 #endif
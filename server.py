@@ -1,21 +1,20 @@
-def coords_to_vertex(game_dict, coordinates):
+def coords_to_vertex(coords_dict, coordinates):
     '''Given the coordinates of a vertex, returns its corresponding vertex
     number.
 
     Arguments:
-        game_dict (dict): A dictionary that maps game graph vertices to their
-            coordinates.
+        coords_dict (dict): A dictionary that maps coordinates to their game
+            graph vertices.
 
         coordinates (tuple): The requested x and y coordinates.
 
+    Runtime:
+        O(1)
+
     Returns:
         The vertex related to the requested coordinates or -1 if none is found.
     '''
-    for vertex_identifier, vertex_coordinates in game_dict.items():
-        # If the coordinates match any in the dictionary, return their vertex.
-        if coordinates == vertex_coordinates:
-            return vertex_identifier
-    return -1 # Return -1 if no vertex is found.
+    return coords_dict.get(coordinates, -1)
 
 def vertex_to_coords(game_dict, vertex):
     '''Given a vertex identifier, returns its coordinates in the game graph.
@@ -26,88 +25,88 @@ def vertex_to_coords(game_dict, vertex):
 
         vertex (int): The requested vertex.
 
+    Runtime:
+        O(1)
+
     Returns:
         The vertex coordinates or -1 if non are found.
     '''
-    for vertex_identifier, vertex_coordinates in game_dict.items():
-        # If the vertex matches any in the dictionary, return its coordinates.
-        if vertex == vertex_identifier:
-            return vertex_coordinates
-    return -1 # Return -1 if no coordinates are found.
+    return game_dict.get(vertex, -1)
 
 def draw_line(serial_in, serial_out, requested_edge):
     '''Determines whether requested_edge is a valid line to draw. If it is, the
-    edge information is sent to the client to draw.
+    edge information is sent to the client to draw, unless the client takes
+    framed move results, which carry the edge.
 
     Arguments:
         serial_in: Serial port input channel.
 
         serial_out: Serial port output channel.
 
-        requested_edge (tuple): A requested game graph edge to draw.
+        requested_edge (int): The number of a requested game graph edge to
+            draw (its bit on the game board), or -1 if it is not an edge.
 
     Runtime:
-        O(n) where n is the number of edges in the strategy graph.
+        O(1) because the strategy graph edge intersected by the line is looked
+            up directly.
 
     Returns:
         -1 if there is an error, 0 if no line is drawn (invalid line), or 1 if
             the line is valid and sent to the client for drawing.
     '''
-    # game_graph is a graph representation of the game board. game_dict is a
-    # dictionary that maps vertices to their x and y coordinates. box_dict is a
-    # dictionary that maps game vertcies to the edges that box them in.
-    global game_graph, game_dict, box_dict
+    # game_board is a bitboard of the lines drawn on the game board. game_dict
+    # is a dictionary that maps vertices to their x and y coordinates.
+    global game_board, game_dict
 
-    # strat_graph is a graph representation of the inner chains of the game
-    # graph. edge_intersect_dict is a dictionary mapping strategy graph edges
-    # tothe game graph edges that intersect them.
-    global strat_graph, edge_intersect_dict
+    # strat_components keeps track of the components of strat_graph, a graph
+    # representation of the inner chains of the game graph.
+    # strat_intersect_dict is a dictionary mapping game graph edges to the
+    # strategy graph edges that they intersect.
+    global strat_components, strat_intersect_dict
 
     # The number of total moves in the game, the present player turn (1 or 2),
     # and the turn that the computer plays on (1 or 2).
     global num_moves, game_move, computer_move
 
-    # If the line has already been drawn or coordinates are the same, do not
-    # draw the line. The line request is invalid.
-    if game_graph.is_edge(requested_edge) or \
-        requested_edge[0] == requested_edge[1]:
+    # The protocol version that the client announced.
+    global protocol_version
 
-        # tell client that the line request is invalid.
-        send_msg_to_client(serial_out, "L 1")
+    # If the line is not an edge of the game board or has already been drawn,
+    # do not draw the line. The line request is invalid.
+    if requested_edge == -1 or game_board.is_drawn(requested_edge):
 
-        # Get client acknowledgement. Return -1 if there is communication error.
-        client_acknowledged(serial_in)
+        # tell client that the line request is invalid. Return -1 if there is
+        # communication error.
+        send_to_client(serial_in, serial_out, "L 1")
         if error: return -1
 
         return 0 # Return 0 because a line was not drawn.
 
     # If line has not been drawn before, process the drawing of the line.
     num_moves -= 1 # Decrement number of total moves
-    game_graph.add_edge(requested_edge) # Add the edge to the game_graph
+    game_board.draw(requested_edge) # Mark the edge as drawn on the game_board
 
     # This added line may break a chain. If it does, remove the intersected edge
     # in the strat_graph.
-    # Tuples have order so the reverse of the request needs to be checked.
-    rev_requested_edge = (requested_edge[1], requested_edge[0])
-    for edge, intersecting_edge in edge_intersect_dict.items():
-        # If the requested edge intersects a strategy graph edge:
-        if requested_edge == intersecting_edge:
-            # Remove the edge from the strategy graph
-            strat_graph.remove_edge(edge)
-            # Keep track that the strategy edge is now intersected.
-            edge_intersect_dict[edge] = None
-
-        # If the reverse requested edge interesects a strategy graph edge:
-        elif rev_requested_edge == intersecting_edge:
-            # Remove the edge from the strategy graph
-            strat_graph.remove_edge(edge)
-            # Keep track that the strategy edge is now interesected.
-            edge_intersect_dict[edge] = None
+    edge = strat_intersect_dict.get(requested_edge)
+    # If the requested edge intersects a strategy graph edge:
+    if not edge is None:
+        # Remove the edge from the strategy graph, splitting its component if
+        # the edge was the last link between two chains.
+        strat_components.remove_edge(edge)
+
+    # A client that takes framed results is sent the line with the rest of
+    # the move result by process_line.
+    if protocol_version >= FRAMED_VERSION:
+        return 1
 
     # If the line is valid and it is a computer turn:
     if computer_move == game_move:
+        # The vertices of the computer-chosen edge, smallest first.
+        (start_vertex, end_vertex) = game_board.edge(requested_edge)
+
         # Get the start vertex of the computer-chosen edge.
-        start = vertex_to_coords(game_dict, min(requested_edge))
+        start = vertex_to_coords(game_dict, start_vertex)
 
         # Send the x-coordinate of start vertex to the client.
         send_msg_to_client(serial_out, "E {}".format(start[0]))
@@ -120,7 +119,7 @@ def draw_line(serial_in, serial_out, requested_edge):
         if error: return -1 # Return -1 if there is communication error.
 
         # Get the end vertex of the computer-chosen edge.
-        end = vertex_to_coords(game_dict, max(requested_edge))
+        end = vertex_to_coords(game_dict, end_vertex)
 
         # Send the x-coordinate of the end vertex to the client.
         send_msg_to_client(serial_out, "E {}".format(end[0]))
@@ -142,62 +141,36 @@ def draw_line(serial_in, serial_out, requested_edge):
     return 1 # Return 1 because a line was drawn successfully.
 
 def get_boxes(serial_in, serial_out, requested_edge):
-    '''The requested_edge is removed from box_dict and strat_box_dict. If the
-    edge is the last one needed to close one or two boxes, the information of
-    these closed boxes is returned so that it may be sent to the client for
-    drawing.
+    '''Checks the boxes surrounded by the drawn requested_edge. If the edge is
+    the last one needed to close one or two boxes, the information of these
+    closed boxes is returned so that it may be sent to the client for drawing.
 
     Arguments:
         serial_in: Serial port input channel.
 
         serial_out: Serial port output channel.
 
-        requested_edge (tuple): A requested game graph edge to draw.
+        requested_edge (int): The number of a requested game graph edge to
+            draw (its bit on the game board).
 
     Runtime:
-        O(n) where n is the number of vertices in the game graph.
+        O(1) because the game board indexes the (at most two) boxes that an
+            edge surrounds.
 
     Returns:
         boxes (list): List of closed boxes (identified by an integer).
         len(boxes) (int): The number of closed boxes.
     '''
-    # A dictionary mapping game vertices to the edges that box them in.
-    global box_dict
-
-    # A dictionary mapping strategy vertices to the edges that box them in.
-    global strat_box_dict
-
-    boxes = list() # A list of boxes to draw
-    # Tuples have order so the reverse edge needs to be checked as well
-    rev_requested_edge = (requested_edge[1], requested_edge[0])
-    for box in box_dict:
-
-        # If the requested edge is in the box dictionary, remove it.
-        if requested_edge in box_dict[box]:
-            box_dict[box].remove(requested_edge)
+    # A bitboard of the lines drawn on the game board, and the undrawn edges
+    # that give no box away.
+    global game_board, safe_edges
 
-            # If the requested edge completes the box, put it in a list of
-            # boxes to draw.
-            if len(box_dict[box]) == 0:
-                boxes.append(box)
+    # The edge and the other sides of a box that now has two are no longer
+    # safe.
+    safe_edges.update(game_board, requested_edge)
 
-        # Check the reverse requested edge similarly.
-        elif rev_requested_edge in box_dict[box]:
-            box_dict[box].remove(rev_requested_edge)
-
-            # If the requested edge completes the box, put it in a list of
-            # boxes to draw.
-            if len(box_dict[box]) == 0:
-                boxes.append(box)
-
-    for box in strat_box_dict:
-        # If the requested edge is in the box dictionary, remove it.
-        if requested_edge in strat_box_dict[box]:
-            strat_box_dict[box].remove(requested_edge)
-
-        # Check the reverse requested edge similarly.
-        elif rev_requested_edge in strat_box_dict[box]:
-            strat_box_dict[box].remove(rev_requested_edge)
+    # Find the boxes that the requested edge closes.
+    boxes = game_board.closed_boxes(requested_edge)
 
     # Return a list of boxes that were closed and the number of boxes that were
     # closed.
@@ -214,7 +187,8 @@ def process_line(serial_in, serial_out, requested_edge):
 
         serial_out: Serial port output channel.
 
-        requested_edge (tuple): A requested game graph edge to draw.
+        requested_edge (int): The number of a requested game graph edge to
+            draw (its bit on the game board), or -1 if it is not an edge.
 
     Runtime:
         O(n) where n is the number of closed boxes (max 2). However, calls
@@ -229,12 +203,17 @@ def process_line(serial_in, serial_out, requested_edge):
     # notifies whether there is a communication error.
     global game_over, error
 
-    # Game dictionary mapping vertices to their coordinates.
-    global game_dict
+    # Game dictionary mapping vertices to their coordinates and a dictionary
+    # mapping boxes to the vertex at their top left corner.
+    global game_dict, corner_dict
 
     # The current move number and the computer's move number
     global game_move, computer_move
 
+    # The protocol version that the client announced, and the snapshot of the
+    # game that a reset client is brought back with.
+    global protocol_version, snapshot
+
     # Find out if a line was drawn (if the requested edge was a valid move)
     line_drawn = draw_line(serial_in, serial_out, requested_edge)
     # If a line was not drawn, return (game_over = False, error = False).
@@ -244,6 +223,30 @@ def process_line(serial_in, serial_out, requested_edge):
     # Find out if and how many boxes were closed by the last move.
     (boxes, num_boxes) = get_boxes(serial_in, serial_out, requested_edge)
 
+    # The coordinates of the game vertex at the top left of every closed box.
+    box_coords = [vertex_to_coords(game_dict, corner_dict[box])
+                  for box in boxes]
+
+    # If all possible moves have been played, the game is over.
+    game_over = (num_moves == 0)
+
+    # If no points were scored, the player turn is switched.
+    player = game_move
+    if num_boxes == 0:
+        if game_move == 1:
+            game_move = 2
+        else:
+            game_move = 1
+
+    # Keep the snapshot up to date before the result is sent, so that it
+    # holds the move even if sending it fails.
+    snapshot.record(requested_edge, boxes, player, game_move)
+
+    # A client that takes framed results is sent the whole result at once.
+    if protocol_version >= FRAMED_VERSION:
+        send_move_result(serial_in, serial_out, requested_edge, box_coords)
+        return (game_over, error)
+
     # Send the number of closed boxes to the client.
     send_msg_to_client(serial_out, "N {}".format(num_boxes))
     # If the client does not acknowledge, reset.
@@ -252,11 +255,10 @@ def process_line(serial_in, serial_out, requested_edge):
         return (game_over, error)
 
     # Send the coordinates of every box to draw to the client.
-    for i in range(num_boxes):
+    for (x, y) in box_coords:
         # Send the x-coordinate of the game vertex corresponding to the box to
         # draw to the client
-        send_msg_to_client(serial_out, "B {}"\
-            .format(vertex_to_coords(game_dict, boxes[i])[0]))
+        send_msg_to_client(serial_out, "B {}".format(x))
 
         # If the client does not acknowledge, reset.
         client_acknowledged(serial_in)
@@ -264,24 +266,13 @@ def process_line(serial_in, serial_out, requested_edge):
 
         # Send the y-coordinate of the game vertex corresponding to the box to
         # draw to the client
-        send_msg_to_client(serial_out, "B {}"\
-            .format(vertex_to_coords(game_dict, boxes[i])[1]))
+        send_msg_to_client(serial_out, "B {}".format(y))
 
         # If the client does not acknowledge, reset.
         client_acknowledged(serial_in)
         if error: return (game_over, error)
 
-    # If no points were scored, the player turn is switched.
-    if num_boxes == 0:
-        if game_move == 1:
-            game_move = 2
-        else:
-            game_move = 1
-
-    # If all possible moves have been played, the game is over.
-    if (num_moves == 0):
-        game_over = True # The game is over.
-
+    if game_over:
         # Send that the game is over to the client.
         send_msg_to_client(serial_out, "O 1")
 
@@ -291,8 +282,6 @@ def process_line(serial_in, serial_out, requested_edge):
         # the joystick to play again.
         client_acknowledged(serial_in)
     else:
-        game_over = False # The game is not over.
-
         # Send that the game is not over to the client.
         send_msg_to_client(serial_out, "O 0")
 
@@ -302,6 +291,59 @@ def process_line(serial_in, serial_out, requested_edge):
 
     return (game_over, error)
 
+def send_move_result(serial_in, serial_out, requested_edge, box_coords):
+    '''Sends the result of a move to the client as a single framed message,
+    "M x0 y0 x1 y1 o n bx by ...": the coordinates of the two vertices of the
+    drawn line, whether the game is over, the number of closed boxes and the
+    coordinates of the top left vertex of every closed box. The game over
+    flag comes before the boxes so that the client can check the number of
+    fields it read. The message is acknowledged once.
+
+    Arguments:
+        serial_in: Serial port input channel.
+
+        serial_out: Serial port output channel.
+
+        requested_edge (int): The number of the drawn game graph edge (its bit
+            on the game board).
+
+        box_coords (list): The coordinates of the top left vertex of every
+            box that the line closed.
+
+    Runtime:
+        O(1) because a line closes at most two boxes.
+    '''
+    # game_board is a bitboard of the lines drawn on the game board. game_dict
+    # is a dictionary that maps vertices to their x and y coordinates.
+    global game_board, game_dict
+
+    # game_over boolean notifies whether the game is over.
+    global game_over
+
+    # The messages to the client that are waiting for acknowledgement.
+    global send_window
+
+    # The vertices of the edge, smallest first.
+    (start_vertex, end_vertex) = game_board.edge(requested_edge)
+    fields = list(vertex_to_coords(game_dict, start_vertex)) + \
+        list(vertex_to_coords(game_dict, end_vertex))
+    fields += [int(game_over), len(box_coords)]
+    for coords in box_coords:
+        fields += list(coords)
+    send_to_client(serial_in, serial_out,
+                   "M " + " ".join(str(field) for field in fields))
+
+    # The game will reset whether the client acknowledges the last move or
+    # not.
+    if game_over:
+        # Client will send an extra 'A' to ensure that the player has clicked
+        # the joystick to play again. With a send window, the acknowledgements
+        # of the last messages come before it.
+        if send_window is None:
+            client_acknowledged(serial_in)
+        else:
+            send_window.receive(serial_in, serial_out)
+
 def computer_turn(serial_in, serial_out):
     '''A computer turn uses the long chain rule to determine what move to
     determine what line to draw.
@@ -323,119 +365,185 @@ def computer_turn(serial_in, serial_out):
         serial_out: Serial port output channel.
 
     Runtime:
-        O(n*(n+m)) where n is the number of vertices in the strat_graph and m
-            is the number of edges in the strat_graph (bounded by the
-            get_components function in traversal.py).
+        O(n) where n is the number of vertices in the strat_graph (bounded by
+            copying the vertices of every chain).
 
     Returns:
         An integer (-1, 0, or 1) depending on whether process_line returns an
             error, no line drawn, or that a line was drawn.
     '''
-    # game_graph is a graph representation of the game board. box_dict is a
-    # dictionary that maps game vertcies to the edges that box them in.
-    global game_graph, box_dict
-
-    # strat_graph is graph representation of the chains of connected boxes in
-    # the game board. stored_chain is a chain that the computer may be in the
-    # process of taking. edge_intersect_dict is dictionary mapping strategy
-    # graph edges to the game graph edges that interesect them.
-    # computer_is_first is whether the computer played first or not.
-    global strat_graph, stored_chain, edge_intersect_dict, computer_is_first
-    # strat_box_dict maps strategy graph vertices to the edges that box them in.
-    global strat_box_dict
-
-    # Number of game columns and rows.
-    global num_columns, num_rows
+    # game_board is a bitboard of the lines drawn on the game board. Its boxes
+    # are numbered like the strategy graph vertices. safe_edges keeps track of
+    # the undrawn edges that give no box away.
+    global game_board, safe_edges
+
+    # planned_moves are the moves left in taking a chain, planned when the
+    # computer started taking it. computer_is_first is whether the computer
+    # played first or not. strat_components keeps track of the components of
+    # strat_graph, a graph representation of the chains of connected boxes in
+    # the game board.
+    global planned_moves, computer_is_first, strat_components, strat_graph
+
+    # move_search searches the remaining moves of the game for the best one.
+    # time_budget is the number of seconds that it may take for a move.
+    # anytime is whether it is used for every move, not only in the endgame.
+    # monte_carlo is the Monte Carlo tree search, or None if it is not used.
+    global move_search, time_budget, anytime, monte_carlo
+
+    # endgame_table holds the exact value of every position of the board, or
+    # is None if the board size has no table. opening_book holds the moves of
+    # the first positions of the game, or is None if there is no book.
+    global endgame_table, opening_book
+
+    # Number of game columns and rows and the number of moves left in the
+    # game.
+    global num_columns, num_rows, num_moves
 
     # Used to visualize the components that the AI is working with.
     global debug
 
+    # The whole move has to be made in the time budget, so every stage after
+    # the first only takes the time that is left of it.
+    deadline = monotonic() + time_budget
+
     # The number of dots in the game is used in addition to number of long
     # chains determining which player is in control.
     num_dots = ((num_columns + 1) * (num_rows + 1))
 
-    # If a series of moves to score many boxes is present, finish the series and
-    # score every box possible.
-    if len(stored_chain) > 0:
-        # Use take chain to get a suitable edge and a chosen vertex of the
-        # stored chain.
-        (requested_edge, chosen) = take_chain(stored_chain, strat_box_dict)
-        if not chosen is None:
-            stored_chain.remove(chosen)
-        else:
-            stored_chain = list()
-        # If the requeste edge is not None, process it.
+    # Small boards are solved, so the best move is looked up.
+    if not endgame_table is None:
+        (requested_edge, value) = endgame_table.best_move(game_board.drawn())
+        print("Table move")
+        if debug: print("Value of the position:", value)
+        return process_line(serial_in, serial_out, requested_edge)
+
+    # The first moves of the game are looked up in the opening book.
+    if not opening_book is None and not opening_book.out_of_book:
+        requested_edge = opening_book.move(game_board.drawn())
         if not requested_edge is None:
+            print("Book move")
             return process_line(serial_in, serial_out, requested_edge)
 
-    # Get all the dijoint components of the strat_graph
-    components = get_components(strat_graph)
+    # If the computer is taking a chain, play the next planned move without
+    # looking at the board again.
+    if len(planned_moves) > 0:
+        requested_edge = planned_moves.pop(0)
+        if not game_board.is_drawn(requested_edge):
+            return process_line(serial_in, serial_out, requested_edge)
+        # The plan no longer fits the board, so drop it.
+        planned_moves = list()
+
+    # Get all the dijoint components of the strat_graph, each with whether it
+    # is cyclic. They are kept up to date by draw_line as strategy edges are
+    # removed, so every component is classified without searching the graph.
+    components = strat_components.classify()
     if debug: print(components) # Visualize this
 
-    # Create a list of subgraphs of the strat_graph
-    subgraph_list = list()
-    for vertex_set in components:
-        # Each component is converted to a subgraph of the strat_graph
-        subgraph = UndirectedAdjacencyGraph()
+    # In a simple loony endgame every move gives boxes away, and the best
+    # chain or loop to open is looked up from the lengths of the components.
+    # It can only be reached once no safe edge is left.
+    parts = None
+    if safe_edges.is_empty():
+        parts = simple_endgame(game_board, components)
+    if parts:
+        (value, move) = solve(*lengths(parts))
+        if debug: print("Value of the endgame:", value)
+        for (vertex_set, is_loop) in parts:
+            if (len(vertex_set), is_loop) == move:
+                break
+        requested_edge = \
+            opening_edge(game_board, strat_graph, vertex_set, is_loop)
+        if not requested_edge is None:
+            print("Opening loop" if is_loop else "Opening chain")
+            return process_line(serial_in, serial_out, requested_edge)
 
-        # If there is a single vertex, do not factor into strategy.
-        if len(vertex_set) == 1:
-            continue
+    # Near the end of the game, or on every move in anytime mode, search the
+    # remaining moves for the best one until the time budget runs out.
+    if (anytime or num_moves <= ENDGAME_EDGES) and monotonic() < deadline:
+        # In the endgame, search to the end of the game straight away.
+        if num_moves <= ENDGAME_EDGES:
+            min_depth = num_moves
+        else:
+            min_depth = 1
+        (requested_edge, value, depth) = move_search.best_move(
+            game_board.drawn(), deadline - monotonic(), min_depth)
+        if debug: print("Search depth:", depth, "Positions:", move_search.nodes)
+
+        # Outside of anytime mode, a search that did not reach the end of the
+        # game is not trusted over the long chain rule.
+        if not anytime and depth < num_moves:
+            requested_edge = None
 
-        # Add all of the vertices of the component into a new subgaph of the
-        # main graph.
-        for v in vertex_set:
-            if not subgraph.is_vertex(v):
-                subgraph.add_vertex(v)
-        subgraph_list.append(subgraph)
+        if not requested_edge is None:
+            print("Search move")
+            if debug: print("Value of the position:", value)
+            return process_line(serial_in, serial_out, requested_edge)
 
-        # If there is nothing obstructing the a strat_edge that relates to the
-        # vertics of the subgaph, add the edge to the subgraph.
-        for edge, intersect_edge in edge_intersect_dict.items():
-            if not intersect_edge is None:
-                if subgraph.is_vertex(edge[0]) and subgraph.is_vertex(edge[1]):
-                    subgraph.add_edge(edge)
+    # Before the endgame, Monte Carlo tree search can be used instead of the
+    # long chain rule. An endgame search that did not finish leaves it only
+    # the time that is left of the budget, and none left falls back to the
+    # long chain rule.
+    if not monte_carlo is None and monotonic() < deadline:
+        requested_edge = \
+            monte_carlo.best_move(game_board.drawn(), deadline - monotonic())
+        if debug: print("Playouts:", monte_carlo.rollouts)
+        print("Monte Carlo move")
+        return process_line(serial_in, serial_out, requested_edge)
 
     long_chains = list() # A list of chains of 3 or more boxes
     short_chains = list() # A list of chain of 2 boxes
-    for subgraph in subgraph_list:
-        # If the subgraph is cyclic, it cannot be a chain.
-        if subgraph.is_cyclic():
+    for (vertex_set, cyclic) in components:
+        # If there is a single vertex, do not factor into strategy.
+        if len(vertex_set) == 1:
+            continue
+
+        # If the component is cyclic, it cannot be a chain.
+        if cyclic:
             if debug: print("Cyclic:")
-            if debug: print(subgraph.vertices())
+            if debug: print(vertex_set)
             continue
         else:
             if debug: print("Not cyclic:")
-            if debug: print(subgraph.vertices())
+            if debug: print(vertex_set)
             # Put long chains in one list, and short chains in another.
-            if len(subgraph.vertices()) >= 3:
-                long_chains.append({v for v in subgraph.vertices()})
+            if len(vertex_set) >= 3:
+                long_chains.append(set(vertex_set))
             else:
-                short_chains.append({v for v in subgraph.vertices()})
+                short_chains.append(set(vertex_set))
 
     # If a long chain has been opened, take it.
     if len(long_chains) > 0:
         # Sort the long chains from longest to shortest.
         sorted_long_chains = sorted(long_chains, key=len, reverse=True)
 
-        # If there is more than one long chain, try to take the longest.
-        for chain in sorted_long_chains:
-            # If the chain is open, take it without question.
-            if chain_is_open(chain, strat_box_dict):
-                # Store the chain so that the AI takes all of it.
-                stored_chain = chain
-                # Score one of the boxes of the chain.
-                (requested_edge, chosen) = \
-                    take_chain(stored_chain, strat_box_dict)
-
-                # Remove the chosen vertex from the chain being taken.
-                if not chosen is None:
-                    stored_chain.remove(chosen)
-                else:
-                    stored_chain = list()
-                # If the requested_edge is not None, process it for drawing.
-                if not requested_edge is None:
-                    return process_line(serial_in, serial_out, requested_edge)
+        # If there is more than one long chain, try to take the longest. A
+        # chain whose last boxes are left to the human is taken last, since
+        # leaving them ends the computer's turn.
+        # Out of time, the endgame that is left is not solved.
+        exact = monotonic() < deadline
+        open_chains = [(keep_control(chain, game_board, components, exact),
+                        chain)
+                       for chain in sorted_long_chains
+                       if chain_is_open(chain, game_board)]
+        for (decline, chain) in sorted(open_chains, key=lambda c: c[0]):
+            # If the chain is open, take it without question. Plan every
+            # move of taking it at once, including whether to leave the last
+            # boxes to the human to keep control.
+            planned_moves = plan_capture(chain, game_board, decline)
+            # Play the first planned move.
+            if len(planned_moves) > 0:
+                requested_edge = planned_moves.pop(0)
+                return process_line(serial_in, serial_out, requested_edge)
+
+    # If the components are small enough to be valued as a game of
+    # nimstring, move so that the human loses the fight for control. Every
+    # component is viewed in the strategy graph rather than copied out of it,
+    # and valuing them may only take the time that is left of the budget.
+    views = [strat_graph.subgraph(vertex_set) for (vertex_set, _) in components]
+    requested_edge = winning_move(game_board, views, deadline - monotonic())
+    if not requested_edge is None:
+        print("Nimstring move")
+        return process_line(serial_in, serial_out, requested_edge)
 
     # If a long chain is not open, determine whether the computer has control
     # over the game.
@@ -458,20 +566,11 @@ def computer_turn(serial_in, serial_out):
         for chain in short_chains:
             # If a short chain is open and the computer has control, there is
             # no problem with taking a short chain.
-            if chain_is_open(chain, strat_box_dict):
-                # Store the chain so that the AI takes all of it.
-                stored_chain = chain
-                # Score one of the boxes of the chain.
-                (requested_edge, chosen) = \
-                    take_chain(stored_chain, strat_box_dict)
-
-                # Remove the chosen vertex from the chain being taken.
-                if not chosen is None:
-                    stored_chain.remove(chosen)
-                else:
-                    stored_chain = list()
-                # If the requested_edge is not None, process it for drawing.
-                if not requested_edge is None:
+            if chain_is_open(chain, game_board):
+                planned_moves = plan_capture(chain, game_board, False)
+                # Play the first planned move.
+                if len(planned_moves) > 0:
+                    requested_edge = planned_moves.pop(0)
                     return process_line(serial_in, serial_out, requested_edge)
 
     # If the computer does not have control, try to bait the user by
@@ -481,8 +580,8 @@ def computer_turn(serial_in, serial_out):
         for chain in short_chains:
             # Make sure the chain is not open, and then bait the player by
             # opening it.
-            if not chain_is_open(chain, strat_box_dict):
-                requested_edge = open_chain(stored_chain, strat_box_dict)
+            if not chain_is_open(chain, game_board):
+                requested_edge = open_chain(chain, game_board)
                 # If the requested_edge is not None, process the edge for
                 # drawing.
                 if not requested_edge is None:
@@ -490,7 +589,7 @@ def computer_turn(serial_in, serial_out):
 
     # If there are not suitable chains to play on, choose a random edge to play.
     # Guaranteed to return an edge.
-    requested_edge = get_random_edge(game_graph, box_dict)
+    requested_edge = get_random_edge(game_board, safe_edges)
 
     # Process the random edge for drawing.
     return process_line(serial_in, serial_out, requested_edge)
@@ -512,55 +611,138 @@ def human_turn(serial_in, serial_out):
         An integer (-1, 0, or 1) depending on whether process_line returns an
             error, no line drawn, or that a line was drawn.
     '''
-    # game_graph is a graph representation of the game board. game_dict is a
-    # dictionary that maps vertices to their x and y coordinates. box_dict is a
-    # dictionary that maps game vertcies to the edges that box them in.
-    global game_graph, game_dict, box_dict
+    # game_board is a bitboard of the lines drawn on the game board.
+    # coords_dict is a dictionary that maps x and y coordinates to their
+    # vertices.
+    global game_board, coords_dict
 
     # The number of total moves in the game.
     global num_moves
 
-    # Get a request message from the client.
-    msg = receive_msg_from_client(serial_in).split()
+    # game_over boolean notifies whether the game is over. error boolean
+    # notifies whether there is a communication error.
+    global game_over, error
+
+    # The messages to the client that are waiting for acknowledgement.
+    global send_window
+
+    # Get a request message from the client, taking the acknowledgements that
+    # came before it off the input.
+    if send_window is None:
+        msg = receive_msg_from_client(serial_in).split()
+    else:
+        msg = send_window.receive(serial_in, serial_out)
+        # The answer to a request that was sent again could not be sent
+        # again itself.
+        if msg is None:
+            print("Client did not acknowledge.")
+            print("Resetting...")
+            error = True
+            return (game_over, error)
+        msg = msg.split()
     log_msg(msg)
 
     # If the request is not of the form "R # # # #", then it is invalid.
     if len(msg) != 5 or msg[0] != 'R':
         print("Invalid request received.")
+        # A client that numbers its messages only sends anything else when it
+        # has given up on the server.
+        if not send_window is None:
+            print("Resetting...")
+            error = True
+            return (game_over, error)
         return 0
 
     # Map the coordinates to their vertex.
-    start_vertex = coords_to_vertex(game_dict, (int(msg[1]), int(msg[2])))
+    start_vertex = coords_to_vertex(coords_dict, (int(msg[1]), int(msg[2])))
     # Tuples have order, so if the edge is -1, try the reverse tuple.
     if start_vertex == -1:
-        start_vertex = coords_to_vertex(game_dict, (int(msg[2]), int(msg[1])))
+        start_vertex = coords_to_vertex(coords_dict, (int(msg[2]), int(msg[1])))
 
     # Map the coordinates to their vertex.
-    end_vertex = coords_to_vertex(game_dict, (int(msg[3]), int(msg[4])))
+    end_vertex = coords_to_vertex(coords_dict, (int(msg[3]), int(msg[4])))
     # Tuples have order, so if the edge is -1, try the reverse tuple.
     if end_vertex == -1:
-        end_vertex = coords_to_vertex(game_dict, (int(msg[4]), int(msg[3])))
+        end_vertex = coords_to_vertex(coords_dict, (int(msg[4]), int(msg[3])))
 
-    # The requested edge is stored as a tuple of the two integer vertices.
-    requested_edge = (start_vertex, end_vertex)
+    # The requested edge is stored as its edge number. Both orientations of
+    # the edge map to the same number, so the rest of the turn does not need
+    # to check the reverse edge. Vertices that do not form an edge map to -1.
+    requested_edge = game_board.edge_bit((start_vertex, end_vertex))
 
     # Process the requested edge, ensuring it is not an invalid operation.
     return process_line(serial_in, serial_out, requested_edge)
 
+def new_send_window():
+    '''Returns the send window for the messages after the game type, for the
+    protocol version that the client announced. The messages are sent in
+    binary frames if the client takes them, unless lines were asked for on
+    the command line.
+    '''
+    # The protocol version that the client announced, and whether binary
+    # frames may be sent.
+    global protocol_version, binary_frames
+
+    return SendWindow(checked=(protocol_version >= CHECKED_VERSION),
+                      binary=(binary_frames and
+                              protocol_version >= BINARY_VERSION))
+
+def send_to_client(serial_in, serial_out, msg):
+    '''Sends a message to the client and gets its acknowledgement. With a send
+    window the message is numbered instead, and the server only waits for an
+    acknowledgement when the window is full. Sets the global boolean "error"
+    like client_acknowledged.
+
+    Arguments:
+        serial_in: Serial port input channel.
+
+        serial_out: Serial port output channel.
+
+        msg (str): The message, without a new line.
+    '''
+    global error # A global boolean notifying functions about errors.
+
+    # The messages to the client that are waiting for acknowledgement.
+    global send_window
+
+    if send_window is None:
+        send_msg_to_client(serial_out, msg)
+        client_acknowledged(serial_in)
+    elif not send_window.send(serial_in, serial_out, msg):
+        print("Client did not acknowledge.")
+        print("Resetting...")
+        error = True
+    else:
+        error = False
+
 def client_acknowledged(serial_in):
     '''A function to handle client acknowledgements. If an acknowledgement is
     not properly read, both the client and server should reset to the start
     of the game. Sets a global boolean ("error") based on whether there was an
-    error in communication or not.
+    error in communication or not. An acknowledgement may carry the protocol
+    version of the client ("A <version>"), which is stored in the global
+    protocol_version.
     '''
     global error # A global boolean notifying functions about errors.
-
-    # Receive a message from the client.
-    msg = receive_msg_from_client(serial_in).rstrip()
+    global protocol_version # The protocol version that the client announced.
+
+    # Receive a message from the client. A client that was sent frames in the
+    # last game may still send one before it is sent the game type.
+    (msg, framed) = receive_frame_from_client(serial_in)
+    if msg is None:
+        print("Client sent a corrupted frame.")
+        print("Resetting...")
+        error = True
+        return
+    msg = msg.rstrip()
     log_msg(msg)
+    fields = msg.split()
 
     # If the server does receive proper acknowledgement:
-    if len(msg) > 1 or msg[0] != 'A':
+    if len(fields) == 2 and fields[0] == 'A' and fields[1].isdigit():
+        protocol_version = int(fields[1])
+        error = False
+    elif len(msg) > 1 or msg[0] != 'A':
         # There was a timeout if a 'T' is received.
         if msg[0] == 'T':
             print("Client took too long to respond.")
@@ -577,6 +759,101 @@ def client_acknowledged(serial_in):
     else:
         error = False
 
+def send_snapshot(serial_in, serial_out):
+    '''Sends the snapshot of the game to a client that takes it, at the end of
+    the game setup. Sets the global boolean "error" like send_to_client.
+
+    Arguments:
+        serial_in: Serial port input channel.
+
+        serial_out: Serial port output channel.
+    '''
+    # The protocol version that the client announced, and the snapshot of the
+    # game.
+    global protocol_version, snapshot
+
+    if protocol_version >= SNAPSHOT_VERSION:
+        # Will set error if needed.
+        send_to_client(serial_in, serial_out, snapshot.message())
+
+def resync(serial_in, serial_out, game_type):
+    '''Brings a client that was reset in the middle of a game back into it.
+    The game type, the size of the board and who plays first are sent again
+    as in a new game, followed by the snapshot of the game, so that the client
+    draws the board as it was and play goes on. The game board and the graphs
+    of the server are kept as they are. A client that times out waiting for
+    the game type is sent it again.
+
+    Arguments:
+        serial_in: Serial port input channel.
+
+        serial_out: Serial port output channel.
+
+        game_type (int): The type of the game (0 for human versus computer, 1
+            for human versus human).
+
+    Runtime:
+        O(n) where n is the number of edges on the board (the snapshot).
+
+    Returns:
+        resynced (bool): Whether the client is back in the game. If not, the
+            game has to be reset.
+    '''
+    global error # A global boolean notifying functions about errors.
+
+    # The protocol version that the client announced, and the messages to
+    # the client that are waiting for acknowledgement.
+    global protocol_version, send_window
+
+    # Number of game board columns and rows, and the computer's turn.
+    global num_columns, num_rows, computer_move
+
+    # A client that does not take snapshots can only start a new game.
+    if protocol_version < SNAPSHOT_VERSION:
+        return False
+
+    print("Bringing the client back into the game...")
+    send_window = None
+    send_msg_to_client(serial_out, "G {}".format(game_type))
+    attempts = 1
+    while True:
+        # Lines that were sent before the client was reset are skipped, and
+        # so are frames that fail their CRC.
+        (msg, framed) = receive_frame_from_client(serial_in)
+        if msg is None:
+            continue
+        msg = msg.rstrip()
+        log_msg(msg)
+        fields = msg.split()
+        if len(fields) == 2 and fields[0] == 'A' and fields[1].isdigit():
+            protocol_version = int(fields[1])
+            break
+        # The client timed out waiting for the game type.
+        if msg == 'T':
+            if attempts > MAX_RETRANSMISSIONS:
+                print("Client did not acknowledge.")
+                return False
+            send_msg_to_client(serial_out, "G {}".format(game_type))
+            attempts += 1
+
+    # The client may have been replaced by one that does not take snapshots.
+    if protocol_version < SNAPSHOT_VERSION:
+        return False
+    send_window = new_send_window()
+
+    # The setup of the game, as it was sent when the game started.
+    setup = ["C {}".format(num_columns), "R {}".format(num_rows)]
+    if game_type == 0:
+        setup.append("F {}".format(computer_move))
+    for msg in setup:
+        send_to_client(serial_in, serial_out, msg) # Will set error if needed.
+        if error: return False
+    send_snapshot(serial_in, serial_out)
+    if error: return False
+
+    print("The client is back in the game.")
+    return True
+
 def protocol(serial_in, serial_out):
     '''Allows the python server to communicate with the arduino using
     cs_message. The protocol begins by getting user-inputted information about
@@ -602,20 +879,23 @@ def protocol(serial_in, serial_out):
     # is an error.
     global game_over, error
 
-    # game_graph is a graph representation of the game board. game_dict is a
-    # dictionary that maps vertices to their x and y coordinates. box_dict is a
-    # dictionary that maps game vertcies to the edges that box them in.
-    global game_graph, game_dict, box_dict
+    # game_board is a bitboard of the lines drawn on the game board. game_dict
+    # is a dictionary that maps vertices to their x and y coordinates and
+    # coords_dict is its inverse. corner_dict is a dictionary that maps boxes
+    # to the vertex at their top left corner. safe_edges keeps track of the
+    # undrawn edges that give no box away.
+    global game_board, game_dict, coords_dict, corner_dict, safe_edges
 
     # strat_graph is graph representation of the chains of connected boxes in
     # the game board. strat_dict is a dictionary that maps strat_graph vertices
-    # to the edges they are a part of. strat_box_dict maps strategy graph
-    # vertices to the edges that box them in. computer_is_first is whether the
-    # computer played first or not.
-    global strat_graph, strat_dict, strat_box_dict, computer_is_first
+    # to the edges they are a part of. computer_is_first is whether the
+    # computer played first or not. strat_components keeps track of the
+    # components of strat_graph.
+    global strat_graph, strat_dict, computer_is_first, strat_components
     # edge_intersect_dict is dictionary mapping strategy graph edges to the
-    # game graph edges that interesect them.
-    global edge_intersect_dict
+    # game graph edges that interesect them. strat_intersect_dict is its
+    # inverse.
+    global edge_intersect_dict, strat_intersect_dict
 
     # Number of game board columns and rows and the number of total moves in
     # the game.
@@ -624,6 +904,31 @@ def protocol(serial_in, serial_out):
     # The current turn in the game and the computer's turn in the game.
     global game_move, computer_move
 
+    # The moves left in taking a chain that the computer planned.
+    global planned_moves
+
+    # The protocol version that the client announced, and the messages to
+    # the client that are waiting for acknowledgement.
+    global protocol_version, send_window
+
+    # Searches the remaining moves of the game for the best one, and the
+    # Monte Carlo tree search with the pool of processes that runs it.
+    global move_search, monte_carlo, mcts_pool, num_trees
+
+    # Reduces positions to their canonical form for the caches and solvers.
+    global canonicaliser
+
+    # The memory-mapped endgame tables of every board size that has one, and
+    # the table of the current game.
+    global endgame_tables, endgame_table
+
+    # The memory-mapped opening books of every board size that has one, and
+    # the book of the current game.
+    global opening_books, opening_book
+
+    # The snapshot of the game that a reset client is brought back with.
+    global snapshot
+
     # Infinite game loop
     while True:
         print("Welcome to Ardunio Dots and Boxes.")
@@ -631,6 +936,12 @@ def protocol(serial_in, serial_out):
         game_over = False
         error = False
         computer_move = 0
+        planned_moves = list()
+
+        # A client that does not announce its version with the acknowledgement
+        # of the game type only takes the original messages.
+        protocol_version = 0
+        send_window = None
 
         # Game type prompt
         while True:
@@ -667,6 +978,12 @@ def protocol(serial_in, serial_out):
 
         if error: continue # Reset to beginning if there was an error.
 
+        # The messages after the game type are numbered if the client
+        # acknowledges numbered messages, and checked and sent again when lost
+        # if the client checks them.
+        if protocol_version >= WINDOWED_VERSION:
+            send_window = new_send_window()
+
         # Number of columns prompt
         while True:
             # Get the number of game board columns
@@ -683,8 +1000,9 @@ def protocol(serial_in, serial_out):
             else:
                 num_columns = int(num_columns)
                 print("The board will have {} columns.".format(num_columns))
-                send_msg_to_client(serial_out, "C {}".format(num_columns))
-                client_acknowledged(serial_in) # Will set error if needed.
+                # Will set error if needed.
+                send_to_client(serial_in, serial_out,
+                               "C {}".format(num_columns))
                 break
 
         if error: continue # Reset to beginning if there was an error.
@@ -704,26 +1022,60 @@ def protocol(serial_in, serial_out):
             else:
                 num_rows = int(num_rows)
                 print("The board will have {} rows.".format(num_rows))
-                send_msg_to_client(serial_out, "R {}".format(num_rows))
-                client_acknowledged(serial_in) # Will set error if needed.
+                # Will set error if needed.
+                send_to_client(serial_in, serial_out,
+                               "R {}".format(num_rows))
                 break
 
         if error: continue # Reset to beginning if there was an error.
 
         # Build the game board graph and related vertex/edge information.
-        (game_graph, game_dict, box_dict, strat_box_dict) = \
+        (game_board, game_dict, coords_dict, corner_dict) = \
             build_game_graph(num_columns, num_rows)
+        # Every edge of an empty board is safe. From now on edges are only
+        # removed from the index as lines are drawn.
+        safe_edges = SafeEdgeIndex(game_board)
+        # The snapshot is kept up to date move by move, so that a reset
+        # client can be brought back into the game without building anything
+        # again.
+        snapshot = Snapshot(game_board)
 
         # Build the graph used by the AI in its strategy and related
         # vertex/edge information.
         (strat_graph, strat_dict) = \
             build_strat_graph(game_dict, num_columns, num_rows)
+        # Label the components of the strategy graph once. From now on they
+        # are only split as lines are drawn.
+        strat_components = ComponentIndex(strat_graph)
 
         # Build a dictionary that maps AI graph edges to the game graph edges
-        # that intersect over them.
-        edge_intersect_dict = \
+        # that intersect over them, and its inverse.
+        (edge_intersect_dict, strat_intersect_dict) = \
             build_edge_intersect_dict(strat_dict, num_columns, num_rows)
 
+        # Positions are reduced under the symmetries of the board, so that a
+        # position and its images share their cache entries.
+        canonicaliser = Canonicaliser(game_board, game_dict, coords_dict,
+                                      num_columns, num_rows)
+
+        # The search keeps its transposition table for the game.
+        move_search = AlphaBetaSearch(game_board, canonicaliser=canonicaliser)
+
+        # Look moves up in the table of the board size if there is one.
+        endgame_table = None
+        if (num_columns, num_rows) in endgame_tables:
+            endgame_table = EndgameTable(
+                game_board, endgame_tables[(num_columns, num_rows)])
+
+        # Look the first moves up in the book of the board size if there is
+        # one.
+        opening_book = None
+        if (num_columns, num_rows) in opening_books:
+            opening_book = OpeningBook(
+                canonicaliser, opening_books[(num_columns, num_rows)])
+        if not mcts_pool is None:
+            monte_carlo = MonteCarloSearch(game_board, mcts_pool, num_trees)
+
         num_dots = ((num_columns + 1) * (num_rows + 1))
         num_boxes = (num_columns  * num_rows)
         # The total number of move in the game (determines end of game).
@@ -746,8 +1098,8 @@ def protocol(serial_in, serial_out):
                     print("The human will go first.")
                     computer_is_first = False # Computer plays second.
                     computer_move = 2 # Computer plays second.
-                    send_msg_to_client(serial_out, "F 2")
-                    client_acknowledged(serial_in) # Will set error if needed.
+                    # Will set error if needed.
+                    send_to_client(serial_in, serial_out, "F 2")
                     break
 
                 # If the computer goes first, send to client.
@@ -755,8 +1107,8 @@ def protocol(serial_in, serial_out):
                     print("The computer will go first.")
                     computer_is_first = True # Computer plays first.
                     computer_move = 1 # Computer plays first.
-                    send_msg_to_client(serial_out, "F 1")
-                    client_acknowledged(serial_in) # Will set error if needed.
+                    # Will set error if needed.
+                    send_to_client(serial_in, serial_out, "F 1")
                     break
 
                 # If the input is invalid, try again.
@@ -766,6 +1118,9 @@ def protocol(serial_in, serial_out):
 
             if error: continue # Reset to beginning if there was an error.
 
+            send_snapshot(serial_in, serial_out) # Will set error if needed.
+            if error: continue # Reset to beginning if there was an error.
+
             # If no error yet, notify that the human/computer game has started.
             print("Game start!")
 
@@ -777,17 +1132,31 @@ def protocol(serial_in, serial_out):
                     if game_over:
                         print("Game is finished. Resetting.")
                         break
-                    if error: continue # Reset to start if there was an error.
+                    # Bring a reset client back into the game, or reset.
+                    if error and \
+                        not resync(serial_in, serial_out, game_type):
+                        break
                 # If it is the human's move, process it.
                 else:
                     (game_over, error) = human_turn(serial_in, serial_out)
                     if game_over:
                         print("Game is finished. Resetting.")
                         break
-                    if error: continue # Reset to start if there was an error.
+                    # Bring a reset client back into the game, or reset.
+                    if error and \
+                        not resync(serial_in, serial_out, game_type):
+                        break
+
+            # Report how many of the computer's positions were in the book.
+            if not opening_book is None:
+                print("Opening book: {} of {} positions found".format(
+                    opening_book.hits, opening_book.lookups))
 
         # If the game is human versus human
         elif game_type == 1:
+            send_snapshot(serial_in, serial_out) # Will set error if needed.
+            if error: continue # Reset to beginning if there was an error.
+
             # Notify that the human/human game has started.
             print("Game start!")
 
@@ -798,18 +1167,30 @@ def protocol(serial_in, serial_out):
                 if game_over:
                     print("Game is finished. Resetting.")
                     break
-                if error: continue # Reset to start if there was an error.
+                # Bring a reset client back into the game, or reset.
+                if error and not resync(serial_in, serial_out, game_type):
+                    break
 
 if __name__ == "__main__":
     '''server.py is designed to run on its own from the command line. When it is
     run, the edmonton game_graph will be read, an argparser will be defined, and
     the protocol function will run to communicate with the arduino.
     '''
+    from board import SafeEdgeIndex # Needed to find moves that give no box
+    from book import * # Needed to look up opening moves
     from build import * # Needed to build graphs and graph information dicts
+    from canonical import Canonicaliser # Needed to reduce positions
     from cs_message import * # Needed for server/client communication
     from graph import UndirectedAdjacencyGraph # Needed for game boards
+    from loony import * # Needed to play simple loony endgames
+    from mcts import MonteCarloSearch # Needed for Monte Carlo tree search
+    from nimstring import winning_move # Needed to value strategy components
+    from retrograde import * # Needed to look up solved positions
+    from search import * # Needed to search for the best move
+    from session import Snapshot # Needed to bring a reset client back
     from strategy import * # Needed for AI's strategy
     import sys # Needed for stdin/stdout communication
+    from time import monotonic # Needed to keep moves in their time budget
     from traversal import * # Needed to traverse the strategy graph
 
     # Game state variables
@@ -817,29 +1198,60 @@ if __name__ == "__main__":
     error = bool() # Keeps track of whether there is a communication error.
 
     # Game graph information
-    game_graph = UndirectedAdjacencyGraph() # Graph representation of game board
+    game_board = None # Bitboard of the lines drawn on the game board
+    safe_edges = None # Undrawn edges of the game board that give no box away
     # Dictionary mapping vertices to their x and y coordinates.
     game_dict = dict()
-    # Dictioanry mapping vertices to the edges that surround them.
-    box_dict = dict()
+    # Dictionary mapping x and y coordinates to their vertices.
+    coords_dict = dict()
+    # Dictionary mapping boxes to the vertex at their top left corner.
+    corner_dict = dict()
 
     # Strategy (AI) graph information
     # Graph representation of connected box chains.
     strat_graph = UndirectedAdjacencyGraph()
     # Dictionary mapping strategy vertices to the edges that they are a part of.
     strat_dict = dict()
-    # Dictionary mapping strategy vertices to the edges that box them in.
-    strat_box_dict = dict()
-    # Keeps track of a chain of boxes that the AI is in the process of taking.
-    stored_chain = list()
+    # Keeps track of the components of the strategy graph.
+    strat_components = None
+    # The moves left in taking a chain that the AI planned.
+    planned_moves = list()
     # Keeps track of whether the computer played first in the game.
     computer_is_first = bool()
+    # Searches the remaining moves of the game for the best one.
+    move_search = None
+    # Reduces positions to their canonical form.
+    canonicaliser = None
+    # The memory-mapped endgame tables of the solved board sizes, and the
+    # table of the current game.
+    endgame_tables = dict()
+    endgame_table = None
+    # The memory-mapped opening books of the board sizes that have one, and
+    # the book of the current game.
+    opening_books = dict()
+    opening_book = None
+    # Process pool and number of processes of the Monte Carlo tree search,
+    # and the search for the current game.
+    mcts_pool = None
+    num_trees = int()
+    monte_carlo = None
 
     # Game dimension variables
     num_columns = int() # Number of columns in the game.
     num_rows = int() # Number of rows in the game.
     num_moves = int() # Number of total moves in the game.
 
+    # The protocol version that the client announced (0 for the original
+    # messages).
+    protocol_version = int()
+    # The messages to the client that are waiting for acknowledgement, if the
+    # client acknowledges numbered messages.
+    send_window = None
+    # The snapshot of the game that a reset client is brought back with.
+    snapshot = None
+    # Whether the messages after the game type may be sent in binary frames.
+    binary_frames = bool()
+
     # Variables to determine whose move it is
     game_move = int() # The current turn (1 or 2)
     computer_move = int() # The turn that the computer moves on (1 or 2)
@@ -863,12 +1275,79 @@ if __name__ == "__main__":
         dest="serial_port_name",
         default="/dev/ttyACM0")
 
+    # The computer's move must reach the client before it times out.
+    parser.add_argument("-t",
+        help="Set the seconds the computer may take for a move (at most {}, "
+            "so the move reaches the client in its 3 second timeout)".format(
+            MAX_TIME_BUDGET),
+        type=float,
+        dest="time_budget",
+        default=TIME_BUDGET)
+
+    # Endgame tables are looked for in the tables directory unless specified.
+    parser.add_argument("-e",
+        help="Set the directory of the endgame tables (see retrograde.py)",
+        type=str,
+        dest="table_directory",
+        default="tables")
+
+    # Opening books are looked for in the books directory unless specified.
+    parser.add_argument("-b",
+        help="Set the directory of the opening books (see book.py)",
+        type=str,
+        dest="book_directory",
+        default="books")
+
+    # The long chain rule is used before the endgame unless specified.
+    strategy = parser.add_mutually_exclusive_group()
+    strategy.add_argument("-a",
+        help="Search for every computer move, not only in the endgame",
+        action="store_true",
+        dest="anytime")
+    strategy.add_argument("-m",
+        help="Use Monte Carlo tree search on all cores before the endgame",
+        action="store_true",
+        dest="mcts")
+
+    # Clients that take binary frames are sent them unless specified.
+    parser.add_argument("-l",
+        help="Send lines of text even to a client that takes binary frames",
+        action="store_true",
+        dest="lines")
+
     args = parser.parse_args()
 
+    # The client waits 3 seconds for a move, and sending it takes time too.
+    if not 0 < args.time_budget <= MAX_TIME_BUDGET:
+        parser.error("the time for a move must be over 0 and at most {} "
+                     "seconds".format(MAX_TIME_BUDGET))
+
     # Only log messages in debugging mode.
     debug = args.debug
     set_logging(debug)
 
+    # Seconds the computer may take for a move, and whether it searches for
+    # every move.
+    time_budget = args.time_budget
+    anytime = args.anytime
+
+    # Binary frames are harder to follow in a serial monitor.
+    binary_frames = not args.lines
+
+    # The tables are only memory-mapped here. Their pages are read from the
+    # disk as positions are looked up.
+    endgame_tables = load_tables(args.table_directory)
+    if debug: print("Endgame tables:", sorted(endgame_tables))
+    opening_books = load_books(args.book_directory)
+    if debug: print("Opening books:", sorted(opening_books))
+
+    # The processes of the Monte Carlo tree search are started once, here,
+    # rather than for every move.
+    if args.mcts:
+        from multiprocessing import Pool, cpu_count
+        num_trees = cpu_count()
+        mcts_pool = Pool(num_trees)
+
     # this imports serial, and provides a useful wrapper around it
     import textserial
 
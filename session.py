@@ -0,0 +1,72 @@
+class Snapshot:
+    '''Type to keep a compact snapshot of a game in progress: the lines that
+    are drawn, the player that closed every box, the player to move and the
+    scores. It is kept up to date move by move, so a client that was reset
+    can be brought back to the game with a single message, without the
+    server replaying the game or building its graphs again.
+
+    Attributes:
+        drawn (int): A bitmask of the edges that have been drawn.
+
+        second_boxes (int): A bitmask of the boxes that the second player
+            closed. Boxes are numbered left to right, top to bottom.
+
+        turn (int): The player to move (1 or 2).
+
+        scores (list): The number of boxes closed by the first and the second
+            player.
+
+        _num_edges (int): The number of edges on the board.
+
+        _num_boxes (int): The number of boxes on the board.
+    '''
+
+    def __init__(self, game_board):
+        '''Creates the snapshot of a game that has not started.
+
+        Arguments:
+            game_board (Board): The bitboard of the game. Only its layout is
+                used.
+        '''
+        self.drawn = 0
+        self.second_boxes = 0
+        self.turn = 1
+        self.scores = [0, 0]
+        self._num_edges = game_board.num_edges()
+        self._num_boxes = game_board.num_boxes()
+
+    def record(self, requested_edge, boxes, player, turn):
+        '''Adds a move to the snapshot.
+
+        Arguments:
+            requested_edge (int): The bit of the edge that was drawn.
+
+            boxes (list): The boxes that the edge closed.
+
+            player (int): The player that drew the edge (1 or 2).
+
+            turn (int): The player to move after the edge was drawn.
+
+        Runtime:
+            O(1) because an edge closes at most two boxes.
+        '''
+        self.drawn |= 1 << requested_edge
+        for box in boxes:
+            if player == 2:
+                self.second_boxes |= 1 << box
+        self.scores[player - 1] += len(boxes)
+        self.turn = turn
+
+    def message(self):
+        '''Returns the snapshot as a message to the client, "S t e o": the
+        player to move, the bitmask of the drawn edges and the bitmask of the
+        boxes of the second player. The bitmasks are written in hexadecimal
+        with a fixed number of digits, the lowest bits last. The scores are
+        not sent, since the client counts them from the closed boxes.
+
+        Runtime:
+            O(n) where n is the number of edges on the board.
+        '''
+        return "S {} {:0{}x} {:0{}x}".format(
+            self.turn, self.drawn, (self._num_edges + 3) // 4,
+            self.second_boxes, (self._num_boxes + 3) // 4)
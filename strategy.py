@@ -1,12 +1,12 @@
-def chain_is_open(chain, strat_box_dict):
+def chain_is_open(chain, game_board):
     '''Checks if a chain is open (all boxes of the chain can be enclosed in
     consecutive moves).
 
     Arguments:
         chain (set): A set of vertices representing an open chain.
 
-        strat_box_dict (dict): A dictionary that maps strategy graph vertices
-            to the edges that surround it.
+        game_board (Board): A bitboard of the lines drawn on the game board.
+            Its boxes are numbered like the strategy graph vertices.
 
     Runtime:
         O(n) where n is the number of vertices i nthe strategy graph.
@@ -21,13 +21,12 @@ def chain_is_open(chain, strat_box_dict):
     # count the number of vertices that have zero, one, or three drawn
     # edges surrounding them.
     for vertex in chain:
-        # A strat_box_dict entry with only 1 value means
-        # that 3 edges have been drawn (removed from strat_box_dict).
-        if len(strat_box_dict[vertex]) == 1:
+        sides = game_board.sides(vertex)
+        if sides == 3:
             count_of_threes += 1
-        if len(strat_box_dict[vertex]) == 3:
+        if sides == 1:
             count_of_ones += 1
-        if len(strat_box_dict[vertex]) == 4:
+        if sides == 0:
             count_of_zeroes += 1
 
     # if this condition is satisfied then the chain is open
@@ -37,43 +36,127 @@ def chain_is_open(chain, strat_box_dict):
         return False
 
 
-def take_chain(chain, strat_box_dict):
-    ''' Updates requested_edge to be an edge that will enclose at least one box
-    in a long chain (3 or more boxes), allowing the computer to play until all
-    boxes in the chain are enclosed. Taking long chains is the primary method
-    of scoring points using the long chain rule.
+def plan_capture(chain, game_board, keep_control):
+    '''Plans every move that the AI makes to take an open chain (or a loop
+    that has been opened), so that the moves can be played one after the other
+    without looking at the board again. Boxes are taken one after the other
+    along the chain. To keep control, the AI stops before the last two boxes
+    of a chain and draws the far side of the last box instead, leaving both
+    boxes to the human, who then has to open the next chain. For an opened
+    loop, it stops before the last four boxes and splits them into two pairs.
 
     Arguments:
         chain (set): A set of vertices representing an open chain.
 
-        strat_box_dict (dict): A dictionary that maps strategy graph vertices
-            to the edges that surround it.
+        game_board (Board): A bitboard of the lines drawn on the game board.
+            Its boxes are numbered like the strategy graph vertices.
+
+        keep_control (bool): Whether to decline the last boxes of the chain.
 
     Runtime:
-        O(n) where n is the number of vertices in the strategy graph.
+        O(n^2) where n is the number of vertices of the chain.
 
     Returns:
-        requested_edge (tuple): The edge to be taken in the chain.
+        moves (list): The numbers of the edges to draw, in order. Every edge
+            but the one that declines the last boxes closes a box.
+    '''
+    drawn = game_board.drawn()
+
+    def sides(box):
+        return bin(drawn & game_board.box_mask(box)).count("1")
+
+    # The boxes of the chain that are still to be taken.
+    left = {box for box in chain if sides(box) < 4}
+    moves = list()
+    todolist = [box for box in left if sides(box) == 3]
+    while todolist:
+        box = todolist.pop()
+        if not box in left or sides(box) != 3:
+            continue
+
+        if keep_control:
+            threes = [other for other in left if sides(other) == 3]
+            twos = [other for other in left if sides(other) == 2]
+            decline = 0
+            # Two boxes of a chain are left: draw the far side of the second.
+            if len(left) == 2 and len(threes) == 1 and len(twos) == 1:
+                shared = game_board.box_mask(threes[0]) & \
+                    game_board.box_mask(twos[0]) & ~drawn
+                if shared:
+                    decline = game_board.box_mask(twos[0]) & ~drawn & ~shared
+            # Four boxes of a loop are left: split them in the middle.
+            elif len(left) == 4 and len(threes) == 2 and len(twos) == 2:
+                decline = game_board.box_mask(twos[0]) & \
+                    game_board.box_mask(twos[1]) & ~drawn
+            if decline:
+                moves.append(decline.bit_length() - 1)
+                break
+
+        # Take the box with its last side.
+        bit = (game_board.box_mask(box) & ~drawn).bit_length() - 1
+        drawn |= 1 << bit
+        moves.append(bit)
+        for other in game_board.edge_boxes(bit):
+            if sides(other) == 4:
+                left.discard(other)
+            # Follow the chain to the next box that the move opened.
+            elif sides(other) == 3 and other in left:
+                todolist.append(other)
+
+    print("Taking chain")
+    return moves
+
+def keep_control(chain, game_board, components, exact=True):
+    '''Decides whether the AI should decline the last boxes of an open chain
+    to keep control. The other open components are expected to be taken
+    first. In a simple loony endgame of the rest the decision is exact.
+    Otherwise, the AI keeps control if a long chain or loop is left for the
+    human to open.
+
+    Arguments:
+        chain (set): A set of vertices representing an open chain.
+
+        game_board (Board): A bitboard of the lines drawn on the game board.
+
+        components (list): The (vertices, cyclic) tuples of the components of
+            the strategy graph.
 
-        vertex (int): The vertex that maps to the edge that was taken in
-            strat_box_dict.
+        exact (bool): Whether a simple loony endgame may be solved. If False,
+            only the long chains and loops that are left are looked at.
+
+    Runtime:
+        O(n) where n is the number of vertices in the strategy graph.
+
+    Returns:
+        bool: True if the last boxes should be declined, False otherwise.
     '''
-    for vertex in chain:
-        # If a vertex has 3 edges surrounding it already, the last edge should
-        # be taken so that the move completes the box and scores a point.
-        if len(strat_box_dict[vertex]) == 1:
-            possible_edge = list(strat_box_dict[vertex])
-            # Choose the edge.
-            requested_edge = possible_edge[0]
-            # Let the user know what move is performed.
-            print("Taking chain")
-            return (requested_edge, vertex)
+    from loony import declines, lengths, simple_endgame
 
-    # Return None if an edge cannot be found. The AI will then move on to see
-    # if other moves can be performed instead.
-    return (None, None)
+    left = [box for box in chain if game_board.sides(box) < 4]
+    # A chain opened at both ends is taken like an opened loop.
+    is_loop = len([box for box in left if game_board.sides(box) == 3]) >= 2
+    if len(left) < (4 if is_loop else 2):
+        return False
 
-def open_chain(chain, strat_box_dict):
+    # The other open components are taken before this chain, so they are
+    # not part of the endgame that is left.
+    rest = [(vertex_set, cyclic) for (vertex_set, cyclic) in components
+            if vertex_set != chain and
+            not any(game_board.sides(box) == 3 for box in vertex_set)]
+    parts = None
+    if exact:
+        parts = simple_endgame(game_board, rest)
+    if not parts is None:
+        (chains, loops) = lengths(parts)
+        return declines(len(left), is_loop, chains, loops)
+
+    for (vertex_set, cyclic) in rest:
+        if len(vertex_set) >= 3 and \
+            all(game_board.sides(box) < 4 for box in vertex_set):
+            return True
+    return False
+
+def open_chain(chain, game_board):
     '''Updates requested_edge to be a move that opens a short chain (2 boxes).
     The AI should only try to open a chain if it is not in control of the game.
     By the long chain rule, the AI should try and take a long chain in its
@@ -85,21 +168,21 @@ def open_chain(chain, strat_box_dict):
         chain (set): A set of vertices representing a short chain component of
             the graph that the AI wants to open.
 
-        strat_box_dict (dict): A dictionary that maps strategy graph vertices
-            to the edges that surround it.
+        game_board (Board): A bitboard of the lines drawn on the game board.
+            Its boxes are numbered like the strategy graph vertices.
 
     Runtime:
         O(n) where n is the number of vertices in the strategy graph.
 
     Returns:
-        requested_edge (tuple): The edge that the AI should take in order to
-            open the short chain.
+        requested_edge (int): The number of the edge that the AI should take in
+            order to open the short chain.
     '''
     for vertex in chain:
         # If the vertex has only two edges surrounding it, then one of the other
         # two edges must be taken to open this chain.
-        if len(strat_box_dict[vertex]) == 2:
-            possible_edges = list(strat_box_dict[vertex])
+        if game_board.sides(vertex) == 2:
+            possible_edges = game_board.undrawn_sides(vertex)
             # Arbitrarily choose the edge from the possible edges. Either one
             # will open the chain.
             requested_edge = possible_edges[0]
@@ -110,39 +193,40 @@ def open_chain(chain, strat_box_dict):
     # take a random edge instead.
     return None
 
-def get_random_edge(game_graph, box_dict):
-    '''Returns a random edge in the game graph that is a valid move.
+def get_random_edge(game_board, safe_edges):
+    '''Returns a random edge in the game graph that is a valid move. An edge
+    that does not give the human a box is chosen if there is one.
 
     Arguments:
-        game_graph (UndirectedAdjacencyGraph): A graph representation of the
-            game board.
+        game_board (Board): A bitboard of the lines drawn on the game board.
 
-        box_dict (dict): A dictionary that maps vertices to the edges that
-            surround it. As edges are taken in the game, edges are removes from
-            the values of the dictionary.
+        safe_edges (SafeEdgeIndex): The undrawn edges that give no box away.
 
     Runtime:
-        O(n) where n is the number vertices in the game graph.
+        O(1) if there is a safe edge, otherwise O(n) where n is the number of
+            edges in the game graph.
 
     Returns:
-        chosen_edge (tuple): A valid edge that is yet to be taken in the game.
+        chosen_edge (int): The number of a valid edge that is yet to be taken in
+            the game.
     '''
     from random import randint # Needed for the move to be pseudorandom
 
-    possible_edges = set()
-    # Iterate through all of the vertices of the game:
-    for vertex in box_dict:
-        # If not all of the edges have been taken surrounding a vertex:
-        if len(box_dict[vertex]) > 0:
-            # Add the untaken edges to the set of possible edges to take.
-            possible_edges.update(box_dict[vertex])
-
-    # Get a randomly generated index.
-    edge_index = randint(0, len(possible_edges)-1)
-    # Convert the set to a list.
-    possible_edges = list(possible_edges)
-    # Get the edge at the random index.
-    chosen_edge = possible_edges[edge_index]
+    chosen_edge = safe_edges.pick()
+    # A line drawn without the index being told is dropped from it.
+    while not chosen_edge is None and game_board.is_drawn(chosen_edge):
+        safe_edges.update(game_board, chosen_edge)
+        chosen_edge = safe_edges.pick()
+
+    # If every edge gives a box away, any untaken edge is as good.
+    if chosen_edge is None:
+        # The untaken edges are the possible edges to take.
+        possible_edges = game_board.undrawn_edges()
+
+        # Get a randomly generated index.
+        edge_index = randint(0, len(possible_edges)-1)
+        # Get the edge at the random index.
+        chosen_edge = possible_edges[edge_index]
 
     print("Random move") # Let the user know what type of move is performed.
     return chosen_edge # Return the edge.
@@ -31,32 +31,309 @@ def breadth_first_search(g, v):
 
     return frozenset(reached)
 
+def label_components(g, backend="python"):
+    '''Labels every vertex of graph g with the component that it is in, in a
+    single pass over the graph. The vertices of g must be numbered from 0 to
+    n-1, like the vertices of the strategy graph.
+
+    Arguments:
+        g (UndirectedAdjacencyGraph): The graph whose components are labelled.
+
+        backend (str): "python" to search the graph with breadth first
+            searches, or "numpy" to hand the adjacency matrix to scipy. The
+            numpy backend is meant for boards far larger than the client can
+            display, where the searches dominate the labelling time.
+
+    Runtime:
+        O(n+m) where n is the number of vertices in the graph and m is the
+            number of edges in the graph.
+
+    Raises:
+        RuntimeError: If the backend is unknown, or is "numpy" and numpy or
+            scipy is not installed.
+
+    Returns:
+        labels (list): A list mapping vertices to the label of their component.
+            Labels are numbered from 0 in order of the smallest vertex of each
+            component. A numpy array with the numpy backend.
+
+        sizes (list): A list mapping component labels to the number of
+            vertices in the component. A numpy array with the numpy backend.
+    '''
+    if backend == "numpy":
+        return _label_components_numpy(g)
+    elif backend != "python":
+        raise RuntimeError("Bad argument:"
+                           " Unknown backend {}".format(backend))
+
+    import queue
+
+    num_vertices = len(g.vertices())
+    labels = [-1] * num_vertices
+    sizes = list()
+    for v in range(num_vertices):
+        # If the vertex has already been labelled, its component is known.
+        if labels[v] != -1:
+            continue
+
+        # Search the new component, labelling its vertices as they are reached.
+        label = len(sizes)
+        labels[v] = label
+        size = 1
+        todolist = queue.deque([v])
+        while todolist:
+            u = todolist.popleft()
+            for w in g.neighbours(u):
+                if labels[w] == -1:
+                    labels[w] = label
+                    size += 1
+                    todolist.append(w)
+        sizes.append(size)
+
+    return (labels, sizes)
+
+def _label_components_numpy(g):
+    '''The numpy backend of label_components.'''
+    try:
+        import numpy
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+    except ImportError:
+        raise RuntimeError("The numpy backend needs numpy and scipy installed")
+    from itertools import chain
+
+    num_vertices = len(g.vertices())
+    # The adjacency lists are laid end to end as the column indices of a
+    # compressed sparse row adjacency matrix.
+    degrees = numpy.fromiter(
+        (len(g.neighbours(u)) for u in range(num_vertices)),
+        dtype=numpy.intp, count=num_vertices)
+    row_starts = numpy.zeros(num_vertices+1, dtype=numpy.intp)
+    numpy.cumsum(degrees, out=row_starts[1:])
+    columns = numpy.fromiter(
+        chain.from_iterable(g.neighbours(u) for u in range(num_vertices)),
+        dtype=numpy.intp, count=row_starts[-1])
+
+    adjacency = csr_matrix(
+        (numpy.ones(len(columns), dtype=numpy.int8), columns, row_starts),
+        shape=(num_vertices, num_vertices))
+    (num_components, labels) = connected_components(adjacency, directed=False)
+    sizes = numpy.bincount(labels, minlength=num_components)
+
+    return (labels, sizes)
+
 def get_components(g):
     '''Finds and returns all of the components of graph g.
 
     Arguments:
         g (UndirectedAdjacencyGraph): The game graph from which components are
-            counted.
+            counted. Its vertices must be numbered from 0 to n-1.
 
     Runtime:
-        O(n*(n+m)) where n is the number of vertices in the graph and m is the
+        O(n+m) where n is the number of vertices in the graph and m is the
             number of edges in the graph.
 
     Returns:
         component_set (set): List of frozensets that contain vertices reachable
             from each vertex of the graph.
     '''
-    component_set = set()
-    for v in g.vertices():
-        # Conduct a breadth first search to find the component that v is in.
-        component = breadth_first_search(g, v)
+    (labels, sizes) = label_components(g)
 
-        # If the component has already been found, continue.
-        if component in component_set:
+    # Group the vertices by their label.
+    components = [list() for size in sizes]
+    for v, label in enumerate(labels):
+        components[label].append(v)
+
+    return {frozenset(component) for component in components}
+
+def classify_components(g):
+    '''Finds every component of graph g and whether it has a cycle, in one
+    iterative pass. A connected component is a tree, and so has no cycle, when
+    it has one edge fewer than it has vertices. Since the search keeps its own
+    todolist, long chains do not run into the recursion limit.
+
+    Arguments:
+        g (UndirectedAdjacencyGraph): The graph whose components are
+            classified.
+
+    Runtime:
+        O(n+m) where n is the number of vertices in the graph and m is the
+            number of edges in the graph.
+
+    Returns:
+        components (list): A list of (vertices, cyclic) tuples, one for every
+            component of the graph. vertices is a frozenset of the vertices of
+            the component and cyclic is True if the component has a cycle.
+    '''
+    reached = set()
+    components = list()
+    for v in g.vertices():
+        # If the vertex has already been reached, its component is known.
+        if v in reached:
             continue
 
-        # Else, add the component to the set of all components of the graph.
-        else:
-            component_set.add(component)
+        component = {v}
+        # Every edge of the component is seen once from each end.
+        num_ends = int()
+        todolist = [v]
+        while todolist:
+            u = todolist.pop()
+            for w in g.neighbours(u):
+                num_ends += 1
+                if w not in component:
+                    component.add(w)
+                    todolist.append(w)
+
+        reached |= component
+        components.append(
+            (frozenset(component), num_ends // 2 >= len(component)))
+
+    return components
+
+class ComponentIndex:
+    '''Type to keep track of the components of a graph that only ever loses
+    edges, such as the strategy graph over the course of a game. Components are
+    labelled once when the index is built, and a component is split in two
+    when an edge removal disconnects it, so the components never need to be
+    searched for from scratch.
+
+    Attributes:
+        _graph (UndirectedAdjacencyGraph): The graph whose components are
+            tracked.
+
+        _labels (dict): A dictionary mapping vertices to the label of their
+            component.
+
+        _members (dict): A dictionary mapping component labels to the set of
+            vertices in the component.
+
+        _num_edges (dict): A dictionary mapping component labels to the
+            number of edges in the component.
+
+        _next_label (int): The label given to the next component that is split
+            off.
+    '''
+
+    def __init__(self, g):
+        '''Labels every component of graph g.
+
+        Arguments:
+            g (UndirectedAdjacencyGraph): The graph whose components are
+                tracked. Its vertices must be numbered from 0 to n-1, and edges
+                must only be removed from it through remove_edge.
+
+        Runtime:
+            O(n+m) where n is the number of vertices in the graph and m is the
+                number of edges in the graph.
+        '''
+        self._graph = g
+        (labels, sizes) = label_components(g)
+        self._labels = dict(enumerate(labels))
+        self._members = {label: set() for label in range(len(sizes))}
+        self._num_edges = {label: int() for label in range(len(sizes))}
+        for v, label in enumerate(labels):
+            self._members[label].add(v)
+            # Every edge is counted once from each end.
+            self._num_edges[label] += len(g.neighbours(v))
+        for label in self._num_edges:
+            self._num_edges[label] //= 2
+        self._next_label = len(sizes)
+
+    def _add_component(self, vertices):
+        '''Gives a new label to a set of vertices that form a component and
+        counts its edges.'''
+        label = self._next_label
+        self._next_label += 1
+        self._members[label] = set(vertices)
+        num_ends = int()
+        for v in vertices:
+            self._labels[v] = label
+            num_ends += len(self._graph.neighbours(v))
+        self._num_edges[label] = num_ends // 2
+
+    def remove_edge(self, e):
+        '''Removes edge e from the graph and splits its component if the edge
+        was the last link between the two sides. Two breadth first searches,
+        one from each end of the edge, take turns expanding one vertex each.
+        They stop as soon as they meet (the component is still connected) or
+        one of them runs out of vertices (it has found the smaller side).
+
+        Arguments:
+            e (tuple): The edge to be removed. The edge goes from e[0]
+                (an int) to e[1] (an int).
+
+        Runtime:
+            O(n+m) where n is the number of vertices and m is the number of
+                edges of the smaller side when the component splits, or of the
+                component otherwise.
+        '''
+        import queue
+
+        if not self._graph.is_edge(e):
+            return
+        self._graph.remove_edge(e)
+        label = self._labels[e[0]]
+        self._num_edges[label] -= 1
+
+        # One search from each end of the removed edge. Each search keeps a
+        # todolist and the set of vertices it has reached.
+        first = (queue.deque([e[0]]), {e[0]})
+        second = (queue.deque([e[1]]), {e[1]})
+        while True:
+            for (todolist, reached), (_, other_reached) in \
+                ((first, second), (second, first)):
+                # If this search ran out of vertices, it has found a whole
+                # component that no longer includes the other end of the edge.
+                if not todolist:
+                    self._members[label] -= reached
+                    self._add_component(reached)
+                    # The edges of the split off side are no longer part of
+                    # the old component.
+                    self._num_edges[label] -= \
+                        self._num_edges[self._next_label - 1]
+                    return
+
+                u = todolist.popleft()
+                for w in self._graph.neighbours(u):
+                    # If the searches meet, the component is still connected.
+                    if w in other_reached:
+                        return
+                    # If the vertex has not been reached yet:
+                    if w not in reached:
+                        reached.add(w)
+                        todolist.append(w)
+
+    def component(self, v):
+        '''Returns the set of vertices in the component of vertex v. The set
+        must not be modified.
+
+        Arguments:
+            v (int): A vertex of the graph.
+        '''
+        return self._members[self._labels[v]]
+
+    def components(self):
+        '''Returns the list of the vertex sets of every component of the graph.
+        The sets must not be modified.
+
+        Runtime:
+            O(k) where k is the number of components in the graph.
+        '''
+        return list(self._members.values())
+
+    def classify(self):
+        '''Returns every component of the graph and whether it has a cycle,
+        from the vertex and edge counts kept for every component. A connected
+        component has a cycle when it has at least as many edges as vertices.
+
+        Runtime:
+            O(k) where k is the number of components in the graph.
 
-    return component_set
+        Returns:
+            components (list): A list of (vertices, cyclic) tuples, one for
+                every component of the graph. vertices is the set of vertices
+                of the component, which must not be modified, and cyclic is
+                True if the component has a cycle.
+        '''
+        return [(members, self._num_edges[label] >= len(members))
+                for label, members in self._members.items()]